@@ -2,6 +2,7 @@
 from flask import Flask
 from app.logging_config import logger
 from app.reports.dashboard import create_dashboard  # Импорт функции создания Dash
+from app.data.database import instrumentation
 # Другие импорты...
 
 def create_app() -> Flask:
@@ -17,6 +18,9 @@ def create_app() -> Flask:
     from app.main.routes import main
     app.register_blueprint(main)
 
+    # Учет SQL-запросов каждого HTTP-запроса: строка в логе и заголовок Server-Timing
+    instrumentation.init_app(app)
+
     # Интеграция Dash-приложения
     dashboard = create_dashboard(app)  # Передаем Flask-приложение в Dash
     # Если необходимо, можно сохранить объект Dash в app.extensions или другом месте
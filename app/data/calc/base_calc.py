@@ -7,8 +7,8 @@ from app.data.database.models_repository import (MetricValueRepository,
                                                  RegionRepository)
 import random
 import pandas as pd
-import re
 from app.data.imports.import_json import import_json_file
+from app.data.calc.rating import PERCENTILE_FRACTIONS
 
 class Calc:
     pass
@@ -51,8 +51,8 @@ class Region_calc(Calc):
             give = dp.get_info_metricvalue(id_metric=i, 
                                            id_region=self.id_region,
                                            id_city = self.id_city)
-            if give:
-                final.append(float(give[0][0]))
+            if give and give[0].value_num is not None:
+                final.append(give[0].value_num)
             else:
                 final.append(3)
         return dict(zip(name_metrics, final))
@@ -124,53 +124,36 @@ class Region_calc(Calc):
         """
         Возвращает 50 самых длинных отзывов, отбирая по 10 из каждой даты 
         начиная с самой новой. Если отзывов в дате меньше 10 - берёт все.
+        Отбор выполняется в БД (ReviewRepository.get_reviews_top).
         """
-        r = ReviewRepository()
-        query = r.get_reviews(id_location=id_location)
-        
-        # Конвертация в DataFrame
-        result = [{"id_location": r.id_location, 
-                    "text": r.text, 
-                    "data": r.data} for r in query]
-        
-        if not result or len(result) <= 50:
-            return result
-        df = pd.DataFrame(result)
-        
-        # Предобработка данных
-        df['data'] = pd.to_datetime(df['data'])
-        df['text_length'] = df['text'].str.len()
-        # df = df.dropna(subset=['data', 'text'])  # Фильтрация некорректных записей
-        
-        # Основная логика выборки
-        final_selection = []
-        
-        # Шаг 1. Сортировка по дате (новые сначала) и длине текста
-        df_sorted = df.sort_values(
-            by=['data', 'text_length'], 
-            ascending=[False, False]
-        )
-        
-        # Шаг 2. Группировка по датам с сохранением порядка
-        grouped = df_sorted.groupby(
-            pd.Grouper(key='data', freq='D'), 
-            sort=False  # сохраняем исходный порядок сортировки
-        )
-        
-        # Шаг 3. Итерация по группам с накоплением результатов
-        for _, group in grouped:
-            if len(final_selection) >= 50:
-                break
-                
-            # Берём топ-10 самых длинных отзывов группы
-            needed = min(10, 50 - len(final_selection))
-            final_selection.extend(
-                group.nlargest(needed, 'text_length')
-                .to_dict('records')
-            )
-            
-        return final_selection[:50]  # Гарантируем не более 50 записей
+        return ReviewRepository().get_reviews_top(id_location=id_location, limit=50, per_day=10) or []
+
+    def get_reviews_top50_batch(self, id_locations) -> dict:
+        """
+        То же, что get_reviews_top50, для нескольких локаций одним запросом.
+
+        Returns:
+            dict: {id_location: список отзывов}.
+        """
+        return ReviewRepository().get_reviews_top_batch(id_locations=id_locations, limit=50, per_day=10) or {}
+
 
+    def get_review_keywords(self, keywords) -> dict:
+        """
+        Количество отзывов с каждым ключевым словом в регионе или городе
+        (полнотекстовый индекс по отзывам), например ['пляж', 'чисто', 'грязно', 'парковка'].
+
+        Returns:
+            dict: {ключевое слово: количество отзывов}, 'matched_reviews' — отзывы хотя бы с одним словом.
+        """
+        group_by = 'id_city' if self.id_city else 'id_region'
+        stats = ReviewRepository().get_keyword_stats(
+            keywords=keywords, group_by=group_by, id_city=self.id_city, id_region=self.id_region,
+        )
+        if stats is None or stats.empty:
+            return {keyword: 0 for keyword in keywords}
+        # без id_region/id_city — сумма по всем регионам
+        return {column: int(value) for column, value in stats.drop(columns=[group_by]).sum().items()}
 
     def get_segment_calc(self, segment):
         """
@@ -193,20 +176,13 @@ class Region_calc(Calc):
                 self.id_city = region.capital
             if segment == 'beach':
                 return self.get_weather_calc_beach()
-            id_metric = 213
             m = MetricValueRepository()
-            weathers = m.get_info_metricvalue(
-                                id_city=self.id_city,
-                                id_metric = id_metric
-                                )
-            mass = [weather.__dict__ for weather in weathers]
-            df = pd.DataFrame(mass)
-            df_weather = df[['id_region', 'id_city', 'value', 'month']]
-            count_month = 0
+            weathers = m.get_city_weather(id_city=self.id_city, key_ratio=['day'])
             like_month = [23, 32]
-            for index, month in df_weather.iterrows():
-                if month.value and re.match(r"\d+\.*\d*", month.value) and like_month[0] <= float(month.value) <= like_month[1]:
-                        count_month += 1
+            count_month = sum(
+                1 for value, month in weathers['day']
+                if value is not None and like_month[0] <= value <= like_month[1]
+            )
             # Оценка количества теплых месяцев
             like = {0:1, 1:2, 2:3, 3:4, 4:5}
             if count_month in like:
@@ -225,24 +201,20 @@ class Region_calc(Calc):
         Получение погоды для пляжного сегмента
         """
         try:
-            id_metric = [216, 213]
-            like_month = [[20, 40], [23, 35]]
-            temperature = {}
-            for i in range(len(id_metric)):
-                m = MetricValueRepository()
-                weathers = m.get_info_metricvalue(
-                                    id_city=self.id_city,
-                                    id_metric = id_metric[i]
-                                    )
-                mass = [weather.__dict__ for weather in weathers]
-                temperature[i] = mass
+            like_month = {'water': [20, 40], 'day': [23, 35]}
+            m = MetricValueRepository()
+            weathers = m.get_city_weather(id_city=self.id_city, key_ratio=['water', 'day'])
+            # Температуры воды и воздуха сопоставляются по месяцу
+            water = {month: value for value, month in weathers['water']}
+            day = {month: value for value, month in weathers['day']}
             count_month = 0
-            for index in range(len(temperature[0])):
-                if temperature[0][index]['value'] and re.match(r"\d+\.*\d*", temperature[0][index]['value']):
-                    if temperature[1][index]['value'] and re.match(r"\d+\.*\d*", temperature[1][index]['value']):
-                        if like_month[0][0] <= float(temperature[0][index]['value']) <= like_month[0][1]:
-                            if like_month[1][0] <= float(temperature[1][index]['value']) <= like_month[1][1]:
-                                count_month += 1
+            for month, t_water in water.items():
+                t_day = day.get(month)
+                if t_water is None or t_day is None:
+                    continue
+                if like_month['water'][0] <= t_water <= like_month['water'][1] \
+                        and like_month['day'][0] <= t_day <= like_month['day'][1]:
+                    count_month += 1
             # Оценка количества теплых месяцев
             like = {0:1, 1:2, 2:3, 3:4, 4:5}
             if count_month in like:
@@ -283,32 +255,19 @@ class Region_calc(Calc):
         """
         Получение общей оценки lvl1 типа локации
         """
-        result = {}
         l = LocationsRepository()
-        m = MetricValueRepository()
-        # перебор типов локаций
+        # количество и средняя оценка локаций по всем типам считаются в БД одним запросом
+        if self.id_city:
+            stats = l.get_type_stats(types=types_locations, id_city=self.id_city)
+            stats = stats[(stats['level'] == 'city') & (stats['id_city'] == self.id_city)]
+        else:
+            stats = l.get_type_stats(types=types_locations, id_region=self.id_region)
+            stats = stats[(stats['level'] == 'region') & (stats['id_region'] == self.id_region)]
+        ratings = dict(zip(stats['type_location'], stats['avg_rating']))
+        result = {}
         for type_location in types_locations:
-            mass = l.get_locations_by_type(type_location=type_location)
-            if self.id_city:
-                locations = [loc['id_location'] for loc in mass if loc['id_city'] == self.id_city]
-            else:
-                locations = [loc['id_location'] for loc in mass if loc['id_region'] == self.id_region]
-            mass_value = []
-            # перебор полученных локаций по месту
-            for location in locations:
-                # получение метрик по локациям
-                loc = m.get_info_metricvalue(id_metric = 236, 
-                                id_location=location
-                                )
-                if not loc:
-                    continue
-                value = loc[0].value
-                if value:
-                    mass_value.append(float(value))
-                else:
-                    continue
-            value =  round(sum(mass_value)/len(mass_value), 2) if mass_value else 0
-            result[type_location] = value
+            value = ratings.get(type_location)
+            result[type_location] = round(value, 2) if value and not pd.isna(value) else 0
         return result
     
     def get_like_locations_lvl2(self, types_locations):
@@ -327,7 +286,7 @@ class Region_calc(Calc):
                             )
             if not loc:
                 continue
-            value = round(float(loc[0].value), 2) if loc[0].value else 0
+            value = round(loc[0].value_num, 2) if loc[0].value_num is not None else 0
             result[type_location] = value
         return result
     
@@ -347,13 +306,11 @@ class Region_calc(Calc):
                                         id_city=self.id_city,
                                         id_region=self.id_region)
                 if metric:
-                    metric = metric[0]
-                    if metric.value and metric.value != 'None':
-                        metric_value = metric.value
-                        metric_value = float(metric_value) if float(metric_value) >= 2 else 2
-                        values[name_value] = metric_value
+                    metric_value = metric[0].value_num
+                    if metric_value is not None:
+                        values[name_value] = metric_value if metric_value >= 2 else 2
                     else:
-                        metric_value == 2
+                        values[name_value] = 2
                 else:
                     values[name_value] = 2
             return values
@@ -362,19 +319,24 @@ class Region_calc(Calc):
 
     def get_tur_night(self):
         """
-        Получение сумарного турпотока и количества ночевок в регионах, для их оценки
+        Получение сумарного турпотока и количества ночевок региона и перцентилей
+        этих сумм по всем регионам, для их оценки
+
+        Returns:
+            dict: {'tur': {'value': сумма региона, 'percentiles': [...]}, 'night': {...}}
         """
         try:
             mv = MetricValueRepository()
             metrics = {'tur': 2, 'night': 3}
             result = {}
             for metric, id in metrics.items():
-                mass = mv.get_info_metricvalue(id_metric=id)
-                mass = [i.__dict__ for i in  mass]
-                df = pd.DataFrame(mass)
-                df = df[['id_region', 'value']]
-                df['value'] = pd.to_numeric(df['value'], errors='coerce')
-                result[metric] = df.groupby('id_region', as_index=False).agg({'value': 'sum'})
+                # суммы и перцентили по регионам считаются в БД (строки без региона не учитываются)
+                result[metric] = {
+                    'value': mv.aggregate_values(id_metric=id, agg='sum', id_region=self.id_region),
+                    'percentiles': mv.get_value_percentiles(id_metric=id,
+                                                            fractions=PERCENTILE_FRACTIONS,
+                                                            group_by='id_region'),
+                }
             return result
         except Exception as e:
             logger.error(f'Ошибка в методе get_like_segments: {e}')
@@ -416,7 +378,7 @@ class Region_calc(Calc):
                     id_city = self.id_city,
                     id_region = self.id_region
                 )
-                segments[metric] = float(value[0].value) if value else ''
+                segments[metric] = value[0].value_num if value and value[0].value_num is not None else ''
             return segments
         except Exception as e:
             logger.error(f'Ошибка в методе get_like_segments: {e}')
\ No newline at end of file
@@ -0,0 +1,61 @@
+# app/data/calc/rating.py
+
+from typing import Any
+
+import numpy as np
+
+# Доли расширенной перцентильной шкалы: 1%, 2%, ..., 100%
+PERCENTILE_FRACTIONS = np.arange(1, 101) / 100
+
+
+def percentile_table(values: Any, fractions: Any = PERCENTILE_FRACTIONS) -> np.ndarray:
+    """
+    Таблица перцентилей значений (линейная интерполяция, как у
+    pandas.Series.quantile); NaN не учитываются.
+
+    Returns:
+        np.ndarray: Перцентили в порядке fractions (пустой массив без данных).
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return np.array([], dtype=float)
+    return np.quantile(values, fractions)
+
+
+def percentile_rating(x: Any, pcts: Any, inverted: bool = False, decimals: int = 2) -> np.ndarray:
+    """
+    Рейтинг в диапазоне [1.0; 5.0] по расширенной перцентильной шкале
+    для массива значений за один вызов.
+
+    Значение ниже первого перцентиля получает 1.0, не ниже последнего — 5.0;
+    внутри таблицы позиция i + alpha (номер интервала и доля внутри него,
+    совпадающие интервалы пропускаются) переводится в шкалу 1..5 линейно.
+
+    Args:
+        x (Any): Значение или массив значений.
+        pcts (Any): Неубывающая таблица перцентилей (percentile_table).
+        inverted (bool): Обратный показатель (например, удаленность):
+            наименьшие значения получают 5.0, наибольшие — 1.0.
+        decimals (int): Знаков после запятой.
+
+    Returns:
+        np.ndarray: Рейтинги той же формы, что x (NaN для NaN и пустой таблицы).
+    """
+    x = np.asarray(x, dtype=float)
+    pcts = np.asarray(pcts, dtype=float)
+    if not pcts.size:
+        return np.full(x.shape, np.nan)
+    # i — последний перцентиль, не превышающий x (-1, если x меньше всех)
+    i = np.searchsorted(pcts, x, side='right') - 1
+    inside = (i >= 0) & (i < pcts.size - 1)
+    interval = np.clip(i, 0, max(pcts.size - 2, 0))
+    low = pcts[interval]
+    high = pcts[np.minimum(interval + 1, pcts.size - 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = (x - low) / (high - low)
+        scaled = 1 + 4 * (interval + alpha) / max(pcts.size - 1, 1)
+    rating = np.where(inside, scaled, np.where(i < 0, 1.0, 5.0))
+    if inverted:
+        rating = 6.0 - rating
+    return np.where(np.isnan(x), np.nan, np.round(rating, decimals))
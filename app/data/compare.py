@@ -27,8 +27,10 @@ class Compare:
             List[Dict[str, Any]]: Список записей в виде словарей.
         """
         try:
-            data = self.database.get_all(model)
-            self.input_data = [Database.to_dict(obj=record) for record in data]
+            columns = [column.key for column in model.__table__.columns]
+            self.input_data = [
+                dict(row._mapping) for row in self.database.iter_rows(model, columns=columns)
+            ]
             logger.debug(f"Загружено {len(self.input_data)} записей из модели {model.__tablename__}.")
             return self.input_data
         except Exception as e:
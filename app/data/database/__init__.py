@@ -1,29 +1,57 @@
 # app\data\database\__init__.py
 
-from app.data.database.base_repository import Database, retry_on_failure, manage_session
+from app.data.database.base_repository import (
+    Database,
+    retry_on_failure,
+    manage_session,
+    get_engine,
+    get_pool_stats,
+    dispose_engines,
+    )
+from app.data.database.instrumentation import query_scope
 from app.data.database.json_repository import JSONRepository
 from app.data.database.models_repository import (
     SyncRepository, 
     RegionRepository, 
     MetricValueRepository, 
+    EntityKpiRepository,
+    ScoringCheckpointRepository,
     LocationTypeRepository, 
     LocationsRepository,
     ReviewRepository,
     PhotoRepository, 
     CitiesRepository, 
     )
+from app.data.database.async_repository import (
+    AsyncMetricValueRepository,
+    AsyncRegionRepository,
+    AsyncCitiesRepository,
+    get_async_engine,
+    run_async,
+    )
 
 __all__ = [
     'Database', 
     'retry_on_failure', 
     'manage_session', 
+    'get_engine',
+    'get_pool_stats',
+    'dispose_engines',
+    'query_scope',
     'JSONRepository',
     'SyncRepository',
     'RegionRepository',
     'MetricValueRepository',
+    'EntityKpiRepository',
+    'ScoringCheckpointRepository',
     'LocationTypeRepository',
     'LocationsRepository',
     'ReviewRepository',
     'PhotoRepository',
     'CitiesRepository',
+    'AsyncMetricValueRepository',
+    'AsyncRegionRepository',
+    'AsyncCitiesRepository',
+    'get_async_engine',
+    'run_async',
     ]
@@ -0,0 +1,287 @@
+# app/data/database/async_repository.py
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import Config_SQL
+from app.logging_config import logger
+from app.data.database import instrumentation
+from app.data.database.base_repository import _pool_options
+from app.data.database.models_repository import MetricValueRepository
+from app.models import City, MetricValue, Region
+
+R = TypeVar("R")
+
+# Асинхронные движки и фоновый цикл событий уровня процесса. Соединения asyncpg
+# привязаны к циклу, в котором созданы, поэтому все запросы выполняются в одном
+# долгоживущем цикле, а синхронный код (Flask/Dash) отдает корутины через run_async.
+_async_engines: Dict[str, AsyncEngine] = {}
+_async_sessionmakers: Dict[str, sessionmaker] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _async_url(database_url: Optional[str] = None) -> str:
+    """
+    Строка подключения для asyncpg: Config_SQL.SQLALCHEMY_ASYNC_DATABASE_URI,
+    либо синхронная строка с драйвером, замененным на postgresql+asyncpg.
+    """
+    url = database_url or getattr(Config_SQL, 'SQLALCHEMY_ASYNC_DATABASE_URI', None)
+    if url:
+        return url
+    url = make_url(Config_SQL.SQLALCHEMY_DATABASE_URI)
+    return str(url.set(drivername='postgresql+asyncpg'))
+
+
+def get_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """
+    Возвращает общий для процесса AsyncEngine (asyncpg) с настройками пула
+    из Config_SQL. Используется только внутри цикла run_async.
+
+    Args:
+        database_url (Optional[str]): Строка подключения postgresql+asyncpg.
+
+    Returns:
+        AsyncEngine: Экземпляр асинхронного движка.
+    """
+    url = _async_url(database_url)
+    engine = _async_engines.get(url)
+    if engine is None:
+        options = _pool_options()
+        # AsyncEngine использует собственный адаптированный QueuePool
+        options.pop('poolclass')
+        engine = create_async_engine(url, **options)
+        instrumentation.install(engine.sync_engine)
+        _async_engines[url] = engine
+        _async_sessionmakers[url] = sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+        )
+        logger.info(f"Создан общий AsyncEngine: pool_size={options['pool_size']}")
+    return engine
+
+
+def get_async_sessionmaker(database_url: Optional[str] = None) -> sessionmaker:
+    """
+    Возвращает sessionmaker для AsyncSession, привязанный к общему AsyncEngine.
+    """
+    get_async_engine(database_url)
+    return _async_sessionmakers[_async_url(database_url)]
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Запускает (при первом обращении) фоновый поток с циклом событий."""
+    global _loop
+    if _loop is not None:
+        return _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name='async-db-loop', daemon=True
+            )
+            thread.start()
+            _loop = loop
+            logger.debug("Запущен фоновый цикл событий для асинхронных запросов.")
+    return _loop
+
+
+def run_async(coro: Awaitable[R], timeout: Optional[float] = None) -> R:
+    """
+    Выполняет корутину в общем фоновом цикле и ждет результат.
+    Вызывается из синхронного кода. Запросы корутины учитываются
+    в области instrumentation.query_scope вызывающего потока.
+
+    Args:
+        coro (Awaitable[R]): Корутина.
+        timeout (Optional[float]): Максимальное время ожидания в секундах.
+
+    Returns:
+        R: Результат корутины.
+    """
+    scope = instrumentation.current_scope()
+    if scope is not None:
+        coro = _in_scope(coro, scope)
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+async def _in_scope(coro: Awaitable[R], scope: 'instrumentation.QueryScope') -> R:
+    """Выполняет корутину в области учета запросов вызывающего потока."""
+    with instrumentation.attach_scope(scope):
+        return await coro
+
+
+def _reset_after_fork() -> None:
+    """Дочерний процесс не наследует поток цикла — начинаем с чистого состояния."""
+    global _loop
+    _loop = None
+    _async_engines.clear()
+    _async_sessionmakers.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class AsyncDatabase:
+    """
+    Базовый класс асинхронных репозиториев только для чтения.
+
+    Каждый метод открывает собственную AsyncSession, поэтому вызовы одного
+    экземпляра можно выполнять параллельно через asyncio.gather.
+    Если задана Config_SQL.SQLALCHEMY_REPLICA_DATABASE_URI, а строка
+    подключения не передана, репозиторий читает с реплики.
+    """
+
+    READ_REPLICA = True
+
+    def __init__(self, database_url: Optional[str] = None):
+        replica_url = getattr(Config_SQL, 'SQLALCHEMY_REPLICA_DATABASE_URI', None)
+        if database_url is None and replica_url and self.READ_REPLICA:
+            database_url = str(make_url(replica_url).set(drivername='postgresql+asyncpg'))
+        self.engine = get_async_engine(database_url)
+        self.SessionLocal = get_async_sessionmaker(database_url)
+
+    async def _scalars(self, stmt) -> List[Any]:
+        async with self.SessionLocal() as session:
+            result = await session.execute(stmt)
+            return list(result.scalars().all())
+
+    async def _rows(self, stmt) -> List[Any]:
+        async with self.SessionLocal() as session:
+            result = await session.execute(stmt)
+            return list(result.all())
+
+
+class AsyncMetricValueRepository(AsyncDatabase):
+    """
+    Асинхронный репозиторий чтения MetricValue
+    (аналог методов чтения MetricValueRepository).
+    """
+
+    WEATHER_METRICS = {
+        "day": 213,
+        "night": 214,
+        "rainfall": 215,
+        "water": 216,
+    }
+
+    async def get_latest_value(self, id_metric: int, **filters) -> Optional[float]:
+        """
+        Возвращает последнее (по modify_time) числовое значение метрики.
+
+        Args:
+            id_metric (int): Идентификатор метрики.
+            **filters: Фильтры по полям MetricValue (None — IS NULL, список — IN).
+
+        Returns:
+            Optional[float]: Значение value_num или None.
+        """
+        stmt = select(MetricValue.value_num).where(MetricValue.id_metric == id_metric)
+        stmt = MetricValueRepository._filter_values(stmt, filters)
+        stmt = stmt.order_by(
+            MetricValue.modify_time.desc().nullslast(),
+            MetricValue.id_mv.desc(),
+        ).limit(1)
+        values = await self._scalars(stmt)
+        return values[0] if values else None
+
+    async def get_latest_values(self, id_metrics: Iterable[int], **filters) -> Dict[int, Optional[float]]:
+        """
+        Параллельно получает последние значения нескольких метрик с одинаковыми фильтрами.
+
+        Returns:
+            Dict[int, Optional[float]]: {id_metric: значение}.
+        """
+        id_metrics = list(id_metrics)
+        values = await asyncio.gather(
+            *(self.get_latest_value(id_metric, **filters) for id_metric in id_metrics)
+        )
+        return dict(zip(id_metrics, values))
+
+    async def get_latest_by_city(self, id_metric: int, id_cities: Iterable[int]) -> Dict[int, Optional[float]]:
+        """
+        Последнее значение метрики по каждому из городов одним запросом (DISTINCT ON).
+
+        Returns:
+            Dict[int, Optional[float]]: {id_city: значение}.
+        """
+        id_cities = list(id_cities)
+        if not id_cities:
+            return {}
+        stmt = (
+            select(MetricValue.id_city, MetricValue.value_num)
+            .where(
+                MetricValue.id_metric == id_metric,
+                MetricValue.id_city.in_(id_cities),
+                MetricValue.id_location.is_(None),
+            )
+            .distinct(MetricValue.id_city)
+            .order_by(
+                MetricValue.id_city,
+                MetricValue.modify_time.desc().nullslast(),
+                MetricValue.id_mv.desc(),
+            )
+        )
+        return {row.id_city: row.value_num for row in await self._rows(stmt)}
+
+    async def fetch_rows(self, filters: Dict[str, Any], columns: List[str]) -> List[Any]:
+        """
+        Возвращает строки MetricValue с выбранными колонками по фильтрам.
+        """
+        stmt = select(*[getattr(MetricValue, name) for name in columns])
+        stmt = MetricValueRepository._filter_values(stmt, filters)
+        return await self._rows(stmt)
+
+    async def get_city_weather(self, id_city: int, key_ratio: List[str]) -> Dict[str, List[Any]]:
+        """
+        Получение данных о погоде в городе: {ключ: [(value, month), ...]}.
+        Запросы по ключам выполняются параллельно.
+        """
+        async def fetch(key: str) -> List[Any]:
+            stmt = select(MetricValue.value_num.label('value'), MetricValue.month).where(
+                MetricValue.id_metric == self.WEATHER_METRICS[key],
+                MetricValue.id_city == id_city,
+            )
+            return await self._rows(stmt)
+
+        rows = await asyncio.gather(*(fetch(key) for key in key_ratio))
+        return dict(zip(key_ratio, rows))
+
+
+class AsyncRegionRepository(AsyncDatabase):
+    """
+    Асинхронный репозиторий чтения Region.
+    """
+
+    async def find_region_by_id(self, id_region: int) -> Optional[Region]:
+        """
+        Находит регион по его идентификатору.
+        """
+        regions = await self._scalars(select(Region).where(Region.id_region == id_region).limit(1))
+        return regions[0] if regions else None
+
+
+class AsyncCitiesRepository(AsyncDatabase):
+    """
+    Асинхронный репозиторий чтения City.
+    """
+
+    async def get_cities_in_region(self, id_region: int) -> List[City]:
+        """
+        Возвращает города региона.
+        """
+        return await self._scalars(select(City).where(City.id_region == id_region))
+
+    async def find_city_by_id(self, id_city: int) -> Optional[City]:
+        """
+        Находит город по его идентификатору.
+        """
+        cities = await self._scalars(select(City).where(City.id_city == id_city).limit(1))
+        return cities[0] if cities else None
@@ -1,12 +1,20 @@
 #app\data\database\base_repository.py
 
+import io
+import json
+import os
 import time
-from typing import Any, Dict, List, Optional, Type, TypeVar
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
 
-from sqlalchemy import create_engine, Column
+from sqlalchemy import create_engine, event, Column
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import  OperationalError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from sqlalchemy import inspect
 import functools
 from typing import Any, Callable, TypeVar
@@ -14,6 +22,7 @@ from typing import Any, Callable, TypeVar
 
 from app.config import Config_SQL
 from app.logging_config import logger
+from app.data.database import instrumentation
 
 Base = declarative_base()
 T = TypeVar("T", bound=DeclarativeMeta)
@@ -74,15 +83,76 @@ def retry_on_failure(retries: int = 5, delay: int = 2):
 
 #     return wrapper
 
+class UnitOfWorkSession(Session):
+    """
+    Сессия единицы работы (Database.unit_of_work).
+
+    commit и close, которые вызывают методы репозиториев, не завершают
+    общую транзакцию: commit только сбрасывает изменения в БД (flush),
+    close ничего не делает. Транзакцию фиксирует или откатывает сам
+    unit_of_work при выходе из блока with.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = False
+        self._after_commit: List[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Регистрирует вызов после успешной фиксации общей транзакции."""
+        self._after_commit.append(callback)
+
+    def commit(self) -> None:
+        self.flush()
+
+    def close(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        # После ошибки транзакция Postgres уже прервана, продолжить её нельзя
+        self.failed = True
+        super().rollback()
+
+    def finish(self, success: bool) -> None:
+        """Фиксирует или откатывает общую транзакцию и закрывает сессию."""
+        committed = False
+        try:
+            if success and not self.failed:
+                super().commit()
+                committed = True
+            else:
+                super().rollback()
+        finally:
+            super().close()
+        if committed:
+            for callback in self._after_commit:
+                callback()
+
+
+# Сессия активной единицы работы текущего потока / задачи
+_current_unit_of_work: ContextVar[Optional[UnitOfWorkSession]] = ContextVar(
+    'current_unit_of_work', default=None
+)
+
+# Текущий вызов метода репозитория направлен на реплику
+_replica_read: ContextVar[bool] = ContextVar('replica_read', default=False)
+# Время последней записи в основную БД в текущем потоке / задаче (read-your-writes)
+_last_primary_write: ContextVar[float] = ContextVar('last_primary_write', default=float('-inf'))
+
+
 def manage_session(func: Callable[..., T]) -> Callable[..., T]:
     """
     Декоратор для автоматического управления сессией SQLAlchemy.
     Открывает сессию перед вызовом функции и закрывает после завершения.
     В случае любых ошибок откатывает транзакцию, а для
     UnicodeDecodeError пытается декодировать сообщение из cp1251.
+    Внутри unit_of_work ошибка пробрасывается дальше, чтобы откатить
+    всю единицу работы, а сессия не закрывается.
+    Методы чтения направляются на реплику (см. Database.use_replica).
     """
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs) -> T:
+        token = _replica_read.set(self.use_replica(func.__name__))
         try:
             return func(self, *args, **kwargs)
         except UnicodeDecodeError as e:
@@ -95,30 +165,308 @@ def manage_session(func: Callable[..., T]) -> Callable[..., T]:
             logger.error(f"Ошибка декодирования ответа от БД: {msg}")
             # Бросаем своё, более понятное исключение
             # raise DatabaseDecodeError(f"Ошибка декодирования ответа от БД: {msg}") from None
+            if _current_unit_of_work.get() is not None:
+                raise
         except Exception as e:
             self.session.rollback()
             logger.error(f"Ошибка в методе {func.__name__}: {e}")
-            # raise
+            if _current_unit_of_work.get() is not None:
+                raise
         finally:
             self.session.close()
             logger.debug("Сессия закрыта.")
+            _replica_read.reset(token)
     return wrapper
 
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool, который накапливает статистику выдачи соединений:
+    количество checkout, суммарное и максимальное время ожидания,
+    пиковое количество overflow-соединений.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_peak = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self.overflow_peak = max(self.overflow_peak, self.overflow())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает снимок состояния пула и накопленной статистики.
+        """
+        with self._stats_lock:
+            return {
+                'pool_size': self.size(),
+                'checked_in': self.checkedin(),
+                'checked_out': self.checkedout(),
+                'overflow': self.overflow(),
+                'overflow_peak': self.overflow_peak,
+                'max_overflow': self._max_overflow,
+                'checkouts': self.checkouts,
+                'wait_total_sec': round(self.wait_total, 6),
+                'wait_max_sec': round(self.wait_max, 6),
+                'wait_avg_sec': round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+# Реестр движков уровня процесса: один Engine (и один пул) на строку подключения
+_engines: Dict[str, Engine] = {}
+_sessionmakers: Dict[str, sessionmaker] = {}
+_engines_lock = threading.Lock()
+
+
+def _pool_options() -> Dict[str, Any]:
+    """
+    Параметры пула соединений из Config_SQL (со значениями по умолчанию).
+    """
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': getattr(Config_SQL, 'SQLALCHEMY_POOL_SIZE', 5),
+        'max_overflow': getattr(Config_SQL, 'SQLALCHEMY_MAX_OVERFLOW', 10),
+        'pool_timeout': getattr(Config_SQL, 'SQLALCHEMY_POOL_TIMEOUT', 30),
+        'pool_recycle': getattr(Config_SQL, 'SQLALCHEMY_POOL_RECYCLE', 1800),
+        'pool_pre_ping': getattr(Config_SQL, 'SQLALCHEMY_POOL_PRE_PING', True),
+    }
+
+
+def _mark_primary_write(connection, cursor, statement, parameters, context, executemany) -> None:
+    """Запоминает время записи в основную БД для чтения своих записей."""
+    if statement.lstrip()[:6].upper() != 'SELECT':
+        _last_primary_write.set(time.monotonic())
+
+
+def _copy_value(value: Any) -> str:
+    """
+    Значение поля для COPY ... FORMAT csv: NULL — пустое поле без кавычек,
+    строки и JSON — в кавычках (пустая строка остается пустой строкой).
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def get_engine(database_url: Optional[str] = None, read_only: bool = False) -> Engine:
+    """
+    Возвращает общий для процесса Engine для строки подключения.
+    При первом обращении создает его с настройками пула из Config_SQL.
+
+    Args:
+        database_url (Optional[str]): Строка подключения. По умолчанию
+            Config_SQL.SQLALCHEMY_DATABASE_URI.
+        read_only (bool): Движок реплики: транзакции только для чтения,
+            записи не отмечаются для read-your-writes. Учитывается при создании.
+
+    Returns:
+        Engine: Экземпляр SQLAlchemy Engine.
+    """
+    url = database_url or Config_SQL.SQLALCHEMY_DATABASE_URI
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            options = _pool_options()
+            if read_only:
+                options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+            engine = create_engine(url, **options)
+            instrumentation.install(engine)
+            if not read_only:
+                event.listen(engine, 'after_cursor_execute', _mark_primary_write)
+            _engines[url] = engine
+            _sessionmakers[url] = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+            logger.info(
+                f"Создан общий SQLAlchemy Engine{' (реплика)' if read_only else ''}: pool_size={options['pool_size']}, "
+                f"max_overflow={options['max_overflow']}, pool_recycle={options['pool_recycle']}"
+            )
+    return engine
+
+
+def get_sessionmaker(database_url: Optional[str] = None) -> sessionmaker:
+    """
+    Возвращает общий sessionmaker, привязанный к общему Engine.
+    """
+    url = database_url or Config_SQL.SQLALCHEMY_DATABASE_URI
+    get_engine(url)
+    return _sessionmakers[url]
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Возвращает статистику пулов всех созданных в процессе движков.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: {строка подключения без пароля: статистика пула}.
+    """
+    result = {}
+    for engine in list(_engines.values()):
+        pool = engine.pool
+        # repr(URL) скрывает пароль
+        key = repr(engine.url)
+        if isinstance(pool, InstrumentedQueuePool):
+            result[key] = pool.stats()
+        else:
+            result[key] = {'status': pool.status()}
+    return result
+
+
+def dispose_engines() -> None:
+    """
+    Закрывает соединения всех пулов процесса (например, при завершении).
+    После fork вызывать не нужно: пулы дочернего процесса сбрасываются
+    автоматически (_reset_pools_after_fork).
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+    logger.info("Пулы соединений сброшены.")
+
+
+def _reset_pools_after_fork() -> None:
+    """
+    Дочерний процесс начинает с пустыми пулами. dispose(close=False) не
+    закрывает унаследованные сокеты, которые продолжает использовать родитель.
+    """
+    global _engines_lock
+    # блокировку мог держать другой поток родителя в момент fork
+    _engines_lock = threading.Lock()
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
 class Database:
     """
     Класс для управления подключением к базе данных и выполнением операций.
 
+    Если задана реплика (аргумент replica_url или
+    Config_SQL.SQLALCHEMY_REPLICA_DATABASE_URI), методы чтения с префиксами
+    READ_PREFIXES выполняются на ней. На основной БД остаются записи,
+    методы из PRIMARY_METHODS, вызовы внутри unit_of_work и чтения в течение
+    REPLICA_STICKY_SECONDS после записи в том же потоке (read-your-writes).
+    Репозиторий отключает маршрутизацию через READ_REPLICA = False.
+
     Атрибуты:
         engine (Engine): Экземпляр SQLAlchemy Engine.
         SessionLocal (sessionmaker): Конфигурированный sessionmaker.
+        replica_engine (Optional[Engine]): Engine реплики или None.
+        ReplicaSessionLocal (Optional[sessionmaker]): sessionmaker реплики или None.
     """
 
-    def __init__(self):
-        logger.debug(f"Строка подключения: {Config_SQL.SQLALCHEMY_DATABASE_URI}")
-        self.engine = create_engine(Config_SQL.SQLALCHEMY_DATABASE_URI)
-        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+    READ_REPLICA: ClassVar[bool] = True
+    READ_PREFIXES: ClassVar[Tuple[str, ...]] = ('get_', 'find_', 'fetch_')
+    PRIMARY_METHODS: ClassVar[FrozenSet[str]] = frozenset()
+    REPLICA_STICKY_SECONDS: ClassVar[float] = getattr(Config_SQL, 'SQLALCHEMY_REPLICA_STICKY_SECONDS', 5.0)
+
+    def __init__(self, database_url: Optional[str] = None, replica_url: Optional[str] = None):
+        self.engine = get_engine(database_url)
+        self.SessionLocal = get_sessionmaker(database_url)
         self.session = self.SessionLocal()
-        logger.debug("Создан SQLAlchemy Engine и sessionmaker.")
+        replica_url = replica_url or getattr(Config_SQL, 'SQLALCHEMY_REPLICA_DATABASE_URI', None)
+        if replica_url:
+            self.replica_engine = get_engine(replica_url, read_only=True)
+            self.ReplicaSessionLocal = get_sessionmaker(replica_url)
+            self._replica_session = self.ReplicaSessionLocal()
+        else:
+            self.replica_engine = None
+            self.ReplicaSessionLocal = None
+            self._replica_session = None
+        logger.debug("Получен общий SQLAlchemy Engine и sessionmaker.")
+
+    def use_replica(self, method_name: str) -> bool:
+        """
+        Определяет, выполнять ли метод репозитория на реплике.
+
+        Args:
+            method_name (str): Имя вызываемого метода.
+
+        Returns:
+            bool: True — чтение на реплике, False — на основной БД.
+        """
+        if self.replica_engine is None or not self.READ_REPLICA:
+            return False
+        if method_name in self.PRIMARY_METHODS or not method_name.startswith(self.READ_PREFIXES):
+            return False
+        if _current_unit_of_work.get() is not None:
+            return False
+        return time.monotonic() - _last_primary_write.get() >= self.REPLICA_STICKY_SECONDS
+
+    @property
+    def session(self) -> Session:
+        """
+        Текущая сессия: общая сессия активной unit_of_work, сессия реплики
+        для метода чтения или собственная сессия репозитория.
+        """
+        unit_of_work = _current_unit_of_work.get()
+        if unit_of_work is not None:
+            return unit_of_work
+        if _replica_read.get() and self._replica_session is not None:
+            return self._replica_session
+        return self._session
+
+    @session.setter
+    def session(self, value: Session) -> None:
+        self._session = value
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[Session]:
+        """
+        Единица работы: все вызовы репозиториев внутри блока with (в том числе
+        других экземпляров) используют одну сессию и одну транзакцию, которая
+        фиксируется один раз при выходе из блока.
+
+        commit и close внутри методов репозиториев не завершают транзакцию,
+        ошибка любого вызова откатывает всю единицу работы и пробрасывается.
+        Вложенный unit_of_work присоединяется к внешнему.
+
+        Yields:
+            Session: Общая сессия единицы работы.
+        """
+        current = _current_unit_of_work.get()
+        if current is not None:
+            yield current
+            return
+
+        session = UnitOfWorkSession(bind=self.engine, autoflush=False)
+        token = _current_unit_of_work.set(session)
+        try:
+            yield session
+        except BaseException:
+            session.finish(success=False)
+            logger.warning("Единица работы откатана.")
+            raise
+        else:
+            session.finish(success=True)
+            if session.failed:
+                # ошибку внутри блока перехватили, но транзакция уже откатана
+                raise SQLAlchemyError("Единица работы откатана из-за ошибки внутри блока.")
+            logger.debug("Единица работы зафиксирована.")
+        finally:
+            _current_unit_of_work.reset(token)
 
     def create_tables(self) -> None:
         """
@@ -136,11 +484,13 @@ class Database:
 
     def get_session(self) -> Session:
         """
-        Возвращает новую сессию базы данных.
+        Возвращает новую сессию базы данных (реплики — внутри метода чтения).
 
         Returns:
             Session: Экземпляр сессии SQLAlchemy.
         """
+        if _replica_read.get() and self.ReplicaSessionLocal is not None:
+            return self.ReplicaSessionLocal()
         return self.SessionLocal()
 
     @manage_session
@@ -189,6 +539,113 @@ class Database:
         logger.debug(f"Запрошено {len(results)} записей из {model.__tablename__}.")
         return results
 
+    def iter_rows(
+        self,
+        model: Type[T],
+        columns: Optional[List[str]] = None,
+        chunk_size: int = 1000,
+        criteria: Optional[List[Any]] = None,
+    ) -> Iterator[Any]:
+        """
+        Потоково перебирает записи модели через серверный курсор (yield_per),
+        не загружая всю таблицу в память.
+
+        Генератор работает в собственной сессии, которая закрывается после
+        окончания перебора, поэтому не использует manage_session.
+
+        Args:
+            model (Type[T]): Класс модели SQLAlchemy.
+            columns (Optional[List[str]]): Имена полей. Если заданы, возвращаются
+                строки Row только с этими полями, иначе объекты модели.
+            chunk_size (int): Количество строк, получаемых с сервера за раз.
+            criteria (Optional[List[Any]]): Дополнительные условия фильтрации.
+
+        Yields:
+            Any: Объект модели или Row.
+        """
+        # внутри unit_of_work читаем в общей сессии, чтобы видеть её изменения
+        session = self.session if _current_unit_of_work.get() is not None else self.get_session()
+        count = 0
+        try:
+            if columns:
+                query = session.query(*[getattr(model, column) for column in columns])
+            else:
+                query = session.query(model)
+            if criteria:
+                query = query.filter(*criteria)
+            query = query.execution_options(stream_results=True).yield_per(chunk_size)
+            for row in query:
+                count += 1
+                yield row
+        finally:
+            session.close()
+            logger.debug(f"Потоково прочитано {count} записей из {model.__tablename__}.")
+
+    @manage_session
+    def copy_rows(
+        self,
+        model: Type[T],
+        columns: Sequence[str],
+        rows: Iterable[Dict[str, Any]],
+        chunk_size: int = 10000,
+    ) -> int:
+        """
+        Пакетно вставляет строки в таблицу модели через COPY FROM STDIN
+        (psycopg2) и сохраняет изменения. Для других драйверов — через
+        INSERT с несколькими наборами параметров.
+
+        ORM-события модели (before_insert) не вызываются. Внутри unit_of_work
+        строки пишутся в общую транзакцию.
+
+        Args:
+            model (Type[T]): Класс модели SQLAlchemy.
+            columns (Sequence[str]): Заполняемые колонки.
+            rows (Iterable[Dict[str, Any]]): Строки {колонка: значение}.
+            chunk_size (int): Количество строк в одной команде COPY.
+
+        Returns:
+            int: Количество вставленных строк.
+        """
+        table_ = model.__table__
+        connection = self.session.connection()
+        copy_sql = (
+            f'COPY {table_.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+        )
+        total = 0
+        chunk: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            if connection.dialect.driver == 'psycopg2':
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write(','.join(_copy_value(row.get(column)) for column in columns))
+                    buffer.write('\n')
+                buffer.seek(0)
+                cursor = connection.connection.cursor()
+                try:
+                    cursor.copy_expert(copy_sql, buffer)
+                finally:
+                    cursor.close()
+                _last_primary_write.set(time.monotonic())
+            else:
+                connection.execute(
+                    table_.insert(),
+                    [{column: row.get(column) for column in columns} for row in chunk],
+                )
+
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush()
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            flush()
+            total += len(chunk)
+        self.session.commit()
+        logger.debug(f"COPY: вставлено {total} строк в {table_.name}.")
+        return total
+
     @manage_session
     def delete(self, obj: Type[T]) -> None:
         """
@@ -214,6 +671,19 @@ class Database:
             Engine: Экземпляр SQLAlchemy Engine.
         """
         return self.engine
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику пула соединений общего Engine.
+
+        Returns:
+            Dict[str, Any]: Размер пула, занятые/свободные соединения,
+            overflow, количество checkout и время ожидания соединения.
+        """
+        pool = self.engine.pool
+        if isinstance(pool, InstrumentedQueuePool):
+            return pool.stats()
+        return {'status': pool.status()}
     
     def _get_pk_fields(self, model: Type[T]) -> List[Column]:
         """
@@ -332,12 +802,15 @@ class Database:
         return results
 
     @manage_session
-    def update(self, obj: Type[T]) -> None:
+    def update(self, obj: Type[T]) -> bool:
         """
         Обновляет запись в базе данных.
 
         Args:
             obj (Base): Объект модели SQLAlchemy.
+
+        Returns:
+            bool: True после записи (None, если ошибку перехватил manage_session).
         """
         try:
             if not self.session.object_session(obj):
@@ -345,6 +818,7 @@ class Database:
                 logger.debug(f"Объект добавлен в сессию: {obj}")
             self.session.commit()
             logger.info(f"Обновлен объект: {obj}")
+            return True
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при обновлении объекта {obj}: {e}")
             raise
@@ -0,0 +1,106 @@
+# app/data/database/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class LRUTTLCache:
+    """
+    Потокобезопасный кэш результатов запросов: LRU с ограничением размера
+    и временем жизни записей.
+
+    Каждая запись относится к группе (например, id_metric), что позволяет
+    точечно инвалидировать записи группы по условию, не просматривая весь кэш.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение и отмечает его как недавно использованное."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, _, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, group: Hashable = None) -> None:
+        """Сохраняет значение, вытесняя самые давно использованные записи."""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, group, value)
+            self._groups.setdefault(group, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, groups: Tuple[Hashable, ...], predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Удаляет записи указанных групп, для которых predicate(key, value) истинно.
+
+        Returns:
+            int: Количество удаленных записей.
+        """
+        removed = 0
+        with self._lock:
+            for group in groups:
+                for key in list(self._groups.get(group, ())):
+                    if predicate(key, self._data[key][2]):
+                        self._remove(key)
+                        removed += 1
+            self.invalidations += removed
+        return removed
+
+    def groups(self) -> Tuple[Hashable, ...]:
+        """Текущие группы записей."""
+        with self._lock:
+            return tuple(self._groups)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._groups.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий/промахов и текущий размер кэша."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> Optional[Any]:
+        _, group, value = self._data.pop(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+        return value
@@ -0,0 +1,288 @@
+# app/data/database/instrumentation.py
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import Config_SQL
+from app.logging_config import logger
+
+# Пороговые значения (переопределяются в Config_SQL)
+INSTRUMENTATION_ENABLED = getattr(Config_SQL, 'SQL_INSTRUMENTATION', True)
+# Шаблон запроса, повторенный в области больше N раз, считается N+1
+N_PLUS_ONE_THRESHOLD = getattr(Config_SQL, 'SQL_N_PLUS_ONE_THRESHOLD', 10)
+# Запросы дольше порога (мс) считаются медленными
+SLOW_QUERY_MS = getattr(Config_SQL, 'SQL_SLOW_QUERY_MS', 500.0)
+# Снимать EXPLAIN ANALYZE медленных SELECT. Выключено по умолчанию: запрос
+# выполняется повторно, пока ждет HTTP-запрос, то есть удваивает цену медленных страниц
+EXPLAIN_SLOW = getattr(Config_SQL, 'SQL_EXPLAIN_SLOW', False)
+# Не больше стольких планов на одну область
+EXPLAIN_LIMIT = getattr(Config_SQL, 'SQL_EXPLAIN_LIMIT', 5)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER = re.compile(r'%\([^)]+\)s|%s|\$\d+')
+_PARAMETER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Приводит SQL к шаблону: литералы и параметры заменяются на ?,
+    списки IN (?, ?, ...) сворачиваются, пробелы схлопываются.
+    Запросы, отличающиеся только значениями, дают одинаковый шаблон.
+    """
+    sql = _STRING_LITERAL.sub('?', statement)
+    sql = _PARAMETER.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PARAMETER_LIST.sub('(?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryScope:
+    """
+    Область учета SQL-запросов: HTTP-запрос Flask/Dash или CLI-задача.
+
+    Накапливает количество и суммарное время запросов, число повторов
+    каждого шаблона SQL и планы медленных запросов. Запросы могут
+    приходить из нескольких потоков (фоновый цикл run_async), поэтому
+    изменения выполняются под блокировкой.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.patterns: Counter = Counter()
+        self.pattern_duration: Dict[str, float] = {}
+        self.slow: List[Tuple[float, str, Optional[List[str]]]] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float) -> str:
+        """Учитывает выполненный запрос и возвращает его шаблон."""
+        pattern = normalize_sql(statement)
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.patterns[pattern] += 1
+            self.pattern_duration[pattern] = self.pattern_duration.get(pattern, 0.0) + duration
+        return pattern
+
+    def add_slow(self, duration: float, pattern: str, plan: Optional[List[str]]) -> None:
+        with self._lock:
+            self.slow.append((duration, pattern, plan))
+
+    def wants_explain(self, pattern: str) -> bool:
+        """Нужен ли план для медленного запроса: лимит и без повторов шаблона."""
+        with self._lock:
+            return len(self.slow) < EXPLAIN_LIMIT and all(p != pattern for _, p, _ in self.slow)
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int, float]]:
+        """
+        Шаблоны, повторенные больше threshold раз (подозрение на N+1).
+
+        Returns:
+            List[Tuple[str, int, float]]: (шаблон, количество, суммарное время в с),
+            по убыванию количества.
+        """
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        with self._lock:
+            return [
+                (pattern, count, self.pattern_duration[pattern])
+                for pattern, count in self.patterns.most_common()
+                if count > threshold
+            ]
+
+    def summary(self) -> Dict[str, Any]:
+        """Итоги области для логов и отчетов."""
+        with self._lock:
+            count, duration, slow = self.count, self.duration, len(self.slow)
+        return {
+            'scope': self.name,
+            'queries': count,
+            'db_ms': round(duration * 1000, 2),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'n_plus_one': len(self.repeated()),
+            'slow': slow,
+        }
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: время БД и количество запросов."""
+        summary = self.summary()
+        return f'db;dur={summary["db_ms"]};desc="{summary["queries"]} SQL"'
+
+
+_current_scope: ContextVar[Optional[QueryScope]] = ContextVar('current_query_scope', default=None)
+
+
+def current_scope() -> Optional[QueryScope]:
+    """Активная область учета запросов или None."""
+    return _current_scope.get()
+
+
+def _log_scope(scope: QueryScope) -> None:
+    """Итоговая строка области, предупреждения N+1 и планы медленных запросов."""
+    summary = scope.summary()
+    logger.info(
+        f"SQL [{summary['scope']}]: {summary['queries']} запросов, {summary['db_ms']} мс в БД "
+        f"из {summary['elapsed_ms']} мс, N+1: {summary['n_plus_one']}, медленных: {summary['slow']}"
+    )
+    for pattern, count, duration in scope.repeated():
+        logger.warning(
+            f"SQL [{scope.name}]: возможный N+1 — {count} повторов, {duration * 1000:.1f} мс: {pattern[:300]}"
+        )
+    for duration, pattern, plan in scope.slow:
+        details = '\n'.join(plan) if plan else 'план не снят'
+        logger.warning(
+            f"SQL [{scope.name}]: медленный запрос {duration * 1000:.1f} мс: {pattern[:300]}\n{details}"
+        )
+
+
+@contextmanager
+def query_scope(name: str) -> Iterator[QueryScope]:
+    """
+    Область учета SQL-запросов. Все запросы общих движков внутри блока with
+    (в том числе из run_async) учитываются в ней; при выходе в лог пишется
+    итоговая строка. Вложенная область присоединяется к внешней.
+
+    Args:
+        name (str): Имя области (например, 'GET /region/150' или имя CLI-скрипта).
+
+    Yields:
+        QueryScope: Активная область.
+    """
+    current = _current_scope.get()
+    if current is not None:
+        yield current
+        return
+    scope = QueryScope(name)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        _log_scope(scope)
+
+
+@contextmanager
+def attach_scope(scope: QueryScope) -> Iterator[QueryScope]:
+    """
+    Делает уже открытую область активной в другом потоке или задаче
+    (например, в фоновом цикле run_async). Итоги при выходе не пишутся.
+    """
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def start_scope(name: str) -> Tuple[QueryScope, Any]:
+    """
+    Открывает область без блока with (для пар before/after_request).
+    Возвращает область и токен для finish_scope.
+    """
+    scope = QueryScope(name)
+    return scope, _current_scope.set(scope)
+
+
+def finish_scope(scope: QueryScope, token: Any) -> None:
+    """Закрывает область, открытую start_scope, и пишет итоги в лог."""
+    _current_scope.reset(token)
+    _log_scope(scope)
+
+
+def _explain(connection, cursor, statement: str, parameters: Any) -> Optional[List[str]]:
+    """
+    Снимает EXPLAIN ANALYZE запроса на том же соединении. Внутри транзакции
+    выполняется в точке сохранения, чтобы ошибка не прервала транзакцию.
+    """
+    dbapi_connection = cursor.connection
+    in_transaction = not getattr(dbapi_connection, 'autocommit', False)
+    explain_cursor = dbapi_connection.cursor()
+    try:
+        if in_transaction:
+            explain_cursor.execute('SAVEPOINT sql_instrumentation_explain')
+        try:
+            explain_cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters)
+            plan = [row[0] for row in explain_cursor.fetchall()]
+        except Exception as e:
+            if in_transaction:
+                explain_cursor.execute('ROLLBACK TO SAVEPOINT sql_instrumentation_explain')
+            logger.debug(f"Не удалось снять EXPLAIN ANALYZE: {e}")
+            return None
+        if in_transaction:
+            explain_cursor.execute('RELEASE SAVEPOINT sql_instrumentation_explain')
+        return plan
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if _current_scope.get() is not None and context is not None:
+        context._sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    scope = _current_scope.get()
+    started = getattr(context, '_sql_started', None)
+    if scope is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    pattern = scope.record(statement, duration)
+    if duration * 1000 < SLOW_QUERY_MS:
+        return
+    plan = None
+    # Повторное выполнение безопасно только для чтения; asyncpg-курсор синхронно не доступен
+    if (EXPLAIN_SLOW and not executemany and connection.dialect.driver == 'psycopg2'
+            and statement.lstrip()[:6].upper() == 'SELECT'
+            and scope.wants_explain(pattern)):
+        plan = _explain(connection, cursor, statement, parameters)
+    scope.add_slow(duration, pattern, plan)
+
+
+def install(engine: Engine) -> None:
+    """
+    Подключает учет запросов к движку (для AsyncEngine — к его sync_engine).
+    Повторный вызов для того же движка ничего не делает.
+    """
+    if not INSTRUMENTATION_ENABLED:
+        return
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_app(app) -> None:
+    """
+    Подключает учет запросов к Flask-приложению: каждый HTTP-запрос (включая
+    колбэки Dash /_dash-update-component) — отдельная область; итоги пишутся
+    в лог и в заголовок Server-Timing ответа.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_query_scope():
+        g.query_scope, g.query_scope_token = start_scope(f'{request.method} {request.path}')
+
+    @app.after_request
+    def _add_server_timing(response):
+        scope = g.get('query_scope')
+        if scope is not None:
+            response.headers.add('Server-Timing', scope.server_timing())
+        return response
+
+    @app.teardown_request
+    def _finish_query_scope(exc=None):
+        scope = g.pop('query_scope', None)
+        token = g.pop('query_scope_token', None)
+        if scope is not None:
+            finish_scope(scope, token)
@@ -0,0 +1,107 @@
+# app/data/database/migrations.py
+
+import re
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy.engine import Engine
+
+from app.logging_config import logger
+from app.data.database.base_repository import get_engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[3] / 'migrations'
+
+# Учет примененных миграций: имя файла и время применения
+_CREATE_TRACKING_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    filename text PRIMARY KEY,
+    applied_at timestamp NOT NULL DEFAULT now()
+)
+"""
+
+
+# Включение другого файла, как в psql: \i путь или \ir путь (относительно файла)
+_INCLUDE = re.compile(r'^\s*\\ir?\s+(\S+)\s*$')
+
+
+def read_migration(path: Path) -> str:
+    """
+    Читает SQL-файл миграции, подставляя файлы из команд \\i и \\ir psql.
+
+    Пути разрешаются относительно каталога файла, как у \\ir, поэтому
+    миграция одинаково выполняется через psql -f из каталога migrations/
+    и через apply_migrations.
+
+    Args:
+        path (Path): Файл миграции.
+
+    Returns:
+        str: Текст миграции с подставленными файлами.
+    """
+    lines = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        include = _INCLUDE.match(line)
+        lines.append(read_migration(path.parent / include.group(1)) if include else line)
+    return '\n'.join(lines)
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Делит SQL-файл миграции на отдельные команды.
+
+    Строки-комментарии (--) отбрасываются, команды разделяются точкой
+    с запятой в конце строки. Каждая команда выполняется отдельно, так
+    как CREATE INDEX CONCURRENTLY нельзя выполнять в блоке транзакции.
+
+    Args:
+        sql (str): Текст миграции.
+
+    Returns:
+        List[str]: Команды без завершающей точки с запятой.
+    """
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith('--')]
+    statements = re.split(r';\s*$', '\n'.join(lines), flags=re.MULTILINE)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def apply_migrations(
+    directory: Optional[Path] = None,
+    engine: Optional[Engine] = None,
+) -> List[str]:
+    """
+    Применяет еще не примененные SQL-миграции из каталога migrations/
+    в порядке имен файлов и отмечает их в таблице schema_migrations.
+
+    Команды выполняются в режиме AUTOCOMMIT; при ошибке применение
+    останавливается, а файл не отмечается примененным.
+
+    Args:
+        directory (Optional[Path]): Каталог миграций. По умолчанию MIGRATIONS_DIR.
+        engine (Optional[Engine]): Движок. По умолчанию общий get_engine().
+
+    Returns:
+        List[str]: Имена примененных файлов.
+    """
+    directory = Path(directory or MIGRATIONS_DIR)
+    engine = engine or get_engine()
+    applied_now = []
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        connection.exec_driver_sql(_CREATE_TRACKING_TABLE)
+        applied = {
+            row[0] for row in connection.exec_driver_sql('SELECT filename FROM schema_migrations')
+        }
+        for path in sorted(directory.glob('*.sql')):
+            if path.name in applied:
+                logger.debug(f"Миграция {path.name} уже применена.")
+                continue
+            logger.info(f"Применение миграции {path.name}...")
+            for statement in split_statements(read_migration(path)):
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql(
+                'INSERT INTO schema_migrations (filename) VALUES (%(filename)s)',
+                {'filename': path.name},
+            )
+            applied_now.append(path.name)
+            logger.info(f"Миграция {path.name} применена.")
+    return applied_now
@@ -1,13 +1,23 @@
 
-from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+import threading
+import time
+from collections import namedtuple
+from typing import Any, ClassVar, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Type, TypeVar, Union
 
+import numpy as np
+import pandas as pd
 from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import JSONB, array, insert as pg_insert
+from sqlalchemy import (
+    and_, or_, func, select, text, tuple_, column, table, Integer,
+    Column, MetaData, Sequence, Table,
+)
 
 from app.logging_config import logger
 from app.data.database import Database, manage_session, JSONRepository
+from app.data.database.base_repository import _current_unit_of_work
+from app.data.database.cache import LRUTTLCache
 from app.models import (
     Sync,
     Region,
@@ -17,19 +27,86 @@ from app.models import (
     Photo,
     Review,
     City,
-    Metric
+    Metric,
+    metric_value_natural_key,
+    metric_value_partition,
+    parse_metric_value,
+    parse_id_yandex,
+    location_types_from_characters,
+    parse_review_date,
 )
 
 
 Base = declarative_base()
 T = TypeVar("T", bound=DeclarativeMeta)
 
+# Неизменяемая копия строки metric_values, которую возвращает get_info_metricvalue
+MetricValueRow = namedtuple('MetricValueRow', (
+    'id_mv', 'id_metric', 'id_region', 'id_city', 'id_location', 'type_location',
+    'value', 'value_num', 'location_types', 'month', 'year', 'create_time', 'modify_time',
+))
+
 class SyncRepository(Database):
     """
     Репозиторий для работы с моделью Sync.
+
+    Поиск соответствий идет по общему для процесса индексу таблицы sync
+    в памяти: (input_value, object_type, input_from) -> id_to и
+    (id_to, object_type, input_from) -> input_value. Индекс загружается
+    при первом обращении, перечитывается по истечении INDEX_TTL секунд и
+    сбрасывается при изменении таблицы (fill, import_csv).
     """
 
-    @manage_session
+    INDEX_TTL: ClassVar[float] = 600.0
+    _index_by_value: ClassVar[Optional[Dict[Tuple[str, str, str], int]]] = None
+    _index_by_id: ClassVar[Optional[Dict[Tuple[int, str, str], str]]] = None
+    _index_loaded_at: ClassVar[float] = 0.0
+    _index_lock: ClassVar[threading.Lock] = threading.Lock()
+    # Индекс общий для процесса и живет INDEX_TTL: читаем только с основной БД,
+    # чтобы не закэшировать отстающее состояние реплики
+    READ_REPLICA: ClassVar[bool] = False
+    # object_type записей sync по таблице модели — тот же ключ, что в find_id(..., 'region', ...)
+    OBJECT_TYPES: ClassVar[Dict[str, str]] = {'regions': 'region', 'cities': 'city'}
+
+    @classmethod
+    def invalidate_index(cls) -> None:
+        """
+        Сбрасывает индекс sync; следующий поиск перечитает таблицу.
+        """
+        with cls._index_lock:
+            cls._index_by_value = None
+            cls._index_by_id = None
+            cls._index_loaded_at = 0.0
+        logger.debug("Индекс sync сброшен.")
+
+    def _ensure_index(self) -> Tuple[Dict[Tuple[str, str, str], int], Dict[Tuple[int, str, str], str]]:
+        """
+        Загружает индекс sync, если он отсутствует или устарел.
+
+        Returns:
+            Tuple[Dict, Dict]: Прямой и обратный индексы.
+        """
+        cls = type(self)
+        by_value, by_id = cls._index_by_value, cls._index_by_id
+        if by_value is not None and by_id is not None and time.monotonic() - cls._index_loaded_at < cls.INDEX_TTL:
+            return by_value, by_id
+        with cls._index_lock:
+            by_value, by_id = cls._index_by_value, cls._index_by_id
+            if by_value is not None and by_id is not None and time.monotonic() - cls._index_loaded_at < cls.INDEX_TTL:
+                return by_value, by_id
+            by_value: Dict[Tuple[str, str, str], int] = {}
+            by_id: Dict[Tuple[int, str, str], str] = {}
+            columns = ['id_to', 'object_type', 'input_value', 'input_from']
+            for row in self.iter_rows(Sync, columns=columns, chunk_size=5000):
+                # При дублях сохраняется первое соответствие, как у прежнего .first()
+                by_value.setdefault((row.input_value, row.object_type, row.input_from), row.id_to)
+                by_id.setdefault((row.id_to, row.object_type, row.input_from), row.input_value)
+            cls._index_by_value = by_value
+            cls._index_by_id = by_id
+            cls._index_loaded_at = time.monotonic()
+        logger.info(f"Загружен индекс sync: {len(by_value)} соответствий.")
+        return by_value, by_id
+
     def find_id(
         self, input_value: str, object_type: str, input_from: str
     ) -> Optional[int]:
@@ -44,64 +121,124 @@ class SyncRepository(Database):
         Returns:
             Optional[int]: Найденный id_to или None.
         """
-        sync_entry = (
-            self.session.query(Sync)
-            .filter(
-                Sync.input_value == input_value,
-                Sync.object_type == object_type,
-                Sync.input_from == input_from,
-            )
-            .first()
-        )
-        logger.debug(f"Поиск Sync id_to: {sync_entry.id_to if sync_entry else None}")
-        return sync_entry.id_to if sync_entry else None
+        by_value, _ = self._ensure_index()
+        id_to = by_value.get((input_value, object_type, input_from))
+        logger.debug(f"Поиск Sync id_to: {id_to}")
+        return id_to
+
+    def find_value(
+        self, id_to: int, object_type: str, input_from: str
+    ) -> Optional[str]:
+        """
+        Находит input_value по значениям id_to, object_type и input_from.
+
+        Args:
+            id_to (int): Идентификатор целевого объекта.
+            object_type (str): Тип объекта.
+            input_from (str): Источник входных данных.
+
+        Returns:
+            Optional[str]: Найденное input_value или None.
+        """
+        _, by_id = self._ensure_index()
+        return by_id.get((id_to, object_type, input_from))
 
     @manage_session
     def fill(
-        self, model: Type[T], input_from: str, df: Dict[Any, Any]
-    ) -> None:
+        self,
+        model: Type[T],
+        input_from: str,
+        df: Dict[Any, Any],
+        object_type: Optional[str] = None,
+    ) -> Dict[str, int]:
         """
-        Заполняет таблицу Sync на основе данных модели и DataFrame.
+        Синхронизирует таблицу Sync с соответствиями внешнего источника.
+
+        Разница вычисляется в памяти по одному снимку строк sync источника
+        input_from и типа объекта (ключ — id_to), затем вставки и обновления
+        применяются пакетно в одной транзакции. В снимок попадают и записи
+        с именем таблицы модели в object_type (так писал прежний fill,
+        например 'regions'): они переводятся на object_type ключа поиска.
+        Записи других типов того же источника (город с тем же id_to, что
+        у региона) не затрагиваются.
 
         Args:
-            model (Type[Base]): Класс модели SQLAlchemy.
+            model (Type[Base]): Класс модели SQLAlchemy, на объекты которой ссылается id_to.
             input_from (str): Источник данных.
-            df (Dict[Any, Any]): Данные для заполнения.
-        """
-        existing_records = self.get_all(model)
-        logger.debug(f"Существующие записи в модели {model.__tablename__}: {len(existing_records)}")
-
-        for row in existing_records:
-            pk_name = model.__table__.primary_key.columns.keys()[0]
-            pk_value = getattr(row, pk_name)
-            if not self.get_by_fields(
-                Sync, input_from=input_from, id_to=pk_value
-            ):
-                sync = Sync(
-                    id_to=pk_value,
-                    object_type=model.__table__.name,
-                    input_from=input_from,
-                )
-                self.add(sync)
-                logger.info(f"Добавлен Sync объект для id_to={pk_value}")
-
-        for key, value in df.items():
-            sync = Sync(
-                input_value=key if isinstance(key, str) else key[0],
-                id_to=value,
-                input_from=input_from,
-            )
-            existing_sync = self.get_by_fields(
-                Sync, input_from=input_from, id_to=value
-            )
-            if existing_sync:
-                sync.id_sync = existing_sync[0].id_sync
-                self.update(sync)
-                logger.info(f"Обновлен Sync объект с id_sync={sync.id_sync}")
+            df (Dict[Any, Any]): Соответствия {input_value (или кортеж с ним первым): id_to}.
+            object_type (Optional[str]): Тип объекта записей.
+                По умолчанию OBJECT_TYPES по таблице модели (иначе имя таблицы).
+
+        Returns:
+            Dict[str, int]: Количество записей inserted, updated и unchanged.
+        """
+        legacy_type = model.__table__.name
+        object_type = object_type or self.OBJECT_TYPES.get(legacy_type, legacy_type)
+        summary = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        # Снимок существующих соответствий источника и типа объекта: id_to -> первая
+        # запись, записи с актуальным object_type предпочитаются прежним
+        existing: Dict[int, Any] = {}
+        rows = (
+            self.session.query(Sync.id_sync, Sync.id_to, Sync.input_value, Sync.object_type)
+            .filter(Sync.input_from == input_from, Sync.object_type.in_({object_type, legacy_type}))
+            .order_by(Sync.id_sync)
+            .all()
+        )
+        for row in sorted(rows, key=lambda row: row.object_type != object_type):
+            existing.setdefault(row.id_to, row)
+
+        # Повторный id_to во входных данных заменяет значение уже поставленной
+        # в очередь вставки или обновления (побеждает последнее), а не добавляет строку
+        inserts: Dict[int, Dict[str, Any]] = {}
+        updates: Dict[int, Dict[str, Any]] = {}
+        unchanged: Set[int] = set()
+        for key, id_to in df.items():
+            input_value = key if isinstance(key, str) else key[0]
+            if id_to in inserts:
+                inserts[id_to]['input_value'] = input_value
+                continue
+            current = existing.get(id_to)
+            if current is None:
+                inserts[id_to] = {
+                    'id_to': id_to,
+                    'object_type': object_type,
+                    'input_value': input_value,
+                    'input_from': input_from,
+                }
+            elif current.input_value == input_value and current.object_type == object_type:
+                updates.pop(current.id_sync, None)
+                unchanged.add(current.id_sync)
             else:
-                self.add(sync)
-                logger.info(f"Добавлен новый Sync объект с id_to={value}")
+                unchanged.discard(current.id_sync)
+                updates[current.id_sync] = {
+                    'id_sync': current.id_sync,
+                    'input_value': input_value,
+                    'object_type': object_type,
+                }
 
+        if inserts:
+            self.session.bulk_insert_mappings(Sync, list(inserts.values()))
+        if updates:
+            self.session.bulk_update_mappings(Sync, list(updates.values()))
+        self.session.commit()
+        summary['inserted'] = len(inserts)
+        summary['updated'] = len(updates)
+        summary['unchanged'] = len(unchanged)
+
+        pk_name = model.__table__.primary_key.columns.keys()[0]
+        unmatched = sum(
+            1 for row in self.iter_rows(model, columns=[pk_name])
+            if getattr(row, pk_name) not in existing and getattr(row, pk_name) not in inserts
+        )
+        if unmatched:
+            logger.warning(
+                f"Для {unmatched} записей {model.__tablename__} нет соответствия в источнике {input_from}."
+            )
+
+        self.invalidate_index()
+        logger.info(f"Синхронизация sync ({input_from}): {summary}")
+        return summary
 
 
 class RegionRepository(JSONRepository):
@@ -158,11 +295,86 @@ class MetricRepository(Database):
             logger.error(f"MetricRepository - get_id_type_location - не нашлось id при metric_name = {metric_name}")
         return records
 
+    @manage_session
+    def get_metric_ids(self, metric_names: Iterable[str]) -> Dict[str, int]:
+        """
+        Получение id нескольких метрик по названиям одним запросом.
+
+        Returns:
+            Dict[str, int]: {metric_name: id_metrics}; ненайденные названия отсутствуют.
+        """
+        metric_names = list(dict.fromkeys(metric_names))
+        rows = (
+            self.session
+            .query(Metric.metric_name, Metric.id_metrics)
+            .filter(Metric.metric_name.in_(metric_names))
+            .all()
+        )
+        result = {name: id_metric for name, id_metric in rows}
+        missing = [name for name in metric_names if name not in result]
+        if missing:
+            logger.error(f"MetricRepository - get_metric_ids - не нашлось id при metric_name = {missing}")
+        return result
+
 class MetricValueRepository(Database):
     """
     Репозиторий для работы с моделью MetricValue.
     """
 
+    # Поля натурального ключа значения метрики
+    NATURAL_KEY = ('id_metric', 'id_region', 'id_city', 'id_location', 'type_location', 'month', 'year')
+    # Поля, которые принимает bulk_upsert
+    UPSERT_COLUMNS = NATURAL_KEY + ('value', 'location_types')
+    UPSERT_BATCH_SIZE = 1000
+    # Агрегаты, доступные в aggregate_values
+    AGGREGATES = {
+        'sum': func.sum,
+        'avg': func.avg,
+        'min': func.min,
+        'max': func.max,
+        'count': func.count,
+    }
+
+    # Колонки fetch_frame по умолчанию
+    FRAME_COLUMNS = ('id_metric', 'id_region', 'id_city', 'id_location', 'value_num', 'month', 'year')
+    FRAME_CHUNK_SIZE = 10000
+
+    # Кэш get_info_metricvalue общий для процесса: ключ — нормализованные фильтры,
+    # группа — id_metric. Записи инвалидируются при записи значений той же метрики
+    # и сущности (loading_info, fill_weather, bulk_upsert) только в этом процессе:
+    # записи других процессов (воркеры run_base_assessment.py, импорт) становятся
+    # видны здесь не позже чем через INFO_CACHE_TTL. Дашборды кэш не читают.
+    # Внутри unit_of_work кэш используется для фильтров, под которые не попадают
+    # записи этой единицы работы, а после её фиксации записи инвалидируются повторно.
+    INFO_CACHE_SIZE = 4096
+    INFO_CACHE_TTL = 300.0
+    _info_cache: ClassVar[LRUTTLCache] = LRUTTLCache(maxsize=INFO_CACHE_SIZE, ttl=INFO_CACHE_TTL)
+    # Кэш общий для процесса: заполняется только чтениями с основной БД,
+    # чтобы не сохранить на INFO_CACHE_TTL отстающее состояние реплики
+    PRIMARY_METHODS: ClassVar[FrozenSet[str]] = frozenset({'get_info_metricvalue'})
+
+    # Секционирована ли metric_values (migrations/006); None — еще не проверялось.
+    # Натуральный ключ с COALESCE существует только в секциях, поэтому
+    # bulk_upsert в секционированной таблице пишет напрямую в секции.
+    _partitioned: ClassVar[Optional[bool]] = None
+    _partition_tables: ClassVar[Dict[str, Table]] = {}
+
+    @staticmethod
+    def _filter_values(query, filters: Dict[str, Any]):
+        """
+        Добавляет к запросу фильтры по полям MetricValue:
+        None — IS NULL, список/кортеж/множество — IN, иначе равенство.
+        """
+        for key, value in filters.items():
+            column = getattr(MetricValue, key)
+            if value is None:
+                query = query.filter(column.is_(None))
+            elif isinstance(value, (list, tuple, set)):
+                query = query.filter(column.in_(list(value)))
+            else:
+                query = query.filter(column == value)
+        return query
+
     @manage_session
     def get_value_location(self, id_metric:str, id_region:str = '', id_city:str = ''):
         """
@@ -174,7 +386,7 @@ class MetricValueRepository(Database):
                 self.get_session()
                 .query(
                     MetricValue.id_location,
-                    MetricValue.value
+                    MetricValue.value_num.label('value')
                 )
                 .filter(MetricValue.id_metric == int(id_metric),
                         MetricValue.id_region == int(id_region)
@@ -186,7 +398,7 @@ class MetricValueRepository(Database):
                 self.get_session()
                 .query(
                     MetricValue.id_location,
-                    MetricValue.value
+                    MetricValue.value_num.label('value')
                 )
                 .filter(MetricValue.id_metric == int(id_metric),
                         MetricValue.id_city == int(id_city)
@@ -198,6 +410,60 @@ class MetricValueRepository(Database):
             logger.error(f"MetricRepository - get_id_type_location - не нашлось ни одной метрики при id_metric = {id_metric}, id_r = {id_region}, id_c = {id_city}")
         return records
 
+    @manage_session
+    def fetch_frame(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        columns: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Загружает значения метрик в DataFrame без создания ORM-объектов.
+
+        Выполняет Core-select и заполняет NumPy-массивы колонок порциями
+        fetchmany, поэтому identity map и __dict__ объектов не используются.
+
+        Args:
+            filters (Optional[Dict[str, Any]]): Фильтры по полям MetricValue
+                (None — IS NULL, список — IN), например {'id_metric': 2}.
+            columns (Optional[List[str]]): Колонки результата. По умолчанию FRAME_COLUMNS.
+            chunk_size (Optional[int]): Размер порции fetchmany. По умолчанию FRAME_CHUNK_SIZE.
+
+        Returns:
+            pd.DataFrame: Целочисленные колонки — Int64 (с NA), value_num — float64,
+            остальные — object.
+        """
+        columns = list(columns or self.FRAME_COLUMNS)
+        chunk_size = chunk_size or self.FRAME_CHUNK_SIZE
+        table = MetricValue.__table__
+        stmt = self._filter_values(select(*[table.c[name] for name in columns]), filters or {})
+
+        chunks: Dict[str, List[np.ndarray]] = {name: [] for name in columns}
+        numeric = {
+            name: isinstance(table.c[name].type, Integer) or name == 'value_num'
+            for name in columns
+        }
+        result = self.session.connection().execution_options(stream_results=True).execute(stmt)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            for name, values in zip(columns, zip(*rows)):
+                # None в числовых колонках превращается в NaN
+                chunks[name].append(np.array(values, dtype=np.float64 if numeric[name] else object))
+
+        data = {}
+        for name in columns:
+            array_ = np.concatenate(chunks[name]) if chunks[name] else np.array(
+                [], dtype=np.float64 if numeric[name] else object)
+            if numeric[name] and name != 'value_num':
+                data[name] = pd.array(array_, dtype='Int64')
+            else:
+                data[name] = array_
+        frame = pd.DataFrame(data, columns=columns)
+        logger.debug(f"fetch_frame: загружено {len(frame)} строк по фильтрам {filters}")
+        return frame
+
     @manage_session
     def get_tourist_count_data(self) -> List[MetricValue]:
         """
@@ -210,7 +476,7 @@ class MetricValueRepository(Database):
             self.get_session()
             .query(
                 MetricValue.id_region,
-                MetricValue.value,
+                MetricValue.value_num.label('value'),
                 MetricValue.month,
                 MetricValue.year,
             )
@@ -238,7 +504,7 @@ class MetricValueRepository(Database):
             self.get_session()
             .query(
                 MetricValue.id_region,
-                MetricValue.value,
+                MetricValue.value_num.label('value'),
                 MetricValue.month,
                 MetricValue.year,
             )
@@ -271,7 +537,7 @@ class MetricValueRepository(Database):
             self.get_session()
             .query(
                 MetricValue.id_region,
-                MetricValue.value,
+                MetricValue.value_num.label('value'),
                 MetricValue.month,
                 MetricValue.year,
             )
@@ -303,39 +569,22 @@ class MetricValueRepository(Database):
             "rainfall": 215,
             "water": 216,
         }
+        records = []
         for month, temperatures in value.items():
             for d_n_r_w, number in temperatures.items():
                 metric_id = ratio.get(d_n_r_w)
                 if not metric_id:
                     logger.warning(f"Неизвестный тип метрики: {d_n_r_w}")
                     continue
-                mv = MetricValue(
-                    id_city=city_id,
-                    id_metric=metric_id,
-                    value=str(number),
-                    month=month,
-                    year=2023,
-                )
-                existing_mv = self.get_by_fields(
-                    MetricValue,
-                    id_city=city_id,
-                    id_metric=metric_id,
-                    value=str(number),
-                    month=month,
-                    year=2023,
-                )
-                if existing_mv:
-                    mv.id_mv = existing_mv[0].id_mv
-                    self.update(mv)
-                    logger.info(
-                        f"Обновлен параметр {metric_id} для города {city_id}."
-                    )
-                else:
-                    self.add(mv)
-                    logger.info(
-                        f"Добавлен параметр {metric_id} для города {city_id}."
-                    )
-        logger.info(f"Обработка города {city_id} завершена.")
+                records.append({
+                    "id_city": city_id,
+                    "id_metric": metric_id,
+                    "value": number,
+                    "month": month,
+                    "year": 2023,
+                })
+        count = self.bulk_upsert(records)
+        logger.info(f"Обработка города {city_id} завершена, записано параметров: {count}.")
         
     @manage_session
     def get_city_weather(
@@ -368,7 +617,7 @@ class MetricValueRepository(Database):
             records[key] = (
             self.session
             .query(
-                MetricValue.value,
+                MetricValue.value_num.label('value'),
                 MetricValue.month
             )
             .filter(
@@ -386,6 +635,9 @@ class MetricValueRepository(Database):
     def loading_info(self, id_mv = '', **kwargs):
         """
         Загружает расчитанные значения по локациям в БД
+
+        Returns:
+            bool: True, если значение записано.
         """
         try:
             mv = MetricValue()
@@ -394,45 +646,389 @@ class MetricValueRepository(Database):
                     setattr(mv, key, value)
             if id_mv:
                 mv.id_mv = id_mv
-                self.update(obj=mv)
+                if not self.update(obj=mv):
+                    return False
                 self.session.close()
+                self.invalidate_info_cache([kwargs], id_mv=id_mv)
             
             else:
-                self.add(obj=mv)
+                if self.add(obj=mv) is None:
+                    return False
                 self.session.close()
+                self.invalidate_info_cache([kwargs])
                 metric = self.get_info_metricvalue(**kwargs)[0]
                 logger.info(f"Добавлена значение Метрики: N/A - Value: {metric.value} (ID: {metric.id_mv})")
+            return True
         except Exception as e:
             logger.error(f'Ошибка в loading_info: {e}')
+            return False
     
     @manage_session
-    def get_info_metricvalue(self, **kwargs):
+    def bulk_upsert(
+        self,
+        records: Iterable[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+    ) -> int:
         """
-        Получение значений метрик из БД
+        Пакетно вставляет или обновляет значения метрик по натуральному ключу
+        (id_metric, id_region, id_city, id_location, type_location, month, year)
+        через INSERT ... ON CONFLICT DO UPDATE.
+
+        Пустые строки в полях ключа трактуются как NULL, как и в loading_info,
+        идентификаторы приводятся к int.
+        При повторе ключа в records побеждает последняя запись.
+        Если metric_values секционирована, записи пишутся в секции своих метрик.
+
+        Args:
+            records (Iterable[Dict[str, Any]]): Записи с полями из UPSERT_COLUMNS.
+            batch_size (Optional[int]): Размер пакета. По умолчанию UPSERT_BATCH_SIZE.
+
+        Returns:
+            int: Количество записанных значений.
         """
-        id_metric = kwargs.get('id_metric')
-        id_region = kwargs.get('id_region',0)
-        id_city = kwargs.get('id_city',0)
-        id_location = kwargs.get('id_location',0)
-        q = self.session.query(MetricValue)
+        batch_size = batch_size or self.UPSERT_BATCH_SIZE
+        rows: Dict[tuple, Dict[str, Any]] = {}
+        for record in records:
+            row = {}
+            for column in self.UPSERT_COLUMNS:
+                item = record.get(column)
+                row[column] = None if isinstance(item, str) and item == '' else item
+            # '150' и 150 — один ключ (и одна секция), как в ключах кэша
+            for column in self.INFO_ID_FIELDS:
+                row[column] = self._info_id(row[column])
+            if row['id_metric'] is None:
+                logger.warning(f"bulk_upsert: пропущена запись без id_metric: {record}")
+                continue
+            row['value_num'] = parse_metric_value(row['value'])
+            if row['value'] is not None:
+                row['value'] = str(row['value'])
+            rows[tuple(row[column] for column in self.NATURAL_KEY)] = row
+        if not rows:
+            return 0
+
+        values = list(rows.values())
+        targets: Dict[str, List[Dict[str, Any]]] = {}
+        if self._is_partitioned():
+            for row in values:
+                targets.setdefault(metric_value_partition(row['id_metric']), []).append(row)
+        else:
+            targets[MetricValue.__tablename__] = values
+
+        for name, target_rows in targets.items():
+            table = self._upsert_table(name)
+            for start in range(0, len(target_rows), batch_size):
+                stmt = pg_insert(table).values(target_rows[start:start + batch_size])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=metric_value_natural_key(table),
+                    set_={
+                        'value': stmt.excluded.value,
+                        'value_num': stmt.excluded.value_num,
+                        'location_types': func.coalesce(stmt.excluded.location_types, table.c.location_types),
+                        'modify_time': func.now(),
+                    },
+                )
+                self.session.execute(stmt)
+        self.session.commit()
+        self.invalidate_info_cache(values)
+        logger.info(f"bulk_upsert: записано {len(values)} значений метрик.")
+        return len(values)
+
+    def _is_partitioned(self) -> bool:
+        """
+        Проверяет (один раз на процесс), секционирована ли таблица metric_values.
+        """
+        cls = MetricValueRepository
+        if cls._partitioned is None:
+            relkind = self.session.execute(
+                text("SELECT relkind FROM pg_class WHERE oid = to_regclass('metric_values')")
+            ).scalar()
+            cls._partitioned = relkind == 'p'
+            logger.debug(f"metric_values секционирована: {cls._partitioned}")
+        return cls._partitioned
+
+    @classmethod
+    def _upsert_table(cls, name: str) -> Table:
+        """
+        Таблица для INSERT ... ON CONFLICT: сама metric_values или её секция
+        с теми же колонками (секции создаются миграцией, а не моделью).
+        """
+        if name == MetricValue.__tablename__:
+            return MetricValue.__table__
+        table_ = cls._partition_tables.get(name)
+        if table_ is None:
+            columns = []
+            for source in MetricValue.__table__.columns:
+                args = [Sequence('metric_values_id_mv_seq')] if source.name == 'id_mv' else []
+                columns.append(Column(source.name, source.type, *args, primary_key=source.primary_key))
+            table_ = Table(name, MetaData(), *columns)
+            cls._partition_tables[name] = table_
+        return table_
+
+    # Идентификаторы, по которым строятся ключи кэша get_info_metricvalue
+    INFO_ID_FIELDS = ('id_metric', 'id_region', 'id_city', 'id_location')
+
+    @staticmethod
+    def _info_id(value: Any) -> Any:
+        """
+        Приводит идентификатор к int ('150' и 150 дают один ключ кэша);
+        None, '' и нечисловые значения возвращаются как есть.
+        """
+        if value is None or isinstance(value, bool):
+            return value
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    @classmethod
+    def _info_filters(cls, kwargs: Dict[str, Any]) -> Tuple[Tuple[str, str, Any], ...]:
+        """
+        Нормализует фильтры get_info_metricvalue в ключ кэша:
+        кортеж (поле, 'eq' или 'null', значение) только для реально
+        применяемых условий.
+        """
+        filters = []
+        id_metric = cls._info_id(kwargs.get('id_metric'))
         if id_metric:
-            q = q.filter(MetricValue.id_metric == id_metric)
+            filters.append(('id_metric', 'eq', id_metric))
+        id_region = cls._info_id(kwargs.get('id_region', 0))
         if id_region:
-                q = q.filter(MetricValue.id_region == id_region)
-        if id_city != 0:
-            # Разница в том, что мы хотим именно IS NULL, а не проигнорировать None
-            if id_city is None:
-                q = q.filter(MetricValue.id_city.is_(None))
-            else:
-                q = q.filter(MetricValue.id_city == id_city)
-        if id_location != 0:
-            if id_location is None:
-                q = q.filter(MetricValue.id_location.is_(None))
-            else:
-                q = q.filter(MetricValue.id_location == id_location)
-        self.session.close()
-        return q.all()
-    
+            filters.append(('id_region', 'eq', id_region))
+        for name in ('id_city', 'id_location'):
+            value = cls._info_id(kwargs.get(name, 0))
+            if value != 0:
+                # Разница в том, что мы хотим именно IS NULL, а не проигнорировать None
+                filters.append((name, 'null', None) if value is None else (name, 'eq', value))
+        return tuple(filters)
+
+    @staticmethod
+    def _filters_match(filters: Tuple[Tuple[str, str, Any], ...], record: Dict[str, Any]) -> bool:
+        """Проверяет, попадает ли записываемое значение под фильтры записи кэша."""
+        for name, op, value in filters:
+            item = record.get(name)
+            if op == 'null':
+                if item is not None:
+                    return False
+            elif item != value:
+                return False
+        return True
+
+    @classmethod
+    def invalidate_info_cache(cls, records: Iterable[Dict[str, Any]], id_mv: Optional[int] = None) -> int:
+        """
+        Удаляет из кэша get_info_metricvalue результаты, которые могут включать
+        записанные значения: по id_metric и сущности (регион, город, локация),
+        а также результаты, содержащие строку id_mv.
+
+        Args:
+            records (Iterable[Dict[str, Any]]): Записанные значения (поля MetricValue).
+            id_mv (Optional[int]): Идентификатор обновленной строки.
+
+        Returns:
+            int: Количество удаленных записей кэша.
+        """
+        records = [
+            {
+                key: (None if isinstance(value, str) and value == ''
+                      else cls._info_id(value) if key in cls.INFO_ID_FIELDS else value)
+                for key, value in record.items()
+            }
+            for record in records
+        ]
+        unit_of_work = _current_unit_of_work.get()
+        if unit_of_work is not None:
+            writes = unit_of_work.info.get('info_writes')
+            if writes is None:
+                writes = unit_of_work.info['info_writes'] = []
+
+                def invalidate_committed() -> None:
+                    # до фиксации другие потоки могли снова закэшировать прежние строки
+                    for written, written_id in writes:
+                        cls._invalidate_info(written, written_id)
+
+                unit_of_work.after_commit(invalidate_committed)
+            writes.append((records, id_mv))
+        return cls._invalidate_info(records, id_mv)
+
+    @classmethod
+    def _invalidate_info(cls, records: List[Dict[str, Any]], id_mv: Optional[int] = None) -> int:
+        """Удаляет из кэша результаты, затронутые нормализованными записями."""
+        removed = 0
+        for record in records:
+            # записи без фильтра по метрике лежат в группе None
+            groups = (record['id_metric'], None) if record.get('id_metric') else cls._info_cache.groups()
+
+            def stale(filters, rows, record=record):
+                if id_mv is not None and any(row.id_mv == id_mv for row in rows):
+                    return True
+                return cls._filters_match(filters, record)
+
+            removed += cls._info_cache.invalidate(groups, stale)
+        if removed:
+            logger.debug(f"Кэш get_info_metricvalue: инвалидировано {removed} записей.")
+        return removed
+
+    @classmethod
+    def info_cache_stats(cls) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов кэша get_info_metricvalue."""
+        return cls._info_cache.stats()
+
+    @classmethod
+    def clear_info_cache(cls) -> None:
+        cls._info_cache.clear()
+
+    @manage_session
+    def get_info_metricvalue(self, **kwargs) -> Tuple[MetricValueRow, ...]:
+        """
+        Получение значений метрик из БД
+
+        Результат кэшируется (LRU + TTL) по нормализованным фильтрам и
+        возвращается неизменяемым кортежем MetricValueRow. Внутри
+        unit_of_work кэш не используется только для фильтров и строк,
+        затронутых записями этой единицы работы, чтобы не сохранить в нем
+        незафиксированные данные.
+
+        Инвалидация действует в пределах процесса: значения, записанные
+        другими процессами, могут возвращаться устаревшими до INFO_CACHE_TTL
+        (300 с). Свежие данные — после clear_info_cache().
+        """
+        filters = self._info_filters(kwargs)
+        written_ids: Set[int] = set()
+        use_cache = True
+        unit_of_work = _current_unit_of_work.get()
+        if unit_of_work is not None:
+            for records, id_mv in unit_of_work.info.get('info_writes', ()):
+                if id_mv is not None:
+                    written_ids.add(id_mv)
+                if any(self._filters_match(filters, record) for record in records):
+                    use_cache = False
+        if use_cache:
+            cached = self._info_cache.get(filters)
+            if cached is not None and not any(row.id_mv in written_ids for row in cached):
+                return cached
+
+        q = self.session.query(MetricValue)
+        for name, op, value in filters:
+            column = getattr(MetricValue, name)
+            q = q.filter(column.is_(None) if op == 'null' else column == value)
+        rows = tuple(
+            MetricValueRow(
+                id_mv=mv.id_mv,
+                id_metric=mv.id_metric,
+                id_region=mv.id_region,
+                id_city=mv.id_city,
+                id_location=mv.id_location,
+                type_location=mv.type_location,
+                value=mv.value,
+                value_num=mv.value_num,
+                location_types=tuple(mv.location_types) if mv.location_types is not None else None,
+                month=mv.month,
+                year=mv.year,
+                create_time=mv.create_time,
+                modify_time=mv.modify_time,
+            )
+            for mv in q.all()
+        )
+        if use_cache and not any(row.id_mv in written_ids for row in rows):
+            id_metric = dict((name, value) for name, _, value in filters).get('id_metric')
+            self._info_cache.set(filters, rows, group=id_metric)
+        return rows
+
+    @manage_session
+    def get_latest_value(self, id_metric: int, **filters) -> Optional[float]:
+        """
+        Возвращает последнее (по modify_time) числовое значение метрики.
+
+        Args:
+            id_metric (int): Идентификатор метрики.
+            **filters: Фильтры по полям MetricValue (None — IS NULL, список — IN).
+
+        Returns:
+            Optional[float]: Значение value_num или None.
+        """
+        q = self.session.query(MetricValue.value_num).filter(MetricValue.id_metric == id_metric)
+        q = self._filter_values(q, filters)
+        row = q.order_by(
+            MetricValue.modify_time.desc().nullslast(),
+            MetricValue.id_mv.desc(),
+        ).first()
+        return row[0] if row else None
+
+    @manage_session
+    def aggregate_values(
+        self,
+        id_metric: int,
+        agg: str = 'sum',
+        group_by: Optional[str] = None,
+        **filters,
+    ) -> Union[Optional[float], Dict[Any, Optional[float]]]:
+        """
+        Агрегирует числовые значения метрики (value_num) на стороне БД.
+
+        Args:
+            id_metric (int): Идентификатор метрики.
+            agg (str): 'sum', 'avg', 'min', 'max' или 'count'.
+            group_by (Optional[str]): Поле группировки (например, 'id_region').
+            **filters: Фильтры по полям MetricValue (None — IS NULL, список — IN).
+
+        Returns:
+            Union[Optional[float], Dict[Any, Optional[float]]]: Значение агрегата,
+            либо словарь {значение group_by: агрегат}.
+        """
+        if agg not in self.AGGREGATES:
+            raise ValueError(f"Неподдерживаемый агрегат: {agg}")
+        aggregate = self.AGGREGATES[agg](MetricValue.value_num)
+        if group_by:
+            group_column = getattr(MetricValue, group_by)
+            q = self.session.query(group_column, aggregate)
+        else:
+            q = self.session.query(aggregate)
+        q = q.filter(MetricValue.id_metric == id_metric)
+        q = self._filter_values(q, filters)
+        if not group_by:
+            result = q.scalar()
+            return float(result) if result is not None else None
+        rows = q.group_by(group_column).all()
+        logger.debug(f"aggregate_values: {agg} по метрике {id_metric}, групп {len(rows)}")
+        return {key: float(value) if value is not None else None for key, value in rows}
+
+    @manage_session
+    def get_value_percentiles(
+        self,
+        id_metric: int,
+        fractions: List[float],
+        group_by: Optional[str] = None,
+        **filters,
+    ) -> List[float]:
+        """
+        Считает перцентили (percentile_cont) значений метрики на стороне БД.
+
+        Args:
+            id_metric (int): Идентификатор метрики.
+            fractions (List[float]): Доли в диапазоне [0; 1].
+            group_by (Optional[str]): Если указано, перцентили считаются по суммам
+                значений внутри групп (например, суммарный турпоток региона).
+            **filters: Фильтры по полям MetricValue (None — IS NULL, список — IN).
+
+        Returns:
+            List[float]: Перцентили в порядке fractions (пустой список, если данных нет).
+        """
+        if group_by:
+            q = self.session.query(func.sum(MetricValue.value_num).label('number'))
+        else:
+            q = self.session.query(MetricValue.value_num.label('number'))
+        q = q.filter(MetricValue.id_metric == id_metric, MetricValue.value_num.isnot(None))
+        q = self._filter_values(q, filters)
+        if group_by:
+            # группа строк без значения group_by (например, без региона) не учитывается
+            group_column = getattr(MetricValue, group_by)
+            q = q.filter(group_column.isnot(None)).group_by(group_column)
+        numbers = q.subquery()
+        result = self.session.query(
+            func.percentile_cont(array([float(f) for f in fractions])).within_group(numbers.c.number)
+        ).scalar()
+        return [float(value) for value in result] if result else []
+
     @manage_session
     def get_locations_from_mv(self, types:List[str], id_metric:int,id_region: Optional[int] = None, id_city: Optional[int] = None) -> List[MetricValue]:
         """
@@ -494,6 +1090,149 @@ class MetricValueRepository(Database):
 
     
 
+class EntityKpiRepository(Database):
+    """
+    Репозиторий витрины entity_kpi (migrations/005_entity_kpi.sql):
+    одна строка на регион или город, колонка m_<id_metric> на каждую
+    метрику дашборда с последним значением value_num.
+    """
+
+    # Метрики дашбордов: METRIC_IDS, SEGMENT_METRICS и SEGMENTS[...]['codes']
+    # из BaseDashboardData. Должны совпадать с колонками витрины.
+    METRICS = (217, 218, 222, 240, 241) + tuple(range(242, 287))
+    VIEW_NAME = 'entity_kpi'
+
+    _view = table(
+        VIEW_NAME,
+        column('entity_type'),
+        column('entity_id'),
+        *[column(f'm_{id_metric}') for id_metric in METRICS],
+    )
+
+    @manage_session
+    def get_kpi(
+        self,
+        id_region: Optional[int] = None,
+        id_city: Optional[int] = None,
+    ) -> Optional[Dict[int, Optional[float]]]:
+        """
+        Читает строку витрины для города (если задан id_city) или региона
+        одним запросом по первичному ключу.
+
+        Args:
+            id_region (Optional[int]): Идентификатор региона.
+            id_city (Optional[int]): Идентификатор города.
+
+        Returns:
+            Optional[Dict[int, Optional[float]]]: {id_metric: значение}; пустой
+            словарь, если у сущности нет значений; None при ошибке (например,
+            витрина еще не создана).
+        """
+        if id_city is not None:
+            entity_type, entity_id = 'city', id_city
+        elif id_region is not None:
+            entity_type, entity_id = 'region', id_region
+        else:
+            return {}
+        view = self._view
+        row = self.session.execute(
+            select(view).where(
+                view.c.entity_type == entity_type,
+                view.c.entity_id == entity_id,
+            )
+        ).first()
+        if row is None:
+            return {}
+        values = row._mapping
+        return {id_metric: values[f'm_{id_metric}'] for id_metric in self.METRICS}
+
+    @manage_session
+    def refresh(self, concurrently: bool = True) -> None:
+        """
+        Перестраивает витрину по текущим значениям metric_values.
+        CONCURRENTLY не блокирует чтение дашбордов на время обновления.
+        """
+        start = time.perf_counter()
+        mode = 'CONCURRENTLY ' if concurrently else ''
+        self.session.execute(text(f'REFRESH MATERIALIZED VIEW {mode}{self.VIEW_NAME}'))
+        self.session.commit()
+        logger.info(f"Витрина {self.VIEW_NAME} обновлена за {time.perf_counter() - start:.2f} с.")
+
+
+class ScoringCheckpointRepository(Database):
+    """
+    Репозиторий контрольных точек прогона оценки
+    (migrations/009_scoring_checkpoints.sql): какие регионы и города
+    в прогоне run_id уже полностью оценены и на каких этапах.
+    """
+
+    # отметки читаются сразу после записи другими процессами прогона
+    READ_REPLICA: ClassVar[bool] = False
+    TABLE_NAME = 'scoring_checkpoints'
+    # сущность отметок этапов уровня всей страны
+    COUNTRY: ClassVar[Tuple[str, int]] = ('country', 0)
+
+    _table = table(
+        TABLE_NAME,
+        column('run_id'),
+        column('stage'),
+        column('entity_type'),
+        column('entity_id'),
+        column('id_region'),
+        column('finished_at'),
+    )
+
+    @manage_session
+    def get_done(self, run_id: str) -> Set[Tuple[str, str, int]]:
+        """
+        Пары этап/сущность, отмеченные в прогоне.
+
+        Returns:
+            Set[Tuple[str, str, int]]: Тройки (stage, entity_type, entity_id).
+        """
+        t = self._table
+        rows = self.session.execute(
+            select(t.c.stage, t.c.entity_type, t.c.entity_id).where(t.c.run_id == run_id)
+        ).all()
+        return {(stage, entity_type, entity_id) for stage, entity_type, entity_id in rows}
+
+    @manage_session
+    def mark_done(self, run_id: str, stage: str, id_region: Optional[int],
+                  entities: Iterable[Tuple[str, int]]) -> int:
+        """
+        Отмечает сущности региона как оцененные на этапе (повторная отметка не меняет время).
+
+        Args:
+            run_id (str): Идентификатор прогона.
+            stage (str): Этап прогона.
+            id_region (Optional[int]): Регион сущностей (None для этапов всей страны).
+            entities (Iterable[Tuple[str, int]]): Пары (entity_type, entity_id).
+
+        Returns:
+            int: Количество переданных сущностей.
+        """
+        rows = [
+            {'run_id': run_id, 'stage': stage, 'entity_type': entity_type, 'entity_id': int(entity_id),
+             'id_region': int(id_region) if id_region is not None else None}
+            for entity_type, entity_id in entities
+        ]
+        if not rows:
+            return 0
+        stmt = pg_insert(self._table).values(rows).on_conflict_do_nothing(
+            index_elements=['run_id', 'stage', 'entity_type', 'entity_id'],
+        )
+        self.session.execute(stmt)
+        self.session.commit()
+        return len(rows)
+
+    @manage_session
+    def reset(self, run_id: str) -> None:
+        """Удаляет отметки прогона (оценка начнется заново)."""
+        self.session.execute(self._table.delete().where(self._table.c.run_id == run_id))
+        self.session.commit()
+        logger.info(f"Контрольные точки прогона {run_id} удалены.")
+
+
 class LocationTypeRepository(Database):
     """
     Репозиторий для работы с моделью LocationType.
@@ -538,43 +1277,53 @@ class LocationsRepository(JSONRepository):
     Репозиторий для работы с моделью Location.
     """
 
-    def __init__(self):
-        super().__init__()
+    # Метрика итоговой оценки локации, по которой считается средний рейтинг типа
+    RATING_METRIC = 236
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.model = Location
         logger.info("Инициализирован LocationsRepository.")
 
     @manage_session
-    def check_loc_yandex(
-        self, 
-        # location_name: str, 
-        # coordinates: list,
-        id_yandex
-    ) -> Optional[Location]:
+    def check_loc_yandex(self, id_yandex: Union[int, str]) -> Optional[Location]:
         """
         Проверяет наличие локации в базе данных для Яндекс.
 
         Args:
-            location_name (str): Название локации.
-            coordinates (list): координаты локации
+            id_yandex (Union[int, str]): Идентификатор организации в Яндекс.Картах.
+
         Returns:
             Optional[Location]: Найденная локация или None.
         """
-        # coordinates = f"SRID=4326;POINT({coordinates[0]} {coordinates[1]})" if all(coordinates) else "NULL"
-        # filters = {
-        #     "location_name": location_name,
-        #     "coordinates": coordinates
-        # }
-        # filters = {"characters": func.jsonb_build_object('id_yandex', id_yandex)}
-        # location = self.get_by_fields(Location, **filters)
-        # logger.debug(
-        #     f"Проверка существования локации '{location_name}' по координатам {coordinates}: {bool(location)}"
-        # )
-        location = self.session.query(Location).filter(
-            Location.characters['id_yandex'].astext == str(id_yandex)).all()
-        if len(location) > 1:
-            logger.error(f'Поиск по id_yandex - {id_yandex} в БД нашел несколько совпадений: {len(location)}!!!!!')
-        return location[0] if location else None
-    
+        id_yandex = parse_id_yandex(id_yandex)
+        if id_yandex is None:
+            return None
+        return (
+            self.session.query(Location)
+            .filter(Location.id_yandex == id_yandex)
+            .one_or_none()
+        )
+
+    @manage_session
+    def existing_yandex_ids(self, ids: Iterable[Union[int, str]]) -> Set[int]:
+        """
+        Возвращает те id_yandex из переданных, для которых локация уже есть в БД.
+
+        Одним запросом проверяет целую страницу результатов поиска.
+
+        Args:
+            ids (Iterable[Union[int, str]]): Идентификаторы организаций в Яндекс.Картах.
+
+        Returns:
+            Set[int]: Уже загруженные идентификаторы.
+        """
+        ids = {parsed for parsed in map(parse_id_yandex, ids) if parsed is not None}
+        if not ids:
+            return set()
+        query = self.session.query(Location.id_yandex).filter(Location.id_yandex.in_(ids))
+        return {row.id_yandex for row in query}
+
     @manage_session
     def get_unique_types(self)->set:
         """
@@ -583,14 +1332,41 @@ class LocationsRepository(JSONRepository):
         Returns:
             set: Множество всех уникальных типов.
         """
-        locations = self.session.query(Location).filter(Location.id_location > 2614000).all()
+        # Типы разворачиваются из location_types и дедуплицируются в БД,
+        # объекты локаций не загружаются
+        query = (
+            self.session.query(func.unnest(Location.location_types))
+            .filter(
+                Location.id_location > 2614000,
+                Location.location_types.isnot(None),
+            )
+            .distinct()
+        )
+        return {row[0] for row in query}
 
-        types = set()
-        for location in locations:
-            location_types = location.characters.get('types', [])
-            types.update(location_types)
-        
-        return types
+    @staticmethod
+    def _location_row(
+        location_name: str,
+        coordinates: Any,
+        id_city: Optional[int],
+        id_region: Optional[int],
+        characters: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Строка таблицы locations для вставки без ORM: координаты в EWKT и
+        индексируемые колонки id_yandex и location_types из characters
+        (то же, что делает событие before_insert модели).
+        """
+        has_point = coordinates is not None and len(coordinates) == 2 and all(coordinates)
+        return {
+            'location_name': location_name,
+            'coordinates': f"SRID=4326;POINT({coordinates[0]} {coordinates[1]})" if has_point else None,
+            'id_city': id_city,
+            'id_region': id_region,
+            'characters': characters,
+            'id_yandex': parse_id_yandex((characters or {}).get('id_yandex')),
+            'location_types': location_types_from_characters(characters),
+        }
 
     @manage_session
     def load_info_loc_yandex(
@@ -600,9 +1376,11 @@ class LocationsRepository(JSONRepository):
         id_city: int,
         id_region: int,
         characters: Dict[str, Any],
-    ) -> None:
+    ) -> Optional[int]:
         """
         Загружает информацию о локации Яндекс в базу данных.
+        Идентификатор новой локации возвращается из INSERT ... RETURNING
+        и сохраняется в self.id_loc_yandex.
 
         Args:
             location_name (str): Название локации.
@@ -610,67 +1388,62 @@ class LocationsRepository(JSONRepository):
             id_city (int): Идентификатор города.
             id_region (int): Идентификатор региона.
             characters (Dict[str, Any]): Характеристики локации.
+
+        Returns:
+            Optional[int]: id_location новой локации.
         """
-        coordinates_str = f"SRID=4326;POINT({coordinates[0]} {coordinates[1]})" if all(coordinates) else "NULL"
-        location = Location(
-            location_name=location_name,
-            coordinates=coordinates_str,
-            id_city=id_city,
-            id_region=id_region,
-            characters=characters,
-        )
-        self.add(location)
-        existing_location = self.check_loc_yandex(
-            # location_name = location_name,
-            # coordinates = coordinates
-            id_yandex=characters.get('id_yandex')
-        )
-        if existing_location:
-            self.id_loc_yandex = existing_location.id_location
-            logger.info(
-                f"Загружена локация Яндекс: {location_name}, id_location={self.id_loc_yandex}"
-            )
-        else:
-            logger.error(f"Не удалось загрузить локацию Яндекс: {location_name}")
+        self.id_loc_yandex = None
+        row = self._location_row(location_name, coordinates, id_city, id_region, characters)
+        stmt = pg_insert(Location.__table__).values(row).returning(Location.__table__.c.id_location)
+        self.id_loc_yandex = self.session.execute(stmt).scalar()
+        self.session.commit()
+        logger.info(f"Загружена локация Яндекс: {location_name}, id_location={self.id_loc_yandex}")
+        return self.id_loc_yandex
 
     @manage_session
-    def get_locations_by_type(self, type_location: str) -> list[dict]:
+    def get_locations_by_type(
+        self,
+        type_location: str,
+        id_region: Optional[int] = None,
+        id_city: Optional[int] = None,
+    ) -> list[dict]:
         """
-        Ищет локации по типу в JSON-поле characters.
+        Ищет локации по типу в колонке location_types (GIN-индекс).
 
         Args:
             type_location (str): Тип локации для поиска
+            id_region (Optional[int]): Ограничить регионом.
+            id_city (Optional[int]): Ограничить городом.
 
         Returns:
             list[dict]: Список словарей с данными локаций
         """
         try:
-            # Формируем запрос с проверкой JSON-поля
             query = (
                 self.session.query(
                     self.model.id_location,
                     self.model.id_city,
                     self.model.id_region,
-                    self.model.characters
-                )
-                .filter(
-                    # self.model.characters.has_key('types'),  # Проверка наличия ключа
-                    # func.jsonb_array_length(self.model.characters['types']) > 0,  # Проверка наличия элементов
-                    self.model.characters['types'].cast(JSONB).contains([type_location])  # Поиск в массиве
+                    self.model.characters['like'].astext.label('like'),
+                    self.model.characters['count_reviews'].astext.label('count_reviews'),
                 )
+                .filter(self.model.location_types.contains([type_location]))
             )
+            if id_region:
+                query = query.filter(self.model.id_region == id_region)
+            if id_city:
+                query = query.filter(self.model.id_city == id_city)
 
-            result = []
-            for loc in query.all():
-                # Извлекаем данные из JSON-поля
-                characters = loc.characters or {}
-                result.append({
+            result = [
+                {
                     'id_location': loc.id_location,
                     'id_city': loc.id_city,
                     'id_region': loc.id_region,
-                    'like': characters.get('like'),
-                    'count_reviews': characters.get('count_reviews')
-                })
+                    'like': loc.like,
+                    'count_reviews': loc.count_reviews,
+                }
+                for loc in query
+            ]
 
             logger.debug(f"Найдено {len(result)} локаций типа '{type_location}'")
             return result
@@ -678,7 +1451,105 @@ class LocationsRepository(JSONRepository):
         except Exception as e:
             logger.error(f"Ошибка при поиске локаций: {str(e)}")
             return []
-    
+
+    @manage_session
+    def get_type_stats(
+        self,
+        types: Iterable[str],
+        id_region: Optional[int] = None,
+        id_city: Optional[int] = None,
+        rating_metric: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Считает количество локаций и средний рейтинг по парам (тип, город)
+        и (тип, регион) одним GROUP BY GROUPING SETS.
+
+        Args:
+            types (Iterable[str]): Типы локаций.
+            id_region (Optional[int]): Ограничить регионом.
+            id_city (Optional[int]): Ограничить городом.
+            rating_metric (Optional[int]): Метрика оценки локации. По умолчанию RATING_METRIC.
+
+        Returns:
+            pd.DataFrame: Колонки type_location, level ('city' или 'region'),
+            id_city, id_region, count_locations, avg_rating. В строках уровня
+            'city' id_region пуст, в строках уровня 'region' пуст id_city.
+        """
+        types = list(types)
+        columns = ['type_location', 'level', 'id_city', 'id_region', 'count_locations', 'avg_rating']
+        if not types:
+            return pd.DataFrame(columns=columns)
+        rating_metric = rating_metric or self.RATING_METRIC
+
+        # Разворачиваем location_types только у локаций нужных типов (&& по GIN-индексу)
+        located = (
+            select(
+                Location.id_location,
+                Location.id_city,
+                Location.id_region,
+                func.unnest(Location.location_types).label('type_location'),
+            )
+            .where(Location.location_types.overlap(types))
+        )
+        if id_region:
+            located = located.where(Location.id_region == id_region)
+        if id_city:
+            located = located.where(Location.id_city == id_city)
+        located = located.subquery()
+
+        is_region = func.grouping(located.c.id_city)
+        stmt = (
+            select(
+                located.c.type_location,
+                is_region.label('is_region'),
+                located.c.id_city,
+                located.c.id_region,
+                func.count(func.distinct(located.c.id_location)).label('count_locations'),
+                func.avg(MetricValue.value_num).label('avg_rating'),
+            )
+            .select_from(located)
+            .outerjoin(
+                MetricValue,
+                and_(
+                    MetricValue.id_location == located.c.id_location,
+                    MetricValue.id_metric == rating_metric,
+                ),
+            )
+            .where(located.c.type_location.in_(types))
+            .group_by(
+                func.grouping_sets(
+                    tuple_(located.c.type_location, located.c.id_city),
+                    tuple_(located.c.type_location, located.c.id_region),
+                )
+            )
+            .having(
+                or_(
+                    and_(is_region == 0, located.c.id_city.isnot(None)),
+                    and_(is_region == 1, located.c.id_region.isnot(None)),
+                )
+            )
+        )
+        rows = self.session.execute(stmt).all()
+        frame = pd.DataFrame(
+            [
+                (
+                    row.type_location,
+                    'region' if row.is_region else 'city',
+                    row.id_city,
+                    row.id_region,
+                    row.count_locations,
+                    float(row.avg_rating) if row.avg_rating is not None else np.nan,
+                )
+                for row in rows
+            ],
+            columns=columns,
+        )
+        for name in ('id_city', 'id_region', 'count_locations'):
+            frame[name] = pd.array(frame[name].tolist(), dtype='Int64')
+        frame['avg_rating'] = frame['avg_rating'].astype('float64')
+        logger.debug(f"get_type_stats: {len(frame)} строк для {len(types)} типов")
+        return frame
+
     @manage_session
     def get_locations_by_types(self, types:List[str], id_region: Optional[int] = None, id_city: Optional[int] = None) -> List[MetricValue]:
         """
@@ -695,7 +1566,7 @@ class LocationsRepository(JSONRepository):
                 q = q.filter(Location.id_region == id_region)
             if id_city:
                 q = q.filter(Location.id_city == id_city)
-            q = q.filter(Location.location_types.op("&&")(types))
+            q = q.filter(Location.location_types.overlap(types))
             return q.all()
         finally:
             self.session.close()
@@ -706,6 +1577,10 @@ class ReviewRepository(Database):
     Репозиторий для работы с моделью Review.
     """
 
+    # Конфигурация полнотекстового поиска (совпадает с колонкой reviews.text_search)
+    TS_CONFIG = 'russian'
+    KEYWORD_GROUPS = ('id_location', 'id_city', 'id_region')
+
     @manage_session
     def load_review_loc_yandex(
         self, id_loc: int, like: int, text: str, data: str
@@ -728,6 +1603,32 @@ class ReviewRepository(Database):
         self.add(review)
         logger.debug(f"Загружен отзыв для локации {id_loc}.")
 
+    @manage_session
+    def load_reviews(self, id_loc: int, reviews: Iterable[Dict[str, Any]]) -> int:
+        """
+        Загружает отзывы локации одной командой COPY.
+
+        Args:
+            id_loc (int): Идентификатор локации.
+            reviews (Iterable[Dict[str, Any]]): Отзывы с ключами like, text, data.
+
+        Returns:
+            int: Количество загруженных отзывов.
+        """
+        rows = (
+            {
+                'id_location': id_loc,
+                'like': int(review.get('like') or 0),
+                'text': review.get('text', ''),
+                'data': review.get('data', ''),
+                'review_date': parse_review_date(review.get('data')),
+            }
+            for review in reviews
+        )
+        count = self.copy_rows(Review, ('id_location', 'like', 'text', 'data', 'review_date'), rows)
+        logger.debug(f"Загружено {count} отзывов для локации {id_loc}.")
+        return count
+
     @manage_session
     def get_reviews(self, id_location: str) -> list[dict]:
         """
@@ -747,6 +1648,188 @@ class ReviewRepository(Database):
 
         return query
 
+    @manage_session
+    def get_reviews_top(
+        self, id_location: int, limit: int = 50, per_day: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        Отбор отзывов локации для оценки (см. get_reviews_top_batch).
+
+        Returns:
+            List[Dict[str, Any]]: Отзывы с ключами id_location, text, data.
+        """
+        return self.get_reviews_top_batch([id_location], limit=limit, per_day=per_day).get(id_location, [])
+
+    @manage_session
+    def get_reviews_top_batch(
+        self, id_locations: Iterable[int], limit: int = 50, per_day: int = 10,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Отбирает отзывы нескольких локаций одним запросом.
+
+        Если у локации не больше limit отзывов, возвращаются все. Иначе —
+        по per_day самых длинных отзывов за каждый день, начиная с самого
+        нового, всего не больше limit (ROW_NUMBER() по дню и длине текста).
+        Отзывы без распознанной даты во втором случае не участвуют.
+
+        Args:
+            id_locations (Iterable[int]): Идентификаторы локаций.
+            limit (int): Максимум отзывов на локацию.
+            per_day (int): Максимум отзывов за один день.
+
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: {id_location: отзывы с ключами
+            id_location, text, data} — от новых к старым, длинные первыми.
+        """
+        id_locations = list(dict.fromkeys(id_locations))
+        if not id_locations:
+            return {}
+        text_length = func.length(Review.text)
+        ranked = (
+            select(
+                Review.id_location,
+                Review.text,
+                Review.data,
+                Review.review_date,
+                text_length.label('text_length'),
+                func.count().over(partition_by=Review.id_location).label('total'),
+                func.row_number().over(
+                    partition_by=(Review.id_location, Review.review_date),
+                    order_by=text_length.desc().nullslast(),
+                ).label('day_rank'),
+            )
+            .where(Review.id_location.in_(id_locations))
+            .subquery('ranked')
+        )
+        selected = (
+            select(
+                ranked.c.id_location,
+                ranked.c.text,
+                ranked.c.data,
+                func.row_number().over(
+                    partition_by=ranked.c.id_location,
+                    order_by=(ranked.c.review_date.desc().nullslast(), ranked.c.text_length.desc().nullslast()),
+                ).label('position'),
+            )
+            .where(or_(
+                ranked.c.total <= limit,
+                and_(ranked.c.review_date.isnot(None), ranked.c.day_rank <= per_day),
+            ))
+            .subquery('selected')
+        )
+        stmt = (
+            select(selected.c.id_location, selected.c.text, selected.c.data)
+            .where(selected.c.position <= limit)
+            .order_by(selected.c.id_location, selected.c.position)
+        )
+        result: Dict[int, List[Dict[str, Any]]] = {id_location: [] for id_location in id_locations}
+        for row in self.session.execute(stmt):
+            result[row.id_location].append({'id_location': row.id_location, 'text': row.text, 'data': row.data})
+        logger.debug(f"Отобраны отзывы для {len(id_locations)} локаций.")
+        return result
+
+    def _ts_query(self, query: str):
+        """Запрос tsquery в синтаксисе веб-поиска: слова, "фразы", or, -исключения."""
+        return func.websearch_to_tsquery(self.TS_CONFIG, query)
+
+    @manage_session
+    def find_reviews(
+        self,
+        query: str,
+        id_location: Optional[int] = None,
+        id_city: Optional[int] = None,
+        id_region: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Полнотекстовый поиск отзывов по GIN-индексу text_search.
+
+        Args:
+            query (str): Поисковый запрос ('пляж чисто', '"платная парковка"', 'пляж -грязно').
+            id_location (Optional[int]): Ограничение по локации.
+            id_city (Optional[int]): Ограничение по городу.
+            id_region (Optional[int]): Ограничение по региону.
+            limit (int): Максимум результатов.
+
+        Returns:
+            List[Dict[str, Any]]: Отзывы (id_reviews, id_location, text, data, rank),
+            по убыванию релевантности.
+        """
+        ts_query = self._ts_query(query)
+        rank = func.ts_rank(Review.text_search, ts_query)
+        stmt = (
+            select(Review.id_reviews, Review.id_location, Review.text, Review.data, rank.label('rank'))
+            .where(Review.text_search.op('@@')(ts_query))
+        )
+        if id_location is not None:
+            stmt = stmt.where(Review.id_location == id_location)
+        if id_city is not None or id_region is not None:
+            stmt = stmt.join(Location, Location.id_location == Review.id_location)
+            if id_city is not None:
+                stmt = stmt.where(Location.id_city == id_city)
+            if id_region is not None:
+                stmt = stmt.where(Location.id_region == id_region)
+        stmt = stmt.order_by(rank.desc(), Review.id_reviews).limit(limit)
+        rows = [dict(row._mapping) for row in self.session.execute(stmt)]
+        logger.debug(f"find_reviews: {len(rows)} отзывов по запросу {query!r}.")
+        return rows
+
+    @manage_session
+    def get_keyword_stats(
+        self,
+        keywords: Iterable[str],
+        group_by: str = 'id_location',
+        id_city: Optional[int] = None,
+        id_region: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Количество отзывов с каждым ключевым словом по локациям, городам
+        или регионам — один запрос с агрегатами count(*) FILTER.
+
+        Слова приводятся к основе русской конфигурацией ('пляжи' находит
+        'пляж'), фраза из нескольких слов ищется целиком.
+
+        Args:
+            keywords (Iterable[str]): Ключевые слова или фразы.
+            group_by (str): 'id_location', 'id_city' или 'id_region'.
+            id_city (Optional[int]): Ограничение по городу.
+            id_region (Optional[int]): Ограничение по региону.
+
+        Returns:
+            pd.DataFrame: Колонки group_by, по колонке на каждое ключевое
+            слово (число отзывов) и matched_reviews (отзывы хотя бы с одним словом).
+        """
+        if group_by not in self.KEYWORD_GROUPS:
+            raise ValueError(f"group_by должен быть одним из {self.KEYWORD_GROUPS}")
+        keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        if not keywords:
+            return pd.DataFrame(columns=[group_by, 'matched_reviews'])
+        queries = [func.phraseto_tsquery(self.TS_CONFIG, keyword) for keyword in keywords]
+        any_query = queries[0]
+        for ts_query in queries[1:]:
+            any_query = any_query.op('||')(ts_query)
+
+        group_column = Review.id_location if group_by == 'id_location' else getattr(Location, group_by)
+        stmt = select(
+            group_column.label(group_by),
+            *[
+                func.count().filter(Review.text_search.op('@@')(ts_query)).label(f'kw_{i}')
+                for i, ts_query in enumerate(queries)
+            ],
+            func.count().label('matched_reviews'),
+        ).where(Review.text_search.op('@@')(any_query))
+        if group_by != 'id_location' or id_city is not None or id_region is not None:
+            stmt = stmt.join(Location, Location.id_location == Review.id_location)
+        if id_city is not None:
+            stmt = stmt.where(Location.id_city == id_city)
+        if id_region is not None:
+            stmt = stmt.where(Location.id_region == id_region)
+        stmt = stmt.group_by(group_column)
+
+        rows = self.session.execute(stmt).all()
+        frame = pd.DataFrame(rows, columns=[group_by] + keywords + ['matched_reviews'])
+        logger.debug(f"get_keyword_stats: {len(frame)} групп ({group_by}) по словам {keywords}.")
+        return frame
 
 
 class PhotoRepository(Database):
@@ -770,6 +1853,23 @@ class PhotoRepository(Database):
         self.add(photo)
         logger.debug(f"Загружена фотография для локации {id_loc}: {url}")
 
+    @manage_session
+    def load_photos(self, id_loc: int, urls: Iterable[str]) -> int:
+        """
+        Загружает URL фотографий локации одной командой COPY.
+
+        Args:
+            id_loc (int): Идентификатор локации.
+            urls (Iterable[str]): URL фотографий.
+
+        Returns:
+            int: Количество загруженных фотографий.
+        """
+        rows = ({'id_location': id_loc, 'url': url} for url in urls)
+        count = self.copy_rows(Photo, ('id_location', 'url'), rows)
+        logger.debug(f"Загружено {count} фотографий для локации {id_loc}.")
+        return count
+
 
 class CitiesRepository(JSONRepository):
     """
@@ -795,7 +1895,8 @@ class CitiesRepository(JSONRepository):
                 raise NoResultFound(f"Город с id_city={id_city} не найден.")
 
             city = city_records[0]
-            characters = city.characters or {}
+            # копия словаря, чтобы изменение JSONB было замечено и в общей сессии unit_of_work
+            characters = dict(city.characters or {})
             if "last_type_loc" not in characters:
                 characters["last_type_loc"] = first_type
                 city.characters = characters
@@ -825,7 +1926,7 @@ class CitiesRepository(JSONRepository):
             raise NoResultFound(f"Город с id_city={id_city} не найден.")
 
         city = city_records[0]
-        characters = city.characters or {}
+        characters = dict(city.characters or {})
         characters["last_type_loc"] = f'{type_loc}'
         city.characters = characters
         self.update(city)
@@ -857,4 +1958,35 @@ class CitiesRepository(JSONRepository):
         """
         Получение полного списка id городов
         """
-        return self.get_by_fields(model=City, **kwargs)
\ No newline at end of file
+        return self.get_by_fields(model=City, **kwargs)
+    @manage_session
+    def get_city_coordinates(self, id_region: Optional[int] = None) -> pd.DataFrame:
+        """
+        Координаты городов одним запросом (ST_X/ST_Y в БД, без разбора WKB
+        в Python) с признаком столицы региона.
+
+        Args:
+            id_region (Optional[int]): Регион; None — все регионы.
+
+        Returns:
+            pd.DataFrame: Колонки id_city, id_region, lon, lat (float64, NaN
+            без координат) и is_capital (bool).
+        """
+        columns = ['id_city', 'id_region', 'lon', 'lat', 'is_capital']
+        stmt = (
+            select(
+                City.id_city,
+                City.id_region,
+                func.ST_X(City.coordinates),
+                func.ST_Y(City.coordinates),
+                func.coalesce(Region.capital == City.id_city, False),
+            )
+            .join(Region, Region.id_region == City.id_region)
+        )
+        if id_region is not None:
+            stmt = stmt.where(City.id_region == id_region)
+        frame = pd.DataFrame(self.session.execute(stmt).all(), columns=columns)
+        frame[['lon', 'lat']] = frame[['lon', 'lat']].astype(float)
+        frame['is_capital'] = frame['is_capital'].astype(bool)
+        logger.debug(f"get_city_coordinates: {len(frame)} городов (id_region={id_region}).")
+        return frame
@@ -25,7 +25,7 @@ def import_csv(file_path: str, delimiter: str = ',') -> None:
         FileNotFoundError: Если файл не существует.
         Exception: Если происходит ошибка при импорте данных.
     """
-    from app.data.database import Database
+    from app.data.database import Database, SyncRepository
     logger.info(f"Начало импорта данных из файла: {file_path}")
 
     # Проверка существования файла
@@ -61,6 +61,7 @@ def import_csv(file_path: str, delimiter: str = ',') -> None:
 
             # Добавление всех объектов в базу данных
             db.add_all(sync_records)
+            SyncRepository.invalidate_index()
             logger.info(f"Добавлено {len(sync_records)} записей в таблицу sync.")
 
         logger.info(f"Данные из файла {file_path} успешно импортированы в таблицу sync.")
@@ -183,7 +183,9 @@ class Parse:
         lon: str
         )-> list:
         """
-        Определяет местоположение по координатам
+        Определяет местоположение по координатам: сначала локально по
+        полигонам (GeoResolver), для точек вне всех полигонов — через
+        Dadata и geotree.
 
         Args:
             lat(str): широта
@@ -194,6 +196,15 @@ class Parse:
         if not (lat and lon):
             logger.info(f'Метод coordinates_address. Не указаны координаты lat={lat}, lon={lon}')
             return None        
+        from app.data.transform.geo_resolver import GeoResolver
+        try:
+            result_local = GeoResolver.instance().resolve(lat=lat, lon=lon)
+        except Exception as e:
+            logger.error(f'Ошибка локального определения местоположения: {e}')
+            result_local = None
+        if result_local:
+            logger.info(f'Местоположение определил GeoResolver - {result_local}')
+            return result_local
         from app.data.compare import CompareYandex
         compare_yandex = CompareYandex()
         compare_yandex.load_regions_city_location_from_database()
@@ -208,10 +219,10 @@ class Parse:
                     if not result_geotree:
                         retries += 1
                     else:
-                        logger.info(f'Местополежние определил метод coordinates_geotree - {result_geotree}')
+                        logger.info(f'Местоположение определил метод coordinates_geotree - {result_geotree}')
                         return result_geotree
                 else:
-                    logger.info(f'Местополежние определил метод coordinates_dadata - {result_dadata}')
+                    logger.info(f'Местоположение определил метод coordinates_dadata - {result_dadata}')
                     return result_dadata
             except Exception as e:
                 logger.error(f'Ошибка в методе coordinates_address: {e}')
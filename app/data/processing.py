@@ -75,21 +75,25 @@ class DataProcessor:
                         logger.warning(f'Локации для {" ".join(region_city_loc)} не найдены.')
                         continue
 
+                    # Одна проверка существования на всю страницу результатов поиска
+                    page_ids = {
+                        loc_url: self.extract_id_yandex(loc_url)
+                        for loc_url in dict_locations.values()
+                    }
+                    existing_ids = LocationsRepository().existing_yandex_ids(
+                        id_yandex for id_yandex in page_ids.values() if id_yandex
+                    ) or set()
+
                     for i, (loc_name, loc_url) in enumerate(dict_locations.items(), 1):
                         loc_name = loc_name.split(';')[0]
                         logger.info(f'Обработка локации {i}: {loc_name}')
-                        id_yandex = self.extract_id_yandex(loc_url)
+                        id_yandex = page_ids[loc_url]
                         if not id_yandex:
                             logger.warning(f'Локация {loc_name} имеет некорректный URL: {loc_url}')
                             continue
                         locations_repo = LocationsRepository()
-                        bd_location = locations_repo.check_loc_yandex(
-                            # location_name=loc_name,
-                            # coordinates = self.parse_yandex.loc_info.get('coordinates'),
-                            id_yandex = id_yandex
-                        )
 
-                        if bd_location and bd_location.characters.get('id_yandex') == id_yandex:
+                        if id_yandex in existing_ids:
                             logger.info(f'Локация {loc_name} - {id_yandex} уже есть')
 
                         else:
@@ -99,13 +103,16 @@ class DataProcessor:
                             reviews_repo = ReviewRepository()
                             photos_repo = PhotoRepository()
 
-                            self.create_new_location(
+                            created = self.create_new_location(
                                 loc_name=loc_name,
                                 loc_url=loc_url,
                                 locations_repo=locations_repo,
                                 reviews_repo=reviews_repo,
                                 photos_repo=photos_repo
                             )
+                            # повтор id_yandex на той же странице не должен вставляться второй раз
+                            if created:
+                                existing_ids.add(id_yandex)
 
         except ProcessingError as e:
             logger.error(f"Ошибка обработки данных: {e}")
@@ -174,7 +181,7 @@ class DataProcessor:
         locations_repo: LocationsRepository,
         reviews_repo: ReviewRepository,
         photos_repo: PhotoRepository
-    ) -> None:
+    ) -> bool:
         """
         Создает новую локацию и добавляет отзывы и фото в базу данных.
 
@@ -186,6 +193,9 @@ class DataProcessor:
             locations_repo (LocationsRepo): Репозиторий для локаций.
             reviews_repo (ReviewRepo): Репозиторий для отзывов.
             photos_repo (PhotoRepo): Репозиторий для фото.
+
+        Returns:
+            bool: True, если локация добавлена.
         """
         retries = 0
         while retries < self.MAX_RETRIES:
@@ -205,44 +215,33 @@ class DataProcessor:
                                                                   photos= False
                                                                   )
         
-                locations_repo.load_info_loc_yandex(
-                    location_name=loc_name, 
-                    coordinates=coordinates, 
-                    id_city=id_region_city[1] if len(id_region_city) == 2 else None,
-                    id_region=id_region_city[0],
-                    characters={k: v for k, v in self.parse_yandex.loc_info.items() if k != 'coordinates'}
-                    )
-                logger.info(f'Локация {loc_name} добавлена в базу данных.')
-
-                # Получение ID добавленной локации
-                id_loc = locations_repo.id_loc_yandex
-                if not id_loc:
-                    logger.error(f'Не удалось найти добавленную локацию {loc_name} в базе данных.')
-                    return
-
-                # Добавление отзывов
-                for review in self.parse_yandex.loc_reviews.values():
-                    reviews_repo.load_review_loc_yandex(
-                        id_loc=id_loc,
-                        like=int(review.get('like', 0)),
-                        text=review.get('text', ''),
-                        data=review.get('data', '')
-                    )
-                logger.info(f'{len(self.parse_yandex.loc_reviews)} отзыва для локации {loc_name} добавлены.')
-
-                # Добавление фото
-                for photo_url in self.parse_yandex.loc_photos.values():
-                    photos_repo.load_photo_loc_yandex(
-                        id_loc=id_loc,
-                        url=photo_url
-                    )
-                logger.info(f'{len(self.parse_yandex.loc_photos)} фото для локации {loc_name} добавлены.')
-
-                break
+                # Локация, её отзывы и фото записываются одной транзакцией
+                with locations_repo.unit_of_work():
+                    id_loc = locations_repo.load_info_loc_yandex(
+                        location_name=loc_name, 
+                        coordinates=coordinates, 
+                        id_city=id_region_city[1] if len(id_region_city) == 2 else None,
+                        id_region=id_region_city[0],
+                        characters={k: v for k, v in self.parse_yandex.loc_info.items() if k != 'coordinates'}
+                        )
+                    if not id_loc:
+                        logger.error(f'Не удалось добавить локацию {loc_name} в базу данных.')
+                        return False
+                    logger.info(f'Локация {loc_name} добавлена в базу данных.')
+
+                    # Отзывы и фото пишутся пакетно (COPY)
+                    reviews_repo.load_reviews(id_loc=id_loc, reviews=self.parse_yandex.loc_reviews.values())
+                    logger.info(f'{len(self.parse_yandex.loc_reviews)} отзыва для локации {loc_name} добавлены.')
+
+                    photos_repo.load_photos(id_loc=id_loc, urls=self.parse_yandex.loc_photos.values())
+                    logger.info(f'{len(self.parse_yandex.loc_photos)} фото для локации {loc_name} добавлены.')
+
+                return True
 
             except Exception as e:
                 logger.error(f'Ошибка создания локации {loc_name}: {e}')
                 retries += 1                                   
+        return False
 
 
 class WeatherProcessor:
@@ -259,9 +258,18 @@ class WeatherProcessor:
         """
         try:
             full_cities_data = self.parse_weather.get_all_temperature()
+            failed = []
             for id_city, temperatures in full_cities_data.items():
-                self.mv_repo.fill_weather(id_city, temperatures)
-                logger.info(f'Погодные данные для города ID {id_city} загружены.')
+                # каждый город — своя транзакция: ошибка одного не откатывает остальные
+                try:
+                    with self.mv_repo.unit_of_work():
+                        self.mv_repo.fill_weather(id_city, temperatures)
+                    logger.info(f'Погодные данные для города ID {id_city} загружены.')
+                except Exception as e:
+                    failed.append(id_city)
+                    logger.error(f'Ошибка загрузки погодных данных для города ID {id_city}: {e}')
+            if failed:
+                logger.warning(f'Погодные данные не загружены для городов: {failed}')
             logger.info('Загрузка всех погодных данных завершена.')
         except Exception as e:
             logger.error(f"Ошибка при обработке погодных данных: {e}")
@@ -283,8 +291,8 @@ class SyncProcessor:
         """
         try:
             found_regions, not_found_regions = compare_regions.compare_regions_from_weather()
-            self.sync_repo.fill(Region, 'weather', found_regions)
-            logger.info(f"Синхронизировано {len(found_regions)} регионов.")
+            summary = self.sync_repo.fill(Region, 'weather', found_regions)
+            logger.info(f"Синхронизировано {len(found_regions)} регионов: {summary}.")
             logger.warning(f"Не найдены регионы: {not_found_regions}")
         except Exception as e:
             logger.error(f"Ошибка при синхронизации регионов и городов: {e}")
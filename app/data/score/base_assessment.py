@@ -2,16 +2,20 @@ import numpy as np
 import pandas as pd
 from app.logging_config import logger
 from app.data.database.models_repository import (LocationsRepository, 
+                                                 CitiesRepository,
                                                  MetricValueRepository, 
-                                                 MetricRepository
+                                                 MetricRepository,
+                                                 EntityKpiRepository
                                                  )
 from app.data.parsing.perplexity_parsing import ParsePerplexity
 from app.data.imports.import_json import import_json_file
 from app.data.calc.base_calc import Region_calc
+from app.data.calc.rating import percentile_rating, percentile_table
+from app.data.score.segment_batch import SegmentBatchEvaluation
+from app.data.transform.geo_resolver import GeoResolver
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from shapely import wkb
-from geoalchemy2.shape import to_shape
 
 class OverallTourismEvaluation:
     def __init__(self, segment_scores=3, general_infra=3, safety=3, flow=3, nights=3, climate=3, prices=3, distance=3):
@@ -63,32 +67,44 @@ class OverallTourismEvaluation:
 
 
 class TourismEvaluation:
+    # Количество локаций, отзывы которых загружаются одним запросом
+    REVIEWS_BATCH = 100
+
     def __init__(self):
         """
         Базовый класс для оценки туризма.
         """
-        pass
+        # регионы, для которых оценка удаленности уже посчитана этим экземпляром
+        self._distance_regions = set()
 
 
 
     def get_like_locations_full(self, name_segment):
         """
         Оценка типов локаций lvl1 и lvl2 у сегмента
+
+        Returns:
+            bool: True, если все оценки записаны.
         """
         logger.info('Инициализация get_like_locations - оценка локаций и количеств локаций')
         segments = import_json_file(file_path=r'app\files\segments.json')
         lvl1 = segments[name_segment]['lvl1']
-        self.calculate_like_locations_lvl1(lvl1)
+        ok_lvl1 = self.calculate_like_locations_lvl1(lvl1)
         lvl2 = segments[name_segment]['lvl2']
         lvl2 = lvl2 + [i for i in lvl1.keys()]
-        self.calculate_like_locations_lvl2(lvl2)
+        ok_lvl2 = self.calculate_like_locations_lvl2(lvl2)
         logger.info("Оценка окончена")
+        return ok_lvl1 and ok_lvl2
 
 
     def calculate_like_locations_lvl1(self, types_locations):
         """
         Оценка важных локаций из списка types_locations
+
+        Returns:
+            bool: True, если оценки всех локаций записаны.
         """
+        ok = True
         for type_location in types_locations:
             logger.info(f'Обработка важного типа локации {type_location}')
             l = LocationsRepository()
@@ -97,10 +113,16 @@ class TourismEvaluation:
             # преобразование столбца и получение перцентилей
             df = pd.DataFrame(df)
             df['count_reviews'] = pd.to_numeric(df['count_reviews'])
-            percentiles = df['count_reviews'].quantile([i*0.01 for i in range(1,101)])
-            percentiles = [percentiles[i*0.01] for i in range(1,101)]
+            # оценка количества отзывов сразу для всех локаций типа
+            df['like_count_reviews'] = percentile_rating(df['count_reviews'],
+                                                         percentile_table(df['count_reviews']))
+            # без количества отзывов (NaN) — 5.0, как в прежнем get_tour_flow_rating
+            df['like_count_reviews'] = df['like_count_reviews'].fillna(5.0)
+            # отзывы загружаются пачками по REVIEWS_BATCH локаций (один запрос на пачку)
+            id_locations = df['id_location'].tolist()
+            reviews_batch = {}
             # обработка каждой локации
-            for index, row in df.iterrows():
+            for position, (index, row) in enumerate(df.iterrows()):
                 # Проверка на существование оценки локации и её давность
                 m = MetricValueRepository()
                 info_loc = m.get_info_metricvalue(id_metric=236, 
@@ -118,9 +140,13 @@ class TourismEvaluation:
                 # получение оценки яндекс
                 like_yandex = row.like.replace(',', '.') if row.like else 0
                 # получение оценки количества отзывов
-                like_count_reviews = self.get_tour_flow_rating(x=row.count_reviews, pcts=percentiles)
+                like_count_reviews = row.like_count_reviews
                 # получение отзывов для их оценки
-                reviews = r.get_reviews_top50(id_location=row.id_location)
+                if row.id_location not in reviews_batch:
+                    reviews_batch = r.get_reviews_top50_batch(
+                        id_locations=id_locations[position:position + self.REVIEWS_BATCH]
+                    )
+                reviews = reviews_batch.get(row.id_location)
                 if reviews:
                     reviews = ';'.join([review["text"] for review in reviews])
                     text = types_locations[type_location]
@@ -134,96 +160,62 @@ class TourismEvaluation:
                 like = 0.35 * float(like_yandex) + 0.35 * float(like_reviews) + 0.3 * float(like_count_reviews)
                 like = str(round(like,2))
                 logger.info(f'Для локации {row.id_location} типа {type_location} итоговая оценка {like}')
-                m.loading_info(id_mv=info_loc[0].id_mv if info_loc else '',
+                loaded = m.loading_info(id_mv=info_loc[0].id_mv if info_loc else '',
                                 id_metric=236, 
                                 id_location=row.id_location,
                                 id_city=int(row.id_city) if 'id_city' in row and (not pd.isna(row.id_city)) else '',
                                 id_region=int(row.id_region) if 'id_region' in row and (not pd.isna(row.id_region)) else '',
                                 value=like
                             )
+                if not loaded:
+                    logger.error(f'Оценка локации {row.id_location} не записана')
+                    ok = False
+        return ok
 
     def calculate_like_locations_lvl2(self, types_locations):
         """
         Оценка не важных локаций из списка types_locations, по их количеству при помощи перцентиля
+
+        Returns:
+            bool: True, если оценки записаны.
         """
         l = LocationsRepository()
         m = MetricValueRepository()
+        # количество локаций по парам (тип, город) и (тип, регион) — один GROUP BY в БД
+        stats = l.get_type_stats(types=types_locations)
+        records = []
         for type_location in types_locations:
             logger.info(f'Обработка не важного типа локации {type_location}')
-            # получении списка локаций одного типа
-            df = l.get_locations_by_type(type_location=type_location)
-            # преобразование столбца и получение перцентилей
-            df = pd.DataFrame(df)
-            # Группировка по городам
-            df_cities = df.groupby('id_city').size().reset_index(name='count_locations')
-            # Определение перцентиля
-            percentiles_cities = df_cities['count_locations'].quantile([i*0.01 for i in range(1,101)])
-            percentiles_cities = [percentiles_cities[i*0.01] for i in range(1,101)]
-
-            # Группировка по регионам 
-            df_regions = df.groupby('id_region').size().reset_index(name='count_locations')
-            # Определение перцентиля
-            percentiles_regions = df_regions['count_locations'].quantile([i*0.01 for i in range(1,101)])
-            percentiles_regions = [percentiles_regions[i*0.01] for i in range(1,101)]
+            type_stats = stats[stats['type_location'] == type_location]
             # цикл для очередной оценки, сначала города, потом регионы
             for id in ['city', 'region']:
                 logger.info(f"Обработка для {id}")
-                place = df_cities if id =='city' else df_regions
-                for index, row in place.iterrows():
-                    info_locations = m.get_info_metricvalue(
-                                            id_metric=239,
-                                            id_city=int(row.id_city) if 'id_city' in row and (not pd.isna(row.id_city)) else '',
-                                            id_region=int(row.id_region) if 'id_region' in row and (not pd.isna(row.id_region)) else '',
-                                            type_location=type_location
-                                            )
-                    # if info_locations:
-                    #     # проверка на давность рассчитанной метрики
-                    #     if self.check_limit_month(date=info_locations[0].modify_time):
-                    #         logger(f"Посчитано для {id}-{row.id_city if id == "city" else row.id_region} пропускаем")
-                    #         continue
-                    # Оценка и загрузка/обноление полученного значения
-                    like_count_locations = self.get_tour_flow_rating(x=row.count_locations, 
-                                                                    pcts=percentiles_cities 
-                                                                    if id =='city' else percentiles_regions)
-                    like_count_locations = str(like_count_locations)
+                place = type_stats[type_stats['level'] == id]
+                if place.empty:
+                    continue
+                # Оценка всех значений по одной таблице перцентилей
+                counts = place['count_locations'].astype(float)
+                ratings = percentile_rating(counts, percentile_table(counts))
+                for row, like_count_locations in zip(place.itertuples(index=False), ratings):
+                    like_count_locations = str(float(like_count_locations))
                     logger.info(f'Оценка для {id}-{row.id_city if id == "city" else row.id_region} = {like_count_locations}')
-                    m.loading_info( id_mv=info_locations[0][-1] if info_locations else '',
-                                    id_metric=239, 
-                                    type_location=type_location,
-                                    id_city=int(row.id_city) if 'id_city' in row and (not pd.isna(row.id_city)) else '',
-                                    id_region=int(row.id_region) if 'id_region' in row and (not pd.isna(row.id_region)) else '',
-                                    value=like_count_locations
-                        )
-
-                    
+                    records.append({
+                        'id_metric': 239,
+                        'type_location': type_location,
+                        'id_city': int(row.id_city) if id == 'city' else None,
+                        'id_region': int(row.id_region) if id == 'region' else None,
+                        'value': like_count_locations,
+                    })
+        # загрузка/обновление всех оценок одной пакетной записью (None — ошибка записи)
+        return m.bulk_upsert(records) is not None
+
     def get_tour_flow_rating(self, x: float, pcts: list) -> float:
         """
-        Возвращает рейтинг в диапазоне [1.0; 5.0] с одним знаком после запятой
-        по расширенной перцентильной шкале.
+        Возвращает рейтинг в диапазоне [1.0; 5.0] с двумя знаками после запятой
+        по расширенной перцентильной шкале для одного значения.
+        Для массивов значений используется percentile_rating.
         """
-        # 1. Если x меньше первого перцентиля
-        if x < pcts[0]:
-            return 1.0
-        
-        # 2. Если x больше последнего перцентиля
-        if x > pcts[-1]:
-            return 5.0
-        
-        # 3. Иначе ищем, в какой промежуток попадает x
-        for i in range(len(pcts) - 1):
-            if pcts[i] <= x < pcts[i+1]:
-                # 4. Доля внутри интервала
-                alpha = (x - pcts[i]) / (pcts[i+1] - pcts[i])
-                
-                # 5. Индекс процентиля i + alpha
-                # 6. Переводим в шкалу 1..5:
-                rating = 1 + 4 * ((i + alpha) / 99.0)
-                
-                # 7. Округляем
-                return round(rating, 2)
-        
-        # На всякий случай, если x == pcts[-1]
-        return 5.0
+        return float(percentile_rating(x, pcts))
     
     def check_limit_month(self, date):
         date = datetime(date.year, date.month, date.day)
@@ -259,6 +251,8 @@ class TourismEvaluation:
             logger.info("Запуск рассчета составных частей оценки сегмента - calculation_segment_parts")
             segments = import_json_file(file_path=r'app\files\segments.json')
             calc = Region_calc(id_city=id_city, id_region=id_region)
+            m = MetricRepository()
+            records = []
             for name_segment, loc in segments.items():
                 dictionary = calc.get_segment_calc(segment={name_segment:loc})
                 # Средняя оценка основных локаций
@@ -272,22 +266,16 @@ class TourismEvaluation:
                 l = round(l, 2)
                 # Оценка погоды
                 w = dictionary['like_weather']
-                m = MetricRepository()
-                mv = MetricValueRepository()
                 logger.info(f'Рассчитаны значения для оценки сегмента {name_segment}')
                 calculated_values = {'o':o, 'n':n, 'l':l, 'w':w}
                 for name_value in calculated_values:
                     # Определение id метрики
                     id_metric = m.get_id_type_location(metric_name=f'{name_segment}_{name_value}')
-                    metric = mv.get_info_metricvalue(id_metric=id_metric,
-                                                    id_city=id_city,
-                                                    id_region=id_region)
-                    id_mv = metric[0].id_mv if metric else ''
-                    mv.loading_info(id_mv=id_mv,
-                                    id_metric=id_metric,
-                                    id_city=int(id_city) if id_city else '',
-                                    id_region=int(id_region) if id_region else '',
-                                    value=str(calculated_values[name_value]))
+                    records.append({'id_metric': id_metric,
+                                    'id_city': int(id_city) if id_city else None,
+                                    'id_region': int(id_region) if id_region else None,
+                                    'value': str(calculated_values[name_value])})
+            MetricValueRepository().bulk_upsert(records)
         except:
             logger.error(f'id_city={id_city}, id_region={id_region}, o={o}, n={n}, l={l}, w={w}')
 
@@ -300,7 +288,7 @@ class TourismEvaluation:
             segments = import_json_file(file_path=r'app\files\segments.json')
             calc = Region_calc(id_city=id_city, id_region=id_region)
             m = MetricRepository()
-            mv = MetricValueRepository()
+            records = []
             for segment_name in segments:
                 if segment_name == 'complex':
                     continue
@@ -314,39 +302,52 @@ class TourismEvaluation:
                 segment_like = round(segment_like, 2)       
                 id_metric = m.get_id_type_location(metric_name=f'segment_{segment_name}')
                 if id_metric:
-                    metrics = mv.get_info_metricvalue(id_metric=id_metric,
-                                                    id_city=id_city,
-                                                    id_region=id_region)
-                    if id_region and metrics:
-                        metrics = [i for i in metrics if not i.id_city]
-                    if len(metrics) >= 2:
-                        logger.error(f'Найдено несколько значений для метрики {id_metric}, id_r={id_region}, id_c={id_city}')
-                    id_mv = metrics[0].id_mv if metrics else ''
-                    mv.loading_info(id_mv=id_mv,
-                                    id_metric=id_metric,
-                                    id_city=int(id_city) if id_city else '',
-                                    id_region=int(id_region) if id_region else '',
-                                    value=str(segment_like))
+                    records.append({'id_metric': id_metric,
+                                    'id_city': int(id_city) if id_city else None,
+                                    'id_region': int(id_region) if id_region else None,
+                                    'value': str(segment_like)})
                 else:
                     logger.error(f'Не найдено id_metric, проверить в БД таблице метрик')
+            MetricValueRepository().bulk_upsert(records)
         except:
             logger.error('Ошбика при оценке сегмента')
     
+    def calculating_segments_batch(self, id_regions=None):
+        """
+        Рассчет составных частей и оценок сегментов сразу для всех регионов
+        и городов (или регионов из id_regions с их городами) — то же, что
+        calculation_segment_parts и calculating_segments_score по каждому
+        городу и региону, но с однократной загрузкой данных и одной записью.
+        """
+        logger.info(f'Пакетная оценка сегментов, регионы: {id_regions or "все"}')
+        return SegmentBatchEvaluation().run(id_regions=id_regions)
+
     def calculating_complex_parts(self, id_region, id_city=''):
         '''
         Рассчет и загрузкасоставных частей комплексной оценки
+
+        Returns:
+            bool: True, если обе составные части записаны.
         '''
         logger.info(f"Рассчет составных частей комплексной оценки для id_r = {id_region}, id_c = {id_city}")
         # self.calculating_complex_tur_nig(id_region=id_region,
         #                                  id_city=id_city)
-        self.calculating_complex_distance(id_region=id_region,
-                                         id_city=id_city)
+        ok_distance = self.calculating_complex_distance(id_region=id_region,
+                                                        id_city=id_city)
         if id_city:
-            self.calculating_complex_segments(id_city=id_city)
+            ok_segments = self.calculating_complex_segments(id_city=id_city)
         else:
-            self.calculating_complex_segments(id_region=id_region)
+            ok_segments = self.calculating_complex_segments(id_region=id_region)
+        return ok_distance and ok_segments
         
 
+    def refresh_dashboard_kpi(self):
+        """
+        Обновление витрины KPI дашбордов (entity_kpi) в конце прогона оценки
+        """
+        logger.info('Обновление витрины KPI дашбордов')
+        EntityKpiRepository().refresh()
+
     def calculating_complex_tur_nig(self, id_region, id_city=''):
         """
         Рассчет оценки суммарного турпотока и количества ночевок для регоина
@@ -356,121 +357,98 @@ class TourismEvaluation:
             mv = MetricValueRepository()
             t_n= r.get_tur_night()
             metrics = {'tur':283, 'night':284}
-            for key, df in t_n.items():
-                percentiles = df['value'].quantile([i*0.01 for i in range(1,101)])
-                percentiles = [percentiles[i*0.01] for i in range(1,101)]
-                value = df[df['id_region'] == id_region].value
-                like_count = self.get_tour_flow_rating(x=float(value), 
-                                                        pcts=percentiles
-                                                        )
-                like_count = round(like_count, 2)
-                metric = mv.get_info_metricvalue(id_metric=metrics[key],
-                                                id_city=id_city,
-                                                id_region=id_region
-                                                )
-                id_mv = metric[0].id_mv if metric else ''
-                mv.loading_info(id_mv = id_mv,
-                                id_metric=metrics[key],
-                                id_city=id_city,
-                                id_region=id_region,
-                                value = like_count
-                                )
-                logger.info(f'Добавлена метрика {key} со значением {like_count}')
+            records = []
+            for key, sums in t_n.items():
+                if sums['value'] is None:
+                    logger.warning(f'Нет значений метрики {key} для региона {id_region}')
+                    continue
+                # перцентили по суммам регионов посчитаны в БД (get_value_percentiles)
+                like_count = float(percentile_rating(sums['value'], sums['percentiles']))
+                records.append({'id_metric': metrics[key],
+                                'id_city': id_city,
+                                'id_region': id_region,
+                                'value': like_count})
+                logger.info(f'Рассчитана метрика {key} со значением {like_count}')
+            mv.bulk_upsert(records)
         except Exception as e:
             logger.error(f'Ошибка в методе calculating_complex_tur_nig: {e}')
 
     def calculating_complex_distance(self, id_region, id_city=''):
         """
-        Рассчет оценки расстояния от столицы региона
+        Рассчет оценки расстояния от столицы региона.
+        Оценки считаются сразу для всех городов региона (calculating_region_distances)
+        один раз на экземпляр; повторные вызовы для городов того же региона
+        уже ничего не пересчитывают.
+
+        Returns:
+            bool: True, если оценки региона посчитаны (сейчас или ранее).
+        """
+        if id_region in self._distance_regions:
+            return True
+        if self.calculating_region_distances(id_region=id_region) is None:
+            return False
+        self._distance_regions.add(id_region)
+        return True
+
+    def calculating_region_distances(self, id_region=None):
+        """
+        Рассчет оценки удаленности от столицы для всех городов региона
+        (или всех регионов, если id_region не указан) за один проход.
+
+        Координаты загружаются одним запросом, расстояния до столицы
+        считаются по большому кругу (км) векторно, все города региона
+        оцениваются по одной таблице перцентилей: ближе первого перцентиля — 5,
+        дальше последнего — 1 (обратный показатель). Результаты, включая
+        оценку 5 для самого региона, пишутся одной пакетной записью.
+
+        Returns:
+            Optional[int]: Количество записанных оценок (0 без данных, None при ошибке).
         """
         try:
-            if id_city:
-                r = Region_calc(id_region = id_region)
-                distance = r.get_distance_cities()
-                # получение координат столицы
-                wkb_element = distance['capital'][0].coordinates
-                point = to_shape(wkb_element)
-                longitude_capital, latitude_capital = point.x, point.y
-                mass = []
-                for city in distance['cities']:
-                    point = to_shape(city.coordinates)
-                    longitude_city, latitude_city = point.x, point.y
-                    longitude = (longitude_city - longitude_capital)**2
-                    latitude = (latitude_city - latitude_capital)**2
-                    length = (longitude + latitude)**0.5
-                    mass.append(length)
-                mass.sort()
-                df =  pd.DataFrame({'length':mass})
-                percentiles = df['length'].quantile([i*0.01 for i in range(1,101)])
-                percentiles = [percentiles[i*0.01] for i in range(1,101)]
-                city = [i for i in distance['cities'] if i.id_city == id_city][0]
-                point = to_shape(city.coordinates)
-                longitude_city, latitude_city = point.x, point.y
-                longitude = (longitude_city - longitude_capital)**2
-                latitude = (latitude_city - latitude_capital)**2
-                length = (longitude + latitude)**0.5
-                
-                pcts = percentiles
-                x = length
-                # 1. Если x меньше первого перцентиля
-                if x <= pcts[0]:
-                    like_distance = 5.0
-                
-                # 2. Если x больше последнего перцентиля
-                elif x >= pcts[-1]:
-                    like_distance = 1.0
-                
-                # 3. Иначе ищем, в какой промежуток попадает x
-                else:
-                    for i in range(len(pcts) - 1):
-                        if pcts[i] <= x < pcts[i+1]:
-                            # 4. Доля внутри интервала
-                            alpha = (x - pcts[i]) / (pcts[i+1] - pcts[i])
-                            
-                            # 5. Индекс процентиля i + alpha
-                            # 6. Переводим в шкалу 1..5:
-                            rating = 7 - 4 * ((i + alpha) / 99.0)
-                            
-                            # 7. Округляем
-                            like_distance = round(rating, 2)
-                like_distance = self.get_tour_flow_rating(x=length, 
-                                                        pcts=percentiles
-                                                        )
-
-            else:
-                like_distance = 5
-            like_distance = round(like_distance, 2)
-            mv = MetricValueRepository()
-            metric = mv.get_info_metricvalue(id_metric = 285,
-                                            id_region = id_region,
-                                            id_city = id_city)
-            id_mv = metric[0].id_mv if metric else ''
-            mv.loading_info(id_mv = id_mv,
-                            id_metric = 285,
-                            id_region = id_region,
-                            id_city = id_city,
-                            value = like_distance)
+            cities = CitiesRepository().get_city_coordinates(id_region=id_region)
+            records = []
+            for region, group in cities.groupby('id_region', sort=False):
+                capital = group[group['is_capital']]
+                group = group.dropna(subset=['lon', 'lat'])
+                if capital.empty or group.empty or pd.isna(capital['lat'].iloc[0]):
+                    logger.warning(f'Нет координат столицы или городов для региона {region}')
+                    continue
+                distance = GeoResolver.haversine_km(group['lat'].to_numpy(), group['lon'].to_numpy(),
+                                                    capital['lat'].iloc[0], capital['lon'].iloc[0])
+                like_distance = percentile_rating(distance, percentile_table(distance), inverted=True)
+                records.extend({'id_metric': 285,
+                                'id_region': int(region),
+                                'id_city': int(id_city),
+                                'value': float(like)}
+                               for id_city, like in zip(group['id_city'], like_distance))
+                records.append({'id_metric': 285, 'id_region': int(region), 'id_city': None, 'value': 5.0})
+                logger.info(f'Рассчитана удаленность от столицы для {len(group)} городов региона {region}')
+            if MetricValueRepository().bulk_upsert(records) is None:
+                return None
+            return len(records)
         except Exception as e:
-            logger.error(f'Ошибка в методе calculating_complex_distance: {e}')
+            logger.error(f'Ошибка в методе calculating_region_distances: {e}')
+            return None
     
     def calculating_complex_segments(self, id_region='', id_city=''):
         """
         Рассчет средней оценки сегментов для региона
+
+        Returns:
+            bool: True, если оценка записана.
         """
         r = Region_calc(id_city=id_city, id_region=id_region)
-        mv = MetricValueRepository()
         segments = r.get_like_segments()
+        if segments is None:
+            # ошибка чтения оценок сегментов уже залогирована в get_like_segments
+            return False
         like = np.mean([float(segments[i]) for i in segments]) if segments else 1 
         like = round(like, 2)
-        metric = mv.get_info_metricvalue(id_metric = 217,
-                                        id_region = id_region,
-                                        id_city = id_city)
-        id_mv = metric[0].id_mv if metric else ''
-        mv.loading_info(id_mv = id_mv,
-                        id_metric = 217,
-                        id_region = id_region,
-                        id_city = id_city,
-                        value = like)
+        written = MetricValueRepository().bulk_upsert([{'id_metric': 217,
+                                                        'id_region': id_region,
+                                                        'id_city': id_city,
+                                                        'value': like}])
+        return written is not None
 
         
         
@@ -0,0 +1,224 @@
+# app/data/score/segment_batch.py
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.logging_config import logger
+from app.data.database.models_repository import (CitiesRepository,
+                                                 LocationsRepository,
+                                                 MetricRepository,
+                                                 MetricValueRepository,
+                                                 )
+from app.data.imports.import_json import import_json_file
+
+
+class SegmentBatchEvaluation:
+    """
+    Пакетная оценка сегментов для всех регионов и городов сразу.
+
+    Делает то же, что calculation_segment_parts + calculating_segments_score
+    для каждого города и региона, но исходные данные загружаются один раз
+    (средние оценки локаций 236 и количества по типам — одним GROUP BY,
+    оценки количества 239 и климат 213/216 — fetch_frame), составные части
+    o/n/l/w и оценки сегментов считаются groupby/reindex по DataFrame,
+    а результат пишется одной пакетной записью.
+    """
+
+    COUNT_METRIC = 239
+    WEATHER_METRICS = {'day': 213, 'water': 216}
+    # Диапазоны температур "теплого" месяца
+    WARM_DAY = (23, 32)
+    BEACH_DAY = (23, 35)
+    BEACH_WATER = (20, 40)
+    # Минимальное значение составной части при оценке сегмента
+    MIN_PART = 2
+
+    def __init__(self, segments: Optional[Dict[str, Any]] = None):
+        self.segments = segments or import_json_file(file_path=r'app\files\segments.json')
+        self.entities = pd.DataFrame()
+        self.ratings = pd.DataFrame()
+        self.counts = pd.DataFrame()
+        self.weather = pd.DataFrame()
+
+    def load(self, id_regions: Optional[Iterable[int]] = None) -> 'SegmentBatchEvaluation':
+        """
+        Загружает исходные данные по всей стране или по списку регионов.
+        """
+        id_regions = sorted({int(i) for i in id_regions}) if id_regions is not None else None
+        self.entities = self._load_entities(id_regions)
+        types = sorted({t for segment in self.segments.values()
+                        for t in list(segment['lvl1']) + list(segment['lvl2'])})
+        only_region = id_regions[0] if id_regions and len(id_regions) == 1 else None
+        stats = LocationsRepository().get_type_stats(types=types, id_region=only_region)
+        self.ratings = self._by_entity(stats, 'avg_rating')
+
+        mv = MetricValueRepository()
+        columns = ['id_region', 'id_city', 'type_location', 'value_num']
+        if id_regions is None:
+            counts = mv.fetch_frame(filters={'id_metric': self.COUNT_METRIC}, columns=columns)
+        else:
+            # у записей городов id_region пуст: города и регионы загружаются отдельно
+            city_ids = self.entities.xs('city', level='level').index.tolist() \
+                if 'city' in self.entities.index.get_level_values('level') else []
+            counts = pd.concat([
+                mv.fetch_frame(filters={'id_metric': self.COUNT_METRIC, 'id_city': city_ids}, columns=columns),
+                mv.fetch_frame(filters={'id_metric': self.COUNT_METRIC, 'id_region': id_regions, 'id_city': None},
+                               columns=columns),
+            ], ignore_index=True)
+        counts['level'] = np.where(counts['id_city'].notna(), 'city', 'region')
+        # значение без числа учитывается как 0, отсутствующая запись пропускается
+        counts['value'] = counts['value_num'].fillna(0).round(2)
+        self.counts = self._by_entity(counts, 'value')
+
+        filters = {'id_metric': list(self.WEATHER_METRICS.values())}
+        if id_regions is not None:
+            filters['id_city'] = self.entities['weather_city'].dropna().astype(int).unique().tolist()
+        self.weather = self._weather_scores(mv.fetch_frame(filters=filters,
+                                                           columns=['id_metric', 'id_city', 'value_num', 'month']))
+        logger.info(f"SegmentBatchEvaluation: загружено {len(self.entities)} городов и регионов, "
+                    f"{len(stats)} строк статистики типов, {len(counts)} оценок количества")
+        return self
+
+    @staticmethod
+    def _load_entities(id_regions: Optional[List[int]]) -> pd.DataFrame:
+        """
+        Города и регионы с индексом (level, id); weather_city — город, чья
+        погода оценивается (для региона — столица).
+        """
+        cities = CitiesRepository().get_city_coordinates()
+        cities = cities.dropna(subset=['id_region'])
+        if id_regions is not None:
+            cities = cities[cities['id_region'].isin(id_regions)]
+        capitals = cities[cities['is_capital']].drop_duplicates('id_region').set_index('id_region')['id_city']
+        regions = pd.DataFrame({'id_region': sorted(cities['id_region'].astype(int).unique())})
+        frames = [
+            pd.DataFrame({
+                'level': 'city',
+                'id': cities['id_city'].astype(int).to_numpy(),
+                'id_city': cities['id_city'].astype(int).to_numpy(),
+                'id_region': None,
+                'weather_city': cities['id_city'].astype(float).to_numpy(),
+            }),
+            pd.DataFrame({
+                'level': 'region',
+                'id': regions['id_region'].to_numpy(),
+                'id_city': None,
+                'id_region': regions['id_region'].to_numpy(),
+                'weather_city': regions['id_region'].map(capitals).astype(float).to_numpy(),
+            }),
+        ]
+        return pd.concat(frames, ignore_index=True).set_index(['level', 'id'])
+
+    @staticmethod
+    def _by_entity(frame: pd.DataFrame, value: str) -> pd.DataFrame:
+        """
+        Таблица (level, id) x type_location из строк уровня города и региона.
+        """
+        frame = frame[frame['type_location'].notna()].copy()
+        frame['id'] = np.where(frame['level'] == 'city', frame['id_city'], frame['id_region'])
+        frame = frame[frame['id'].notna()]
+        frame['id'] = frame['id'].astype(int)
+        return frame.groupby(['level', 'id', 'type_location'])[value].first().unstack()
+
+    def _weather_scores(self, weather: pd.DataFrame) -> pd.DataFrame:
+        """
+        Оценка климата по городам: количество теплых месяцев (0 -> 1, ..., 4 и более -> 5)
+        для всех сегментов и для пляжного (вода и воздух в один месяц).
+        """
+        weather = weather[weather['id_city'].notna()]
+        day = weather[weather['id_metric'] == self.WEATHER_METRICS['day']]
+        warm = day['value_num'].between(*self.WARM_DAY).groupby(day['id_city'].astype(int)).sum()
+
+        by_month = (weather.drop_duplicates(['id_metric', 'id_city', 'month'], keep='last')
+                    .pivot_table(index=['id_city', 'month'], columns='id_metric', values='value_num'))
+        beach = pd.Series(dtype=float)
+        if not by_month.empty:
+            by_month = by_month.reindex(columns=list(self.WEATHER_METRICS.values()))
+            month_ok = (by_month[self.WEATHER_METRICS['water']].between(*self.BEACH_WATER)
+                        & by_month[self.WEATHER_METRICS['day']].between(*self.BEACH_DAY))
+            beach = month_ok.groupby(level='id_city').sum()
+            beach.index = beach.index.astype(int)
+
+        scores = pd.DataFrame({'warm': warm, 'beach': beach}).fillna(0)
+        return (scores + 1).clip(upper=5)
+
+    def calculate(self) -> pd.DataFrame:
+        """
+        Составные части и оценки сегментов для всех загруженных городов и регионов.
+
+        Returns:
+            pd.DataFrame: Индекс (level, id), колонки (segment, часть) — o/n/l/w
+            и score (у 'complex' оценки сегмента нет, у 'sports' нет w).
+        """
+        index = self.entities.index
+        weather_city = self.entities['weather_city']
+        columns = {}
+        for name, segment in self.segments.items():
+            lvl1, lvl2 = list(segment['lvl1']), list(segment['lvl2'])
+            # средняя оценка основных локаций: тип без локаций дает 0
+            o = self.ratings.reindex(index=index, columns=lvl1).fillna(0).round(2).mean(axis=1)
+            # средние оценки количества: учитываются только посчитанные типы
+            n = self.counts.reindex(index=index, columns=lvl1).mean(axis=1)
+            l = self.counts.reindex(index=index, columns=lvl2).mean(axis=1)
+            if name == 'sports':
+                w = pd.Series(np.nan, index=index)
+            else:
+                w = weather_city.map(self.weather['beach' if name == 'beach' else 'warm']).fillna(1)
+            parts = {'o': o.round(2), 'n': n.round(2), 'l': l.round(2), 'w': w}
+            for part, values in parts.items():
+                columns[(name, part)] = values
+            if name == 'complex':
+                continue
+            v = {part: values.fillna(self.MIN_PART).clip(lower=self.MIN_PART) for part, values in parts.items()}
+            if name == 'sports':
+                score = 0.65 * v['o'] + 0.35 * (0.7 * v['n'] + 0.3 * v['l'])
+            else:
+                score = 0.5 * v['o'] + 0.3 * v['w'] + 0.2 * (0.7 * v['n'] + 0.3 * v['l'])
+            columns[(name, 'score')] = score.round(2)
+        return pd.DataFrame(columns, index=index)
+
+    def records(self, result: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Записи для bulk_upsert: части — метрики '<segment>_<o|n|l|w>',
+        оценки — 'segment_<segment>'.
+        """
+        names = {(segment, part): f'segment_{segment}' if part == 'score' else f'{segment}_{part}'
+                 for segment, part in result.columns}
+        ids = MetricRepository().get_metric_ids(names.values())
+        entities = self.entities.reindex(result.index)
+        records = []
+        for column in result.columns:
+            id_metric = ids.get(names[column])
+            if id_metric is None:
+                continue
+            part = column[1]
+            for id_city, id_region, value in zip(entities['id_city'], entities['id_region'], result[column]):
+                if pd.isna(value):
+                    value = None
+                elif part == 'w':
+                    value = int(value)
+                else:
+                    value = float(value)
+                records.append({'id_metric': id_metric,
+                                'id_city': None if pd.isna(id_city) else int(id_city),
+                                'id_region': None if pd.isna(id_region) else int(id_region),
+                                'value': value})
+        return records
+
+    def run(self, id_regions: Optional[Iterable[int]] = None) -> int:
+        """
+        Загрузка, расчет и запись оценок сегментов одной пакетной записью.
+
+        Args:
+            id_regions (Optional[Iterable[int]]): Регионы (с их городами); None — вся страна.
+
+        Returns:
+            int: Количество записанных значений метрик.
+        """
+        self.load(id_regions=id_regions)
+        result = self.calculate()
+        written = MetricValueRepository().bulk_upsert(self.records(result))
+        logger.info(f"SegmentBatchEvaluation: оценено {len(result)} городов и регионов, записано {written} значений")
+        return written
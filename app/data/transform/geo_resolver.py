@@ -0,0 +1,260 @@
+# app/data/transform/geo_resolver.py
+
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+from app.logging_config import logger
+from app.data.database import CitiesRepository, SyncRepository
+from app.models import City
+
+FILES_DIR = Path(__file__).resolve().parents[2] / 'files'
+
+# Средний радиус Земли, км
+EARTH_RADIUS_KM = 6371.0
+
+
+def _to_float(value: Any) -> float:
+    """Координата из строки или числа; NaN, если значение не распознано."""
+    try:
+        return float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class GeoResolver:
+    """
+    Локальное определение региона и города по координатам без внешних API.
+
+    Регион — полигон из app/files/regions.geojson, содержащий точку
+    (id_region по имени 'name:ru' через sync, источник 'OSM').
+    Город — полигон из app/files/municipalities/<id_region>.geojson,
+    содержащий точку, а для точечных объектов (центры населенных пунктов) —
+    ближайший центр того же региона не дальше CITY_RADIUS_KM
+    (id_city по OSM-идентификатору из cities.characters['OSM']).
+
+    Деревья STRtree строятся один раз на процесс (instance()); если
+    построение не удалось, до конца процесса используется пустой
+    резолвер (empty()), и определение идет через внешние API.
+    """
+
+    CITY_RADIUS_KM = 15.0
+
+    _instance: Optional['GeoResolver'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        regions_path: Optional[Path] = None,
+        municipalities_dir: Optional[Path] = None,
+        city_radius_km: Optional[float] = None,
+    ):
+        self.regions_path = Path(regions_path or FILES_DIR / 'regions.geojson')
+        self.municipalities_dir = Path(municipalities_dir or FILES_DIR / 'municipalities')
+        self.city_radius_km = city_radius_km or self.CITY_RADIUS_KM
+        self.region_tree, self.region_ids = self._build_regions()
+        (self.city_area_tree, self.city_area_ids, self.city_area_regions,
+         self.city_point_tree, self.city_point_ids, self.city_point_regions) = self._build_cities()
+
+    @classmethod
+    def instance(cls) -> 'GeoResolver':
+        """Общий для процесса резолвер (деревья строятся при первом обращении)."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    try:
+                        cls._instance = cls()
+                    except Exception as e:
+                        # не перестраиваем деревья и не сканируем sync/cities на каждую точку
+                        logger.error(f"GeoResolver: ошибка построения, локальное определение отключено: {e}")
+                        cls._instance = cls.empty()
+        return cls._instance
+
+    @classmethod
+    def empty(cls) -> 'GeoResolver':
+        """Резолвер без полигонов и центров: resolve всегда возвращает None."""
+        resolver = cls.__new__(cls)
+        resolver.regions_path = None
+        resolver.municipalities_dir = None
+        resolver.city_radius_km = cls.CITY_RADIUS_KM
+        no_ids = np.array([], dtype=np.int64)
+        resolver.region_tree, resolver.region_ids = None, no_ids
+        (resolver.city_area_tree, resolver.city_area_ids, resolver.city_area_regions,
+         resolver.city_point_tree, resolver.city_point_ids, resolver.city_point_regions) = (
+            None, no_ids, no_ids, None, no_ids, no_ids)
+        return resolver
+
+    @staticmethod
+    def _read_features(path: Path) -> List[Dict[str, Any]]:
+        with path.open(encoding='utf-8') as f:
+            return json.load(f).get('features', [])
+
+    def _build_regions(self) -> Tuple[Optional[STRtree], np.ndarray]:
+        """Дерево полигонов регионов и массив их id_region."""
+        if not self.regions_path.exists():
+            logger.warning(f"GeoResolver: нет файла {self.regions_path}, регионы определяются только через API.")
+            return None, np.array([], dtype=np.int64)
+        sync_repo = SyncRepository()
+        geoms, ids = [], []
+        for feature in self._read_features(self.regions_path):
+            properties = feature.get('properties') or {}
+            name = properties.get('name:ru') or feature.get('name:ru')
+            geometry = feature.get('geometry')
+            if not name or not geometry or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+                continue
+            id_region = sync_repo.find_id(name, 'region', 'OSM')
+            if id_region is None:
+                logger.debug(f"GeoResolver: регион {name} не найден в sync.")
+                continue
+            geoms.append(shape(geometry))
+            ids.append(id_region)
+        if not geoms:
+            return None, np.array([], dtype=np.int64)
+        geoms = np.array(geoms, dtype=object)
+        shapely.prepare(geoms)
+        logger.info(f"GeoResolver: загружено {len(geoms)} полигонов регионов.")
+        return STRtree(geoms), np.array(ids, dtype=np.int64)
+
+    def _build_cities(self) -> Tuple[Any, ...]:
+        """
+        Деревья городов: полигоны и точки (центры) с массивами id_city и id_region.
+        """
+        osm_to_city: Dict[int, int] = {}
+        for city in CitiesRepository().iter_rows(City, columns=['id_city', 'characters']):
+            osm = (city.characters or {}).get('OSM')
+            if osm and str(osm).isdigit():
+                osm_to_city[int(osm)] = city.id_city
+
+        areas, area_ids, area_regions = [], [], []
+        points, point_ids, point_regions = [], [], []
+        paths = sorted(self.municipalities_dir.glob('*.geojson')) if self.municipalities_dir.exists() else []
+        for path in paths:
+            if not path.stem.isdigit():
+                continue
+            id_region = int(path.stem)
+            for feature in self._read_features(path):
+                properties = feature.get('properties') or {}
+                osm = properties.get('OSM') or properties.get('id')
+                id_city = osm_to_city.get(int(osm)) if osm and str(osm).isdigit() else None
+                geometry = feature.get('geometry')
+                if id_city is None or not geometry:
+                    continue
+                if geometry.get('type') in ('Polygon', 'MultiPolygon'):
+                    areas.append(shape(geometry))
+                    area_ids.append(id_city)
+                    area_regions.append(id_region)
+                elif geometry.get('type') == 'Point':
+                    points.append(shape(geometry))
+                    point_ids.append(id_city)
+                    point_regions.append(id_region)
+
+        def tree(geoms: List[Any]) -> Optional[STRtree]:
+            if not geoms:
+                return None
+            geoms = np.array(geoms, dtype=object)
+            shapely.prepare(geoms)
+            return STRtree(geoms)
+
+        logger.info(f"GeoResolver: загружено {len(areas)} границ и {len(points)} центров городов.")
+        return (
+            tree(areas), np.array(area_ids, dtype=np.int64), np.array(area_regions, dtype=np.int64),
+            tree(points), np.array(point_ids, dtype=np.int64), np.array(point_regions, dtype=np.int64),
+        )
+
+    @staticmethod
+    def _first_match(tree: Optional[STRtree], points: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Для каждой точки — id первого содержащего её полигона или -1."""
+        result = np.full(len(points), -1, dtype=np.int64)
+        if tree is None or not len(points):
+            return result
+        point_index, geom_index = tree.query(points, predicate='within')
+        # при пересечении полигонов берется первый найденный
+        point_index, first = np.unique(point_index, return_index=True)
+        result[point_index] = ids[geom_index[first]]
+        return result
+
+    def _nearest_city(self, points: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ближайший центр города не дальше city_radius_km.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: id_city и id_region центра (или -1).
+        """
+        cities = np.full(len(points), -1, dtype=np.int64)
+        regions = np.full(len(points), -1, dtype=np.int64)
+        if self.city_point_tree is None or not len(points):
+            return cities, regions
+        # Ограничение в градусах с запасом по долготе; точная проверка — по гаверсинусу
+        max_degrees = self.city_radius_km / (111.0 * max(math.cos(math.radians(np.nanmax(np.abs(lat)))), 0.1))
+        point_index, geom_index = self.city_point_tree.query_nearest(
+            points, max_distance=max_degrees, all_matches=False,
+        )
+        centers = self.city_point_tree.geometries[geom_index]
+        distance = self.haversine_km(lat[point_index], lon[point_index],
+                                     shapely.get_y(centers), shapely.get_x(centers))
+        near = distance <= self.city_radius_km
+        cities[point_index[near]] = self.city_point_ids[geom_index[near]]
+        regions[point_index[near]] = self.city_point_regions[geom_index[near]]
+        return cities, regions
+
+    @staticmethod
+    def haversine_km(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+        """Расстояние по большому кругу в километрах (векторно)."""
+        lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    def resolve_many(self, lat: Sequence[Any], lon: Sequence[Any]) -> List[Optional[List[int]]]:
+        """
+        Определяет регион и город для массивов координат.
+
+        Args:
+            lat (Sequence[Any]): Широты (числа или строки).
+            lon (Sequence[Any]): Долготы (числа или строки).
+
+        Returns:
+            List[Optional[List[int]]]: Для каждой точки [id_region, id_city],
+            [id_region] или None, если точка вне всех полигонов регионов.
+        """
+        lat = np.array([_to_float(value) for value in lat], dtype=float)
+        lon = np.array([_to_float(value) for value in lon], dtype=float)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        result: List[Optional[List[int]]] = [None] * len(lat)
+        if not valid.any():
+            return result
+        index = np.flatnonzero(valid)
+        points = shapely.points(lon[index], lat[index])
+
+        regions = self._first_match(self.region_tree, points, self.region_ids)
+        cities = self._first_match(self.city_area_tree, points, self.city_area_ids)
+        city_regions = self._first_match(self.city_area_tree, points, self.city_area_regions)
+        missing = cities < 0
+        if missing.any():
+            near_cities, near_regions = self._nearest_city(points[missing], lat[index][missing], lon[index][missing])
+            cities[missing], city_regions[missing] = near_cities, near_regions
+
+        for position, id_region, id_city, city_region in zip(index, regions, cities, city_regions):
+            if id_region < 0:
+                continue
+            # город учитывается, только если он в том же регионе, что и точка
+            if id_city >= 0 and city_region == id_region:
+                result[position] = [int(id_region), int(id_city)]
+            else:
+                result[position] = [int(id_region)]
+        return result
+
+    def resolve(self, lat: Any, lon: Any) -> Optional[List[int]]:
+        """
+        Определяет регион и город для одной точки.
+
+        Returns:
+            Optional[List[int]]: [id_region, id_city], [id_region] или None.
+        """
+        return self.resolve_many([lat], [lon])[0]
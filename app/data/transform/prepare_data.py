@@ -1,5 +1,6 @@
 #app/data/transform/prepare_data.py
 
+import asyncio
 import pandas as pd
 from geoalchemy2.shape import to_shape
 from shapely.geometry import Point
@@ -9,7 +10,16 @@ from pathlib import Path
 
 from typing import Optional, Dict, Any, List, Tuple, ClassVar
 
-from app.data.database import MetricValueRepository, CitiesRepository, SyncRepository, RegionRepository, LocationsRepository
+from app.data.database import (
+    MetricValueRepository, CitiesRepository, SyncRepository, RegionRepository, LocationsRepository,
+    EntityKpiRepository,
+)
+from app.data.database.async_repository import (
+    AsyncMetricValueRepository,
+    AsyncRegionRepository,
+    AsyncCitiesRepository,
+    run_async,
+)
 from app.models import Region, City
 from app.logging_config import logger
 from app.data.calc.base_calc import Region_calc
@@ -115,11 +125,11 @@ class Main_page_dashboard:
     def process_tourist_count_data(n=10, top=True):
         '''Получение топ N регионов по турпотоку и формирование datafrrame Pandas'''
         db = MetricValueRepository()
-        data = db.get_tourist_count_data()
-
-        # Преобразование данных в DataFrame
-        df = pd.DataFrame(data, columns=['id_region', 'value','month','year'])
-        df['value'] = df['value'].astype(int)
+        df = db.fetch_frame(
+            filters={'id_metric': 2},
+            columns=['id_region', 'value_num', 'month', 'year'],
+        ).rename(columns={'value_num': 'value'})
+        df['value'] = df['value'].fillna(0).astype(int)
 
         # Суммарный турпоток по регионам
         df_sum = df.groupby('id_region').sum().reset_index()
@@ -153,11 +163,11 @@ class Main_page_dashboard:
     def generate_heatmap_tourist_count_data(self, n=10):
         '''Генерация сводной таблицы для хитмапа турпотока'''
         db = MetricValueRepository()
-        data = db.get_tourist_count_data()
-
-        # Преобразование данных в DataFrame
-        df = pd.DataFrame(data, columns=['id_region', 'value', 'month', 'year'])
-        df['value'] = df['value'].astype(int)
+        df = db.fetch_frame(
+            filters={'id_metric': 2},
+            columns=['id_region', 'value_num', 'month', 'year'],
+        ).rename(columns={'value_num': 'value'})
+        df['value'] = df['value'].fillna(0).astype(int)
 
         # Суммарный турпоток по регионам
         df_sum = df.groupby(['id_region', 'year', 'month']).sum().reset_index()
@@ -326,8 +336,31 @@ class BaseDashboardData:
 
     def __init__(self):
         self.mv_repo = MetricValueRepository()
+        self.kpi_repo = EntityKpiRepository()
         # Кэш погоды можно реализовать тут, если потребуется
         self._weather_cache: Dict[str, Dict[int, pd.DataFrame]] = {'temp': {}, 'rainfall': {}, 'water': {}}
+        # Сырые погодные записи, загруженные заранее: {id_city: {ключ: [(value, month), ...]}}
+        self._weather_rows: Dict[int, Dict[str, List[Any]]] = {}
+        # Данные страниц, загруженные заранее параллельными запросами: {id_region: {...}}
+        self._page_cache: Dict[int, Dict[str, Any]] = {}
+
+    def _page_value(self, key: str, id_region: Optional[int] = None, id_city: Optional[int] = None) -> Any:
+        """
+        Возвращает заранее загруженное значение страницы региона или None.
+        """
+        if id_region is None or id_city is not None:
+            return None
+        return self._page_cache.get(id_region, {}).get(key)
+
+    def _get_city_weather(self, id_city: int, key_ratio: List[str]) -> Dict[str, List[Any]]:
+        """
+        Погодные записи города: из заранее загруженных данных или запросом в БД.
+        """
+        rows = self._weather_rows.get(id_city)
+        if rows is not None and all(key in rows for key in key_ratio):
+            # копии списков: обработчики сортируют их на месте
+            return {key: list(rows[key]) for key in key_ratio}
+        return self.mv_repo.get_city_weather(id_city=id_city, key_ratio=key_ratio)
 
     def fetch_latest_metric_value(
         self,
@@ -348,22 +381,42 @@ class BaseDashboardData:
             Optional[float]: Последнее значение метрики, либо None.
         """
         try:
-            filters = {"id_metric": id_metric}
+            filters = {}
             if id_region is not None:
                 filters["id_region"] = id_region
                 filters["id_city"] = None
             if id_city is not None:
                 filters["id_city"] = id_city
-                filters["id_region"] = None
-            mvs = self.mv_repo.get_info_metricvalue(**filters)
-            if not mvs:
-                return None
-            raw = mvs[-1].value
-            return float(raw) if raw is not None else None
+            return self.mv_repo.get_latest_value(id_metric, **filters)
         except Exception as e:
             logger.warning(f"Ошибка при fetch_latest_metric_value(metric={id_metric}, region={id_region}, city={id_city}): {e}")
             return None
     
+    def get_latest_values(
+        self,
+        codes: List[int],
+        *,
+        id_region: Optional[int] = None,
+        id_city: Optional[int] = None
+    ) -> Dict[int, Optional[float]]:
+        """
+        Последние значения нескольких метрик для региона или города.
+
+        Метрики дашборда читаются одной строкой витрины entity_kpi по первичному
+        ключу; остальные (или все, если витрина недоступна) — запросом на метрику.
+
+        Returns:
+            Dict[int, Optional[float]]: {id_metric: значение}.
+        """
+        row = self.kpi_repo.get_kpi(id_region=id_region, id_city=id_city)
+        result = {}
+        for code in codes:
+            if row is not None and code in EntityKpiRepository.METRICS:
+                result[code] = row.get(code)
+            else:
+                result[code] = self.fetch_latest_metric_value(code, id_region=id_region, id_city=id_city)
+        return result
+
     def get_segment_kpi(
         self,
         segment_key: str,
@@ -379,9 +432,9 @@ class BaseDashboardData:
         if not segment:
             logger.warning(f"Неизвестный сегмент: {segment_key}")
             return result
+        values = self.get_latest_values(segment["codes"], id_region=id_region, id_city=id_city)
         for label, code in zip(self.SEGMENT_METRIC_LABELS, segment["codes"]):
-            val = self.fetch_latest_metric_value(code, id_region=id_region, id_city=id_city)
-            result[label] = val
+            result[label] = values[code]
         return result
 
     def get_all_segments_kpi(
@@ -414,9 +467,13 @@ class BaseDashboardData:
         Returns:
             pd.DataFrame: Таблица сегментов и оценок.
         """
+        cached = self._page_value('segment_scores', id_region=id_region, id_city=id_city)
+        if cached is None:
+            values = self.get_latest_values(list(self.SEGMENT_METRICS.values()), id_region=id_region, id_city=id_city)
+            cached = {name: values[metric_id] for name, metric_id in self.SEGMENT_METRICS.items()}
         records = []
-        for name, metric_id in self.SEGMENT_METRICS.items():
-            val = self.fetch_latest_metric_value(metric_id, id_region=id_region, id_city=id_city)
+        for name in self.SEGMENT_METRICS:
+            val = cached[name]
             records.append({
                 'segment': name,
                 'value': f"{val:.2f}" if val is not None else "—"
@@ -429,7 +486,7 @@ class BaseDashboardData:
         if id_city in self._weather_cache.get('temp',{}):
             return self._weather_cache['temp'][id_city]
         # Получаем данные о температуре воздуха в городе
-        data = self.mv_repo.get_city_weather(id_city=id_city, key_ratio=['day', 'night'])
+        data = self._get_city_weather(id_city=id_city, key_ratio=['day', 'night'])
         df = pd.DataFrame(data, columns=["month", 'day_t', 'night_t'])
         df['month'] = [i for i in range(1,13)]
         day = data.get('day')
@@ -468,7 +525,7 @@ class BaseDashboardData:
         if id_city in self._weather_cache.get('rainfall',{}):
             return self._weather_cache['rainfall'][id_city]
         # Получаем данные о температуре воздуха в городе
-        data = self.mv_repo.get_city_weather(id_city=id_city, key_ratio=['rainfall'])
+        data = self._get_city_weather(id_city=id_city, key_ratio=['rainfall'])
         df = pd.DataFrame(data, columns=["month", 'rainfall'])
         df['month'] = [i for i in range(1,13)]
         rainfall = data.get('rainfall')
@@ -493,7 +550,7 @@ class BaseDashboardData:
         if id_city in self._weather_cache.get('water',{}):
             return self._weather_cache['water'][id_city]
         # Получаем данные о температуре воды в городе
-        data = self.mv_repo.get_city_weather(id_city=id_city, key_ratio=['water'])
+        data = self._get_city_weather(id_city=id_city, key_ratio=['water'])
         df = pd.DataFrame(data, columns=["month", 'water'])
         df['month'] = [i for i in range(1,13)]
         water = data.get('water')
@@ -596,19 +653,25 @@ class BaseDashboardData:
         try:
             repository = MetricValueRepository()
             if id_region is not None:
-                data = repository.get_region_metric_value(id_region=id_region, id_metric=2)
-                columns = ["id_region", "value", "month", "year"]
+                key = "id_region"
+                entity_id = id_region
             elif id_city is not None:
-                data = repository.get_city_metric_value(id_city=id_city, id_metric=2)
-                columns = ["id_city", "value", "month", "year"]
+                key = "id_city"
+                entity_id = id_city
             else:
                 return pd.DataFrame()  # нет входных данных
 
-            if not data:
+            df = self._page_value('flow', id_region=id_region, id_city=id_city)
+            if df is None:
+                df = repository.fetch_frame(
+                    filters={"id_metric": 2, key: entity_id},
+                    columns=[key, "value_num", "month", "year"],
+                )
+            df = df.rename(columns={"value_num": "value"})
+            if df.empty:
                 return pd.DataFrame()
 
-            df = pd.DataFrame(data, columns=columns)
-            df['value'] = df['value'].astype(int)
+            df['value'] = df['value'].fillna(0).astype(int)
             df['period'] = df['year'].astype(str) + '-' + df['month'].astype(str).str.zfill(2)
             df_grouped = df.groupby(['year', 'month'], as_index=False).sum()
             logger.debug(f"Подготовлены данные для гистограммы (region={id_region}, city={id_city}).")
@@ -635,11 +698,11 @@ class BaseDashboardData:
         Returns:
             Dict[str, Optional[float]]: Словарь {имя_метрики: значение}.
         """
-        result = {}
-        for rus_name, code in self.METRIC_IDS.items():
-            val = self.fetch_latest_metric_value(code, id_region=id_region, id_city=id_city)
-            result[rus_name] = val
-        return result
+        cached = self._page_value('kpi', id_region=id_region, id_city=id_city)
+        if cached is not None:
+            return dict(cached)
+        values = self.get_latest_values(list(self.METRIC_IDS.values()), id_region=id_region, id_city=id_city)
+        return {rus_name: values[code] for rus_name, code in self.METRIC_IDS.items()}
     
     @classmethod
     def prepare_location_data(
@@ -713,10 +776,7 @@ class BaseDashboardData:
             lid = mv.id_location
             if lid not in metrics_by_location:
                 metrics_by_location[lid] = {}
-            try:
-                metrics_by_location[lid][mv.id_metric] = float(mv.value.replace(',','.'))
-            except:
-                metrics_by_location[lid][mv.id_metric] = 2
+            metrics_by_location[lid][mv.id_metric] = mv.value_num if mv.value_num is not None else 2
 
         logger.debug(f"[prepare_location_data] Получены метрики для {len(metrics_by_location)} локаций")
 
@@ -802,10 +862,75 @@ class RegionDashboardData(BaseDashboardData):
         super().__init__()
         self.region_repo = RegionRepository()
 
+    def get_region(self, id_region: int) -> Optional[Region]:
+        cache = self._page_cache.get(id_region)
+        if cache is not None:
+            return cache['region']
+        return self.region_repo.find_region_by_id(id_region)
+
     def get_capital_city_id(self, id_region: int) -> Optional[int]:
-        region = self.region_repo.find_region_by_id(id_region)
+        region = self.get_region(id_region)
         return region.capital if region and region.capital else None
 
+    def prefetch_page(self, id_region: int) -> bool:
+        """
+        Параллельно загружает данные страницы региона (KPI, оценки сегментов,
+        турпоток, ночевки, погода столицы, муниципалитеты) через асинхронные
+        репозитории. Дальнейшие вызовы методов страницы для этого региона
+        берут данные из памяти. При ошибке страница строится обычными запросами.
+
+        Returns:
+            bool: True, если данные загружены.
+        """
+        try:
+            self._page_cache[id_region] = run_async(self._gather_page(id_region))
+            return True
+        except Exception as e:
+            logger.warning(f"Параллельная загрузка страницы региона {id_region} не удалась: {e}")
+            return False
+
+    async def _gather_page(self, id_region: int) -> Dict[str, Any]:
+        """
+        Выполняет независимые запросы страницы региона одновременно, так что
+        время загрузки определяется самым долгим запросом, а не их суммой.
+        """
+        mv_repo = AsyncMetricValueRepository()
+        region_repo = AsyncRegionRepository()
+        cities_repo = AsyncCitiesRepository()
+        region_filters = {'id_region': id_region, 'id_city': None}
+        columns = ['id_region', 'value_num', 'month', 'year']
+
+        async def region_and_weather():
+            region = await region_repo.find_region_by_id(id_region)
+            capital = region.capital if region and region.capital else None
+            weather = await mv_repo.get_city_weather(
+                capital, ['day', 'night', 'rainfall', 'water']) if capital else None
+            return region, capital, weather
+
+        async def municipalities():
+            cities = await cities_repo.get_cities_in_region(id_region)
+            values = await mv_repo.get_latest_by_city(282, [city.id_city for city in cities])
+            return cities, values
+
+        kpi, segments, flow, nights, (region, capital, weather), (cities, muni_values) = await asyncio.gather(
+            mv_repo.get_latest_values(self.METRIC_IDS.values(), **region_filters),
+            mv_repo.get_latest_values(self.SEGMENT_METRICS.values(), **region_filters),
+            mv_repo.fetch_rows({'id_metric': 2, 'id_region': id_region}, columns),
+            mv_repo.fetch_rows({'id_metric': 3, 'id_region': id_region}, columns),
+            region_and_weather(),
+            municipalities(),
+        )
+        if capital and weather is not None:
+            self._weather_rows[capital] = weather
+        return {
+            'region': region,
+            'kpi': {name: kpi[code] for name, code in self.METRIC_IDS.items()},
+            'segment_scores': {name: segments[code] for name, code in self.SEGMENT_METRICS.items()},
+            'flow': pd.DataFrame(flow, columns=columns),
+            'nights': pd.DataFrame(nights, columns=columns),
+            'municipalities': self._municipalities_frame(cities, muni_values),
+        }
+
     def get_weather_data(self, *, id_region: int, id_city: Optional[int] = None) -> Dict[str, Optional[pd.DataFrame]]:
         """
         Возвращает погодные данные для региона (по столице региона).
@@ -828,12 +953,15 @@ class RegionDashboardData(BaseDashboardData):
             7: 'Июль', 8: 'Август', 9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
         }
 
-        dp = MetricValueRepository()
-        night_raw = dp.get_region_metric_value(id_region=id_region, id_metric=3)
-        tourist_raw = dp.get_region_metric_value(id_region=id_region, id_metric=2)
-
-        night_df = pd.DataFrame(night_raw, columns=['id_region', 'value', 'month', 'year'])
-        tourist_df = pd.DataFrame(tourist_raw, columns=['id_region', 'value', 'month', 'year'])
+        columns = ['id_region', 'value_num', 'month', 'year']
+        night_df = self._page_value('nights', id_region=id_region)
+        tourist_df = self._page_value('flow', id_region=id_region)
+        if night_df is None or tourist_df is None:
+            dp = MetricValueRepository()
+            night_df = dp.fetch_frame(filters={'id_metric': 3, 'id_region': id_region}, columns=columns)
+            tourist_df = dp.fetch_frame(filters={'id_metric': 2, 'id_region': id_region}, columns=columns)
+        night_df = night_df.rename(columns={'value_num': 'value'})
+        tourist_df = tourist_df.rename(columns={'value_num': 'value'})
 
         if night_df.empty or tourist_df.empty:
             return pd.DataFrame(columns=['year', 'month', 'Месяц', 'Количество ночевок'])
@@ -932,13 +1060,26 @@ class RegionDashboardData(BaseDashboardData):
         Возвращает DataFrame с городами региона и колонками:
         ['id_city','name','lon','lat','population','metric_282'].
         """
+        cached = self._page_value('municipalities', id_region=region_id)
+        if cached is not None:
+            return cached.copy()
         # 1) получаем все города региона
         cities_repo = CitiesRepository()
         cities = cities_repo.get_by_fields(model=City, id_region=region_id)
-        
-        # 2) подготовка списков
-        records = []
+        # 2) метрика 282 для каждого города (берем последнее значение)
         mv_repo = MetricValueRepository()
+        values = {
+            city.id_city: mv_repo.get_latest_value(282, id_city=city.id_city, id_location=None)
+            for city in cities
+        }
+        return self._municipalities_frame(cities, values)
+
+    @staticmethod
+    def _municipalities_frame(cities: List[City], values: Dict[int, Optional[float]]) -> pd.DataFrame:
+        """
+        Собирает таблицу муниципалитетов из городов и значений метрики 282.
+        """
+        records = []
         for city in cities:
             # имя
             name = city.city_name
@@ -959,22 +1100,13 @@ class RegionDashboardData(BaseDashboardData):
                 except Exception:
                     pop = 0
 
-            # метрика 282 для этого города (берем последнее значение)
-            metric_val = None
-            mvs = mv_repo.get_info_metricvalue(id_metric=282, id_city=city.id_city, id_location=None)
-            if mvs and mvs[-1].value is not None:
-                try:
-                    metric_val = float(mvs[-1].value)
-                except Exception:
-                    metric_val = None
-
             records.append({
                 'id_city': city.id_city,
                 'name': name,
                 'lon': lon,
                 'lat': lat,
                 'population': pop,
-                'metric_282': metric_val
+                'metric_282': values.get(city.id_city)
             })
 
         df = pd.DataFrame(records)
@@ -985,17 +1117,10 @@ class RegionDashboardData(BaseDashboardData):
         Возвращает DataFrame с оценками T_segment для каждого туристического сегмента.
         Колонки: ['segment', 'value'].
         """
-        mv_repo = MetricValueRepository()
+        values = self.get_latest_values(list(self.SEGMENT_METRICS.values()), id_region=region_id)
         records = []
         for name, metric_id in self.SEGMENT_METRICS.items():
-            mvs = mv_repo.get_info_metricvalue(id_region=region_id, id_metric=metric_id, id_city=None, id_location=None)
-            val = None
-            if mvs and mvs[-1].value is not None:
-                try:
-                    val = float(mvs[-1].value)
-                except:
-                    val = None
-            records.append({'segment': name, 'value': val})
+            records.append({'segment': name, 'value': values[metric_id]})
         df = pd.DataFrame(records)
         df['value'] = df['value'].map(lambda v: f"{v:.2f}" if pd.notnull(v) else "—")
         return df.sort_values('value', ascending=False).reset_index(drop=True)
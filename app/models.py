@@ -1,12 +1,14 @@
 # app/models.py
 
 import logging
-from typing import Optional, List
+import math
+import re
+from typing import Any, Optional, List
 
 from sqlalchemy import (
-    create_engine,
     Column,
     Integer,
+    BigInteger,
     String,
     Text,
     JSON,
@@ -16,15 +18,20 @@ from sqlalchemy import (
     text,
     DateTime,
     ARRAY,
+    Date,
+    Computed,
+    Index,
+    func,
+    literal_column,
+    event,
 )
 import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, Session
 from geoalchemy2 import Geometry  # For storing geometric data types
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, DOUBLE_PRECISION, TSVECTOR
 from sqlalchemy.orm import Mapped
 
-from app.config import Config_SQL
 from app.logging_config import logger
 
 
@@ -244,6 +251,11 @@ class Location(Base):
         doc='Идентификатор типа локации',
     )
     location_types  = Column(ARRAY(Text), nullable=True, doc = 'Список типов локации')
+    id_yandex: Optional[int] = Column(
+        BigInteger,
+        unique=True,
+        doc='Идентификатор организации в Яндекс.Картах (копия characters->id_yandex)',
+    )
 
     city: Optional['City'] = relationship(
         'City',
@@ -304,7 +316,19 @@ class Metric(Base):
         return f"Метрика: {self.metric_name} (ID: {self.id_metrics})"
 
 class MetricValue(Base):
-    """Таблица значений метрик."""
+    """
+    Таблица значений метрик.
+
+    Модель описывает несекционированную таблицу: create_all создает
+    metric_values с первичным ключом id_mv и индексом натурального ключа
+    uq_metric_values_natural_key. Рабочая схема получается после
+    migrations/006_metric_values_partitioning.sql (run_bootstrap.py применяет
+    её после create_all): таблица секционирована по id_metric
+    (METRIC_VALUE_PARTITIONS), первичный ключ — (id_mv, id_metric), натуральный
+    ключ есть только в секциях. id_mv по-прежнему уникален (metric_values_id_mv_seq),
+    поэтому ORM идентифицирует строки по нему в обоих вариантах, а bulk_upsert
+    сам выбирает цель ON CONFLICT (MetricValueRepository._is_partitioned).
+    """
 
     __tablename__ = 'metric_values'
 
@@ -334,6 +358,10 @@ class MetricValue(Base):
         String,
         doc='Значение метрики',
     )
+    value_num: Optional[float] = Column(
+        DOUBLE_PRECISION,
+        doc='Числовое значение метрики (заполняется из value при записи)',
+    )
     month: Optional[int] = Column(
         Integer,
         doc='Месяц',
@@ -381,6 +409,142 @@ class MetricValue(Base):
         return (f"Значение Метрики: {self.metric.metric_name if self.metric else 'N/A'} - "
                 f"Value: {self.value} (ID: {self.id_mv})")
 
+# Разбор строкового значения метрики; те же выражения использует заполнение
+# value_num в migrations/002_metric_values_value_num.sql и 010, чтобы ORM и SQL
+# считали числами одни и те же строки. Пробелы (в том числе неразрывные,
+# разделители разрядов '12 345') удаляются, затем строка должна целиком
+# совпасть с числом вида '12', '-3,5', '.7' (без экспоненты).
+METRIC_VALUE_SPACES = r'[ \t\n\r\f\v\u00a0\u2009\u202f]'
+METRIC_VALUE_NUMBER = r'^[-+]?([0-9]+([.,][0-9]*)?|[.,][0-9]+)$'
+_METRIC_VALUE_SPACES = re.compile(METRIC_VALUE_SPACES)
+_METRIC_VALUE_NUMBER = re.compile(METRIC_VALUE_NUMBER)
+
+
+def parse_metric_value(value: Any) -> Optional[float]:
+    """
+    Преобразует значение метрики в число.
+
+    Args:
+        value (Any): Значение (строка вида '12', '3,5', ' 4.2 ', '12 345' или число).
+
+    Returns:
+        Optional[float]: Число или None, если значение не числовое.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = _METRIC_VALUE_SPACES.sub('', str(value))
+        if not _METRIC_VALUE_NUMBER.match(text):
+            return None
+        number = float(text.replace(',', '.'))
+    if math.isnan(number) or math.isinf(number):
+        return None
+    return number
+
+
+@event.listens_for(MetricValue, 'before_insert')
+@event.listens_for(MetricValue, 'before_update')
+def _fill_metric_value_num(mapper, connection, target: MetricValue) -> None:
+    """Заполняет value_num при любой ORM-записи значения метрики."""
+    target.value_num = parse_metric_value(target.value)
+
+
+def parse_id_yandex(value: Any) -> Optional[int]:
+    """
+    Приводит id_yandex из characters к целому числу.
+
+    Args:
+        value (Any): Значение (число или строка из цифр).
+
+    Returns:
+        Optional[int]: Идентификатор или None, если значение не распознано.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    return int(value) if value.isdigit() else None
+
+
+def location_types_from_characters(characters: Optional[dict]) -> Optional[List[str]]:
+    """
+    Список типов локации из characters['types'] для колонки location_types.
+
+    Returns:
+        Optional[List[str]]: Типы или None, если в characters их нет.
+    """
+    types = (characters or {}).get('types')
+    return [str(item) for item in types] if isinstance(types, list) else None
+
+
+@event.listens_for(Location, 'before_insert')
+@event.listens_for(Location, 'before_update')
+def _fill_location_columns(mapper, connection, target: Location) -> None:
+    """Переносит id_yandex и types из characters в индексируемые колонки."""
+    if not target.characters:
+        return
+    if target.id_yandex is None:
+        target.id_yandex = parse_id_yandex(target.characters.get('id_yandex'))
+    if not target.location_types:
+        target.location_types = location_types_from_characters(target.characters)
+
+
+# Поиск локаций по типу идет через location_types && / @> ARRAY[...]
+Index('ix_locations_location_types', Location.location_types, postgresql_using='gin')
+
+
+# Натуральный ключ значения метрики. NULL в уникальном индексе Postgres считает
+# различными значениями, поэтому необязательные поля сворачиваются через COALESCE.
+# Тот же список выражений используется как цель ON CONFLICT в bulk_upsert.
+def metric_value_natural_key(table: Any) -> List[Any]:
+    """
+    Выражения натурального ключа для таблицы metric_values или её секции.
+
+    Args:
+        table (Table): Таблица с колонками metric_values.
+
+    Returns:
+        List[Any]: Колонки и выражения COALESCE в порядке ключа.
+    """
+    return [
+        table.c.id_metric,
+        func.coalesce(table.c.id_region, literal_column('0')),
+        func.coalesce(table.c.id_city, literal_column('0')),
+        func.coalesce(table.c.id_location, literal_column('0')),
+        func.coalesce(table.c.type_location, literal_column("''")),
+        func.coalesce(table.c.month, literal_column('0')),
+        func.coalesce(table.c.year, literal_column('0')),
+    ]
+
+
+METRIC_VALUE_NATURAL_KEY = metric_value_natural_key(MetricValue.__table__)
+# Индекс несекционированной таблицы (create_all, migrations/001). После
+# migrations/006 его нет: уникальный индекс секционированной таблицы не может
+# содержать выражений, и его заменяют такие же индексы секций.
+Index('uq_metric_values_natural_key', *METRIC_VALUE_NATURAL_KEY, unique=True)
+
+# Секции metric_values по семействам метрик (LIST по id_metric,
+# migrations/006_metric_values_partitioning.sql). Все остальные метрики —
+# оценки регионов и городов — попадают в секцию по умолчанию.
+METRIC_VALUE_PARTITIONS = {
+    'metric_values_timeseries': (2, 3),               # турпоток и ночевки по месяцам
+    'metric_values_climate': (213, 214, 215, 216),    # погода по месяцам
+    'metric_values_location_scores': (236, 239),      # оценки локаций и типов локаций
+}
+METRIC_VALUE_DEFAULT_PARTITION = 'metric_values_entity_scores'
+
+
+def metric_value_partition(id_metric: int) -> str:
+    """Имя секции metric_values, в которую попадает метрика."""
+    for partition, metrics in METRIC_VALUE_PARTITIONS.items():
+        if id_metric in metrics:
+            return partition
+    return METRIC_VALUE_DEFAULT_PARTITION
+
+
 class Sync(Base):
     """Таблица соответствия для синхронизации данных из разных источников."""
 
@@ -484,6 +648,15 @@ class Review(Base):
         String,
         doc='Дата отзыва',
     )
+    review_date: Optional[datetime.date] = Column(
+        Date,
+        doc='Дата отзыва (заполняется из data при записи)',
+    )
+    text_search = Column(
+        TSVECTOR,
+        Computed("to_tsvector('russian', coalesce(text, ''))", persisted=True),
+        doc='Полнотекстовый вектор отзыва (генерируется БД из text)',
+    )
 
     location: 'Location' = relationship(
         'Location',
@@ -499,18 +672,56 @@ class Review(Base):
                 f"Лайков: {self.like}, Дата: {self.data}")
 
 
+_REVIEW_DATE = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})')
+
+
+def parse_review_date(value: Any) -> Optional[datetime.date]:
+    """
+    Преобразует строковую дату отзыва ('2024-05-03', '2024-5-3',
+    '2024-05-03T10:00:00') в дату.
+
+    Returns:
+        Optional[datetime.date]: Дата или None, если строка не распознана.
+    """
+    if isinstance(value, datetime.date):
+        return value
+    match = _REVIEW_DATE.match(str(value)) if value is not None else None
+    if not match:
+        return None
+    try:
+        return datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+@event.listens_for(Review, 'before_insert')
+@event.listens_for(Review, 'before_update')
+def _fill_review_date(mapper, connection, target: Review) -> None:
+    """Заполняет review_date из строкового data."""
+    if target.review_date is None:
+        target.review_date = parse_review_date(target.data)
+
+
+# Отбор отзывов по локации и дате (ReviewRepository.get_reviews_top)
+Index('ix_reviews_location_date', Review.id_location, Review.review_date.desc())
+# Поиск и подсчет отзывов по ключевым словам (ReviewRepository.find_reviews / get_keyword_stats)
+Index('ix_reviews_text_search', Review.text_search, postgresql_using='gin')
+
+
 def initialize_database() -> None:
-    """Подключение к базе данных и создание таблиц."""
+    """
+    Подключение к базе данных и создание таблиц.
+
+    Импорт моделей не обращается к БД: схема создается явно командой
+    run_bootstrap.py (или вызовом этой функции).
+    """
+    # Отложенный импорт: пакет репозиториев сам импортирует модели
+    from app.data.database.base_repository import get_engine
     try:
-        database_url = Config_SQL.SQLALCHEMY_DATABASE_URI
-        logger.debug(f"Строка подключения: {database_url}")
-        engine = create_engine(database_url)
+        engine = get_engine()
         Base.metadata.create_all(engine)
         logger.info("Таблицы успешно созданы или уже существуют.")
     except Exception as e:
         logger.error(f"Ошибка при создании таблиц: {e}")
         raise
 
-
-# Инициализация базы данных при запуске модуля
-initialize_database()
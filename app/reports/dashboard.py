@@ -125,11 +125,12 @@ def create_region_layout(region_id: int):
     Компоновка дашборда региона.
     Собирает KPI, графики абсолютных значений и кнопку экспорта.
     """
-    region_repo = RegionRepository()
     region_data = RegionDashboardData()
+    # Независимые запросы страницы выполняются параллельно одним проходом
+    region_data.prefetch_page(region_id)
     rpp = RegionPagePlot(region_data)
     # Пытаемся получить экземпляр региона
-    region = region_repo.find_region_by_id(region_id)
+    region = region_data.get_region(region_id)
     region_name = region.region_name if region else f"#{region_id}"
     # KPI
     cards = rpp.make_kpi_cards(id_region = region_id)
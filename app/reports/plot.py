@@ -376,9 +376,8 @@ class RegionPagePlot(BaseDashboardPlot):
         """
         То же для ночёвок, используя prepare_data.get_region_mean_night().
         """
-        rpd = RegionDashboardData()
         # Получаем список доступных годов
-        raw = rpd.get_region_mean_night(id_region = region_id)
+        raw = self.data_prep.get_region_mean_night(id_region = region_id)
         if raw.empty or 'year' not in raw.columns:
         # Вернуть красивый layout-заглушку
             return html.Div([html.P("Нет данных по ночевкам для выбранного региона/города.")])
@@ -440,7 +439,7 @@ class RegionPagePlot(BaseDashboardPlot):
 
     
     def make_municipalities_map(self, region_id) -> dcc.Graph:
-        data_prep = RegionDashboardData()
+        data_prep = self.data_prep
         # Загрузка границы региона как GeoJSON-объекта
         boundary_feat = data_prep.load_region_boundary(region_id)
         # Табличка муниципалитетов
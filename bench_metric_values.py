@@ -0,0 +1,149 @@
+# bench_metric_values.py
+"""
+Замер запросов турпотока и ночевок к metric_values до и после
+секционирования (migrations/006_metric_values_partitioning.sql).
+
+Для каждого запроса (get_tourist_count_data, get_region_metric_value,
+get_tur_night) снимается медиана времени вызова метода репозитория и план
+EXPLAIN (ANALYZE, BUFFERS) эквивалентного SQL. Отчеты до и после миграции
+сравниваются вручную или через --compare.
+
+Запуск:
+    python bench_metric_values.py --output bench_before.md   # до миграции
+    python run_bootstrap.py                                   # применяет 006
+    python bench_metric_values.py --output bench_after.md --compare bench_before.md
+"""
+
+import argparse
+import re
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+
+from app.data.database import MetricValueRepository
+from app.data.database.base_repository import get_engine
+from app.models import MetricValue
+
+TOURIST_FLOW = 2
+NIGHTS = 3
+
+
+def statements(id_region: int) -> Dict[str, Tuple[object, Callable[[MetricValueRepository], object]]]:
+    """
+    Запросы замера: имя -> (SQL-выражение для EXPLAIN, вызов метода репозитория).
+    """
+    series = (MetricValue.id_region, MetricValue.value_num, MetricValue.month, MetricValue.year)
+    return {
+        'get_tourist_count_data': (
+            select(*series).where(MetricValue.id_metric == TOURIST_FLOW),
+            lambda mv: mv.get_tourist_count_data(),
+        ),
+        'get_region_metric_value (2)': (
+            select(*series).where(MetricValue.id_metric == TOURIST_FLOW, MetricValue.id_region == id_region),
+            lambda mv: mv.get_region_metric_value(id_region=id_region, id_metric=TOURIST_FLOW),
+        ),
+        'get_region_metric_value (3)': (
+            select(*series).where(MetricValue.id_metric == NIGHTS, MetricValue.id_region == id_region),
+            lambda mv: mv.get_region_metric_value(id_region=id_region, id_metric=NIGHTS),
+        ),
+        'get_tur_night (sum по регионам)': (
+            select(MetricValue.id_region, func.sum(MetricValue.value_num))
+            .where(MetricValue.id_metric.in_((TOURIST_FLOW, NIGHTS)))
+            .group_by(MetricValue.id_region),
+            lambda mv: [mv.aggregate_values(id_metric=id_metric, agg='sum', group_by='id_region')
+                        for id_metric in (TOURIST_FLOW, NIGHTS)],
+        ),
+    }
+
+
+def explain(connection, stmt) -> Tuple[float, List[str]]:
+    """
+    Выполняет EXPLAIN (ANALYZE, BUFFERS) и возвращает время выполнения в мс и план.
+    """
+    compiled = stmt.compile(bind=connection, compile_kwargs={'literal_binds': True})
+    plan = [row[0] for row in connection.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {compiled}'))]
+    execution = next(
+        (float(m.group(1)) for line in plan if (m := re.search(r'Execution Time: ([\d.]+) ms', line))),
+        float('nan'),
+    )
+    return execution, plan
+
+
+def run(id_region: int, repeat: int) -> Dict[str, Dict[str, object]]:
+    """Медианы времени методов и EXPLAIN по каждому запросу."""
+    mv = MetricValueRepository()
+    results = {}
+    with get_engine().connect() as connection:
+        for name, (stmt, call) in statements(id_region).items():
+            call(mv)  # прогрев кэша страниц и соединения
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                call(mv)
+                timings.append((time.perf_counter() - start) * 1000)
+            executions, plan = [], []
+            for _ in range(repeat):
+                execution, plan = explain(connection, stmt)
+                executions.append(execution)
+            results[name] = {
+                'call_ms': statistics.median(timings),
+                'execution_ms': statistics.median(executions),
+                'plan': plan,
+            }
+    return results
+
+
+def read_previous(path: str) -> Dict[str, float]:
+    """Время выполнения (мс) по запросам из предыдущего отчета."""
+    previous = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            m = re.match(r'\| (.+?) \| ([\d.]+) \| ([\d.]+) \|', line)
+            if m:
+                previous[m.group(1)] = float(m.group(3))
+    return previous
+
+
+def build_report(results: Dict[str, Dict[str, object]], repeat: int,
+                 previous: Optional[Dict[str, float]] = None) -> str:
+    """Markdown-отчет: таблица времен и планы запросов."""
+    lines = [f'# metric_values: турпоток и ночевки (медиана из {repeat} запусков)', '']
+    header = '| Запрос | Метод, мс | EXPLAIN ANALYZE, мс |'
+    if previous:
+        lines += [header + ' До, мс | Разница |', '|---|---|---|---|---|']
+    else:
+        lines += [header, '|---|---|---|']
+    for name, result in results.items():
+        row = f"| {name} | {result['call_ms']:.2f} | {result['execution_ms']:.2f} |"
+        if previous:
+            before = previous.get(name)
+            delta = f"{result['execution_ms'] - before:+.2f}" if before is not None else '—'
+            row += f" {before if before is not None else '—'} | {delta} |"
+        lines.append(row)
+    for name, result in results.items():
+        lines += ['', f'## {name}', '', '```'] + list(result['plan']) + ['```']
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Замер запросов турпотока и ночевок к metric_values.')
+    parser.add_argument('--region', type=int, default=1, help='id_region для запросов по региону')
+    parser.add_argument('--repeat', type=int, default=5, help='количество запусков каждого запроса')
+    parser.add_argument('--compare', help='предыдущий отчет для сравнения (например, до миграции)')
+    parser.add_argument('--output', help='файл для markdown-отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    results = run(args.region, args.repeat)
+    previous = read_previous(args.compare) if args.compare else None
+    report = build_report(results, args.repeat, previous)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
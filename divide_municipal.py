@@ -16,9 +16,10 @@ cities_repo = CitiesRepository()
 # или 'OSM' для mаппинга. Сначала получим маппинг OSM id -> region id из БД:
 # Например, для всех городов:
 city_to_region = {}
-cities = cities_repo.get_all(City)  # возвращает список City
-logger.info(f'Получили список городов. Общее количество = {len(cities)}')
-for city in cities:
+count_cities = 0
+# Потоковое чтение городов: только нужные поля, без загрузки всей таблицы
+for city in cities_repo.iter_rows(City, columns=['city_name', 'id_region', 'characters']):
+    count_cities += 1
     # characters JSONB, в нём есть 'OSM'
     if city.characters:
         osm_id = city.characters.get('OSM')
@@ -29,6 +30,7 @@ for city in cities:
         city_to_region[int(osm_id)] = city.id_region
     else:
         logger.warning(f'Для города {city.city_name} не найден OSM_ID')
+logger.info(f'Получили список городов. Общее количество = {count_cities}')
 
 # Добавляем колонку region_id в GeoDataFrame
 def lookup_region(feature):
@@ -0,0 +1,134 @@
+# measure_cold_start.py
+"""
+Замер холодного старта: время импорта точек входа (wsgi.py и модулей,
+которые импортируют CLI-скрипты) в отдельном процессе Python.
+
+Сравнение до/после строится по двум ревизиям git: базовая ревизия
+разворачивается во временный worktree (с копией app/config.py).
+
+Запуск:
+    python measure_cold_start.py --repeat 5
+    python measure_cold_start.py --baseline HEAD~1 --output cold_start.md
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Точка входа -> код, выполняемый в новом процессе. Скрипты, которые
+# работают на уровне модуля, замеряются импортом их зависимостей.
+TARGETS: Dict[str, str] = {
+    'wsgi.py': 'import wsgi',
+    'run_import.py': 'import run_import',
+    'run_processing.py': 'import app.data.processing',
+    'run_base_assessment.py': 'import app.data.score.base_assessment',
+    'test_calc.py': 'import app.data.calc.base_calc',
+}
+
+
+def measure(cwd: str, code: str, repeat: int) -> Optional[List[float]]:
+    """
+    Запускает код в новом процессе repeat раз и возвращает длительности в секундах.
+    None — если процесс завершился с ошибкой.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            last_line = (result.stderr.strip().splitlines() or [''])[-1]
+            print(f'  [{cwd}] {code!r}: ошибка {last_line}', file=sys.stderr)
+            return None
+        timings.append(elapsed)
+    return timings
+
+
+def measure_tree(cwd: str, repeat: int) -> Dict[str, Optional[float]]:
+    """Медиана времени старта каждой точки входа в дереве cwd."""
+    result = {}
+    for name, code in TARGETS.items():
+        timings = measure(cwd, code, repeat)
+        result[name] = statistics.median(timings) if timings else None
+        print(f'{cwd}: {name} -> {result[name]}', file=sys.stderr)
+    return result
+
+
+def checkout_baseline(ref: str) -> str:
+    """Разворачивает ревизию ref во временный worktree и возвращает его путь."""
+    path = tempfile.mkdtemp(prefix='cold_start_')
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, ref], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    config = os.path.join(ROOT, 'app', 'config.py')
+    if os.path.exists(config):
+        shutil.copy(config, os.path.join(path, 'app', 'config.py'))
+    return path
+
+
+def remove_baseline(path: str) -> None:
+    subprocess.run(['git', 'worktree', 'remove', '--force', path], cwd=ROOT,
+                   stdout=subprocess.DEVNULL)
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return f'{value:.2f} с' if value is not None else 'ошибка'
+
+
+def build_report(current: Dict[str, Optional[float]],
+                 baseline: Optional[Dict[str, Optional[float]]],
+                 baseline_ref: Optional[str], repeat: int) -> str:
+    """Markdown-таблица с результатами замера."""
+    lines = [f'# Холодный старт (медиана из {repeat} запусков)', '']
+    if baseline is None:
+        lines += ['| Точка входа | Время |', '|---|---|']
+        for name, value in current.items():
+            lines.append(f'| {name} | {format_seconds(value)} |')
+    else:
+        lines += [f'| Точка входа | До ({baseline_ref}) | После | Разница |', '|---|---|---|---|']
+        for name, value in current.items():
+            before = baseline.get(name)
+            delta = (f'{value - before:+.2f} с' if value is not None and before is not None else '—')
+            lines.append(f'| {name} | {format_seconds(before)} | {format_seconds(value)} | {delta} |')
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Замер холодного старта точек входа.')
+    parser.add_argument('--repeat', type=int, default=5, help='количество запусков каждой точки входа')
+    parser.add_argument('--baseline', help='ревизия git для сравнения (например, HEAD~1)')
+    parser.add_argument('--output', help='файл для markdown-отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        path = checkout_baseline(args.baseline)
+        try:
+            baseline = measure_tree(path, args.repeat)
+        finally:
+            remove_baseline(path)
+    current = measure_tree(ROOT, args.repeat)
+
+    report = build_report(current, baseline, args.baseline, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
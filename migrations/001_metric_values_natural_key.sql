@@ -0,0 +1,39 @@
+-- migrations/001_metric_values_natural_key.sql
+-- Уникальный натуральный ключ metric_values для MetricValueRepository.bulk_upsert
+-- (id_metric, id_region, id_city, id_location, type_location, month, year).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/001_metric_values_natural_key.sql
+-- CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+
+-- 1. Удаляем дубликаты, оставляя самую свежую запись по каждому ключу
+DELETE FROM metric_values
+WHERE id_mv IN (
+    SELECT id_mv
+    FROM (
+        SELECT id_mv,
+               ROW_NUMBER() OVER (
+                   PARTITION BY id_metric,
+                                COALESCE(id_region, 0),
+                                COALESCE(id_city, 0),
+                                COALESCE(id_location, 0),
+                                COALESCE(type_location, ''),
+                                COALESCE(month, 0),
+                                COALESCE(year, 0)
+                   ORDER BY modify_time DESC NULLS LAST, id_mv DESC
+               ) AS rn
+        FROM metric_values
+    ) ranked
+    WHERE ranked.rn > 1
+);
+
+-- 2. Уникальный индекс по выражениям (совпадает с METRIC_VALUE_NATURAL_KEY в app/models.py)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_metric_values_natural_key
+    ON metric_values (
+        id_metric,
+        COALESCE(id_region, 0),
+        COALESCE(id_city, 0),
+        COALESCE(id_location, 0),
+        COALESCE(type_location, ''),
+        COALESCE(month, 0),
+        COALESCE(year, 0)
+    );
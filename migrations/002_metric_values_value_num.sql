@@ -0,0 +1,15 @@
+-- migrations/002_metric_values_value_num.sql
+-- Числовая колонка value_num для metric_values и её заполнение из строкового value.
+-- Новые записи заполняют value_num сами (ORM-событие и bulk_upsert в приложении).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/002_metric_values_value_num.sql
+
+ALTER TABLE metric_values ADD COLUMN IF NOT EXISTS value_num double precision;
+
+-- Заполнение существующих строк: только значения, похожие на число ('12', '3,5', '-0.7',
+-- '12 345'). Пробелы внутри удаляются; выражения совпадают с METRIC_VALUE_SPACES и
+-- METRIC_VALUE_NUMBER в app/models.py (parse_metric_value)
+UPDATE metric_values
+SET value_num = replace(regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g'), ',', '.')::double precision
+WHERE value_num IS NULL
+  AND regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g') ~ '^[-+]?([0-9]+([.,][0-9]*)?|[.,][0-9]+)$';
@@ -0,0 +1,31 @@
+-- migrations/003_locations_id_yandex.sql
+-- Отдельная колонка locations.id_yandex с уникальным индексом вместо фильтра
+-- по characters->>'id_yandex' (LocationsRepository.check_loc_yandex / existing_yandex_ids).
+-- Новые записи заполняют id_yandex сами (ORM-событие в app/models.py).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/003_locations_id_yandex.sql
+-- CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+
+ALTER TABLE locations ADD COLUMN IF NOT EXISTS id_yandex bigint;
+
+-- Заполнение из characters. При дубликатах id_yandex колонку получает
+-- самая ранняя локация, остальные остаются с NULL (видны запросом ниже).
+UPDATE locations l
+SET id_yandex = src.id_yandex
+FROM (
+    SELECT DISTINCT ON ((characters->>'id_yandex')::bigint)
+           id_location,
+           (characters->>'id_yandex')::bigint AS id_yandex
+    FROM locations
+    WHERE characters->>'id_yandex' ~ '^\d+$'
+    ORDER BY (characters->>'id_yandex')::bigint, id_location
+) src
+WHERE l.id_location = src.id_location
+  AND l.id_yandex IS NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS locations_id_yandex_key
+    ON locations (id_yandex);
+
+-- Дубликаты, оставшиеся без id_yandex:
+-- SELECT id_location, characters->>'id_yandex' FROM locations
+-- WHERE id_yandex IS NULL AND characters->>'id_yandex' ~ '^\d+$';
@@ -0,0 +1,16 @@
+-- migrations/004_locations_location_types_gin.sql
+-- GIN-индекс по locations.location_types для запросов по типу локации
+-- (LocationsRepository.get_locations_by_type / get_locations_by_types / get_type_stats).
+-- Новые записи заполняют location_types сами (ORM-событие в app/models.py).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/004_locations_location_types_gin.sql
+-- CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+
+-- Заполнение из characters->'types' там, где массив типов еще пуст
+UPDATE locations
+SET location_types = ARRAY(SELECT jsonb_array_elements_text(characters->'types'))
+WHERE (location_types IS NULL OR cardinality(location_types) = 0)
+  AND jsonb_typeof(characters->'types') = 'array';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_locations_location_types
+    ON locations USING gin (location_types);
@@ -0,0 +1,102 @@
+-- migrations/005_entity_kpi.sql
+-- Широкая витрина KPI дашбордов: одна строка на регион или город, одна колонка
+-- m_<id_metric> на метрику дашборда (последнее по modify_time значение value_num).
+-- Список метрик совпадает с EntityKpiRepository.METRICS в
+-- app/data/database/models_repository.py (METRIC_IDS, SEGMENT_METRICS и
+-- SEGMENTS[...]['codes'] из BaseDashboardData).
+-- Обновляется в конце прогона оценки: TourismEvaluation.refresh_dashboard_kpi().
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/005_entity_kpi.sql
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS entity_kpi AS
+WITH latest AS (
+    SELECT DISTINCT ON (entity_type, entity_id, id_metric)
+           entity_type, entity_id, id_metric, value_num
+    FROM (
+        SELECT 'region'::text AS entity_type, id_region AS entity_id,
+               id_metric, value_num, modify_time, id_mv
+        FROM metric_values
+        WHERE id_region IS NOT NULL
+          AND id_city IS NULL
+          AND id_location IS NULL
+          AND id_metric IN (
+              217, 218, 222, 240, 241, 242, 243, 244, 245, 246,
+              247, 248, 249, 250, 251, 252, 253, 254, 255, 256,
+              257, 258, 259, 260, 261, 262, 263, 264, 265, 266,
+              267, 268, 269, 270, 271, 272, 273, 274, 275, 276,
+              277, 278, 279, 280, 281, 282, 283, 284, 285, 286
+          )
+        UNION ALL
+        SELECT 'city'::text, id_city,
+               id_metric, value_num, modify_time, id_mv
+        FROM metric_values
+        WHERE id_city IS NOT NULL
+          AND id_location IS NULL
+          AND id_metric IN (
+              217, 218, 222, 240, 241, 242, 243, 244, 245, 246,
+              247, 248, 249, 250, 251, 252, 253, 254, 255, 256,
+              257, 258, 259, 260, 261, 262, 263, 264, 265, 266,
+              267, 268, 269, 270, 271, 272, 273, 274, 275, 276,
+              277, 278, 279, 280, 281, 282, 283, 284, 285, 286
+          )
+    ) values_by_entity
+    ORDER BY entity_type, entity_id, id_metric, modify_time DESC NULLS LAST, id_mv DESC
+)
+SELECT entity_type,
+       entity_id,
+       max(value_num) FILTER (WHERE id_metric = 217) AS m_217,
+       max(value_num) FILTER (WHERE id_metric = 218) AS m_218,
+       max(value_num) FILTER (WHERE id_metric = 222) AS m_222,
+       max(value_num) FILTER (WHERE id_metric = 240) AS m_240,
+       max(value_num) FILTER (WHERE id_metric = 241) AS m_241,
+       max(value_num) FILTER (WHERE id_metric = 242) AS m_242,
+       max(value_num) FILTER (WHERE id_metric = 243) AS m_243,
+       max(value_num) FILTER (WHERE id_metric = 244) AS m_244,
+       max(value_num) FILTER (WHERE id_metric = 245) AS m_245,
+       max(value_num) FILTER (WHERE id_metric = 246) AS m_246,
+       max(value_num) FILTER (WHERE id_metric = 247) AS m_247,
+       max(value_num) FILTER (WHERE id_metric = 248) AS m_248,
+       max(value_num) FILTER (WHERE id_metric = 249) AS m_249,
+       max(value_num) FILTER (WHERE id_metric = 250) AS m_250,
+       max(value_num) FILTER (WHERE id_metric = 251) AS m_251,
+       max(value_num) FILTER (WHERE id_metric = 252) AS m_252,
+       max(value_num) FILTER (WHERE id_metric = 253) AS m_253,
+       max(value_num) FILTER (WHERE id_metric = 254) AS m_254,
+       max(value_num) FILTER (WHERE id_metric = 255) AS m_255,
+       max(value_num) FILTER (WHERE id_metric = 256) AS m_256,
+       max(value_num) FILTER (WHERE id_metric = 257) AS m_257,
+       max(value_num) FILTER (WHERE id_metric = 258) AS m_258,
+       max(value_num) FILTER (WHERE id_metric = 259) AS m_259,
+       max(value_num) FILTER (WHERE id_metric = 260) AS m_260,
+       max(value_num) FILTER (WHERE id_metric = 261) AS m_261,
+       max(value_num) FILTER (WHERE id_metric = 262) AS m_262,
+       max(value_num) FILTER (WHERE id_metric = 263) AS m_263,
+       max(value_num) FILTER (WHERE id_metric = 264) AS m_264,
+       max(value_num) FILTER (WHERE id_metric = 265) AS m_265,
+       max(value_num) FILTER (WHERE id_metric = 266) AS m_266,
+       max(value_num) FILTER (WHERE id_metric = 267) AS m_267,
+       max(value_num) FILTER (WHERE id_metric = 268) AS m_268,
+       max(value_num) FILTER (WHERE id_metric = 269) AS m_269,
+       max(value_num) FILTER (WHERE id_metric = 270) AS m_270,
+       max(value_num) FILTER (WHERE id_metric = 271) AS m_271,
+       max(value_num) FILTER (WHERE id_metric = 272) AS m_272,
+       max(value_num) FILTER (WHERE id_metric = 273) AS m_273,
+       max(value_num) FILTER (WHERE id_metric = 274) AS m_274,
+       max(value_num) FILTER (WHERE id_metric = 275) AS m_275,
+       max(value_num) FILTER (WHERE id_metric = 276) AS m_276,
+       max(value_num) FILTER (WHERE id_metric = 277) AS m_277,
+       max(value_num) FILTER (WHERE id_metric = 278) AS m_278,
+       max(value_num) FILTER (WHERE id_metric = 279) AS m_279,
+       max(value_num) FILTER (WHERE id_metric = 280) AS m_280,
+       max(value_num) FILTER (WHERE id_metric = 281) AS m_281,
+       max(value_num) FILTER (WHERE id_metric = 282) AS m_282,
+       max(value_num) FILTER (WHERE id_metric = 283) AS m_283,
+       max(value_num) FILTER (WHERE id_metric = 284) AS m_284,
+       max(value_num) FILTER (WHERE id_metric = 285) AS m_285,
+       max(value_num) FILTER (WHERE id_metric = 286) AS m_286
+FROM latest
+GROUP BY entity_type, entity_id;
+
+-- Первичный ключ витрины; нужен и для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS entity_kpi_pkey
+    ON entity_kpi (entity_type, entity_id);
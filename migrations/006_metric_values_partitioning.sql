@@ -0,0 +1,93 @@
+-- migrations/006_metric_values_partitioning.sql
+-- Секционирование metric_values по семействам метрик (PARTITION BY LIST (id_metric)):
+--   metric_values_timeseries       — турпоток (2) и ночевки (3) по месяцам;
+--   metric_values_climate          — погода по месяцам (213-216);
+--   metric_values_location_scores  — оценки локаций и типов локаций (236, 239);
+--   metric_values_entity_scores    — по умолчанию: оценки регионов и городов.
+-- Список секций совпадает с METRIC_VALUE_PARTITIONS в app/models.py.
+--
+-- Уникальный индекс секционированной таблицы не может содержать выражений,
+-- поэтому натуральный ключ с COALESCE создается в каждой секции, а
+-- MetricValueRepository.bulk_upsert пишет напрямую в нужную секцию.
+-- Первичный ключ родительской таблицы должен включать ключ секционирования:
+-- (id_mv, id_metric). Идентификаторы id_mv по-прежнему выдает metric_values_id_mv_seq.
+--
+-- Таблица пересоздается и данные копируются целиком под эксклюзивной
+-- блокировкой: запускать в окно обслуживания. Витрина entity_kpi зависит
+-- от старой таблицы и пересоздается запуском 005_entity_kpi.sql (\ir; команду
+-- понимают и psql, и apply_migrations), так что определение витрины одно.
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/006_metric_values_partitioning.sql
+-- Эффект на запросы турпотока и ночевок: python bench_metric_values.py (до и после).
+
+BEGIN;
+
+DROP MATERIALIZED VIEW IF EXISTS entity_kpi;
+
+-- 1. Старая таблица уходит в сторону; имя индекса первичного ключа освобождаем
+ALTER TABLE metric_values RENAME TO metric_values_old;
+ALTER INDEX metric_values_pkey RENAME TO metric_values_old_pkey;
+
+-- 2. Секционированная таблица с теми же колонками, NOT NULL и значениями по умолчанию
+CREATE TABLE metric_values (LIKE metric_values_old INCLUDING DEFAULTS)
+    PARTITION BY LIST (id_metric);
+ALTER TABLE metric_values ADD CONSTRAINT metric_values_pkey PRIMARY KEY (id_mv, id_metric);
+
+CREATE TABLE metric_values_timeseries PARTITION OF metric_values FOR VALUES IN (2, 3);
+CREATE TABLE metric_values_climate PARTITION OF metric_values FOR VALUES IN (213, 214, 215, 216);
+CREATE TABLE metric_values_location_scores PARTITION OF metric_values FOR VALUES IN (236, 239);
+CREATE TABLE metric_values_entity_scores PARTITION OF metric_values DEFAULT;
+
+-- 3. Перенос данных; последовательность переходит к новой таблице до удаления старой
+INSERT INTO metric_values SELECT * FROM metric_values_old;
+ALTER SEQUENCE metric_values_id_mv_seq OWNED BY metric_values.id_mv;
+DROP TABLE metric_values_old;
+
+-- 4. Внешние ключи (как в модели MetricValue)
+ALTER TABLE metric_values ADD CONSTRAINT metric_values_id_metric_fkey
+    FOREIGN KEY (id_metric) REFERENCES metrics (id_metrics) ON DELETE RESTRICT;
+ALTER TABLE metric_values ADD CONSTRAINT metric_values_id_region_fkey
+    FOREIGN KEY (id_region) REFERENCES regions (id_region) ON DELETE CASCADE;
+ALTER TABLE metric_values ADD CONSTRAINT metric_values_id_city_fkey
+    FOREIGN KEY (id_city) REFERENCES cities (id_city) ON DELETE CASCADE;
+ALTER TABLE metric_values ADD CONSTRAINT metric_values_id_location_fkey
+    FOREIGN KEY (id_location) REFERENCES locations (id_location) ON DELETE CASCADE;
+
+-- 5. Натуральный ключ в каждой секции (цель ON CONFLICT для bulk_upsert)
+CREATE UNIQUE INDEX uq_metric_values_timeseries_natural_key ON metric_values_timeseries (
+    id_metric, COALESCE(id_region, 0), COALESCE(id_city, 0), COALESCE(id_location, 0),
+    COALESCE(type_location, ''), COALESCE(month, 0), COALESCE(year, 0)
+);
+CREATE UNIQUE INDEX uq_metric_values_climate_natural_key ON metric_values_climate (
+    id_metric, COALESCE(id_region, 0), COALESCE(id_city, 0), COALESCE(id_location, 0),
+    COALESCE(type_location, ''), COALESCE(month, 0), COALESCE(year, 0)
+);
+CREATE UNIQUE INDEX uq_metric_values_location_scores_natural_key ON metric_values_location_scores (
+    id_metric, COALESCE(id_region, 0), COALESCE(id_city, 0), COALESCE(id_location, 0),
+    COALESCE(type_location, ''), COALESCE(month, 0), COALESCE(year, 0)
+);
+CREATE UNIQUE INDEX uq_metric_values_entity_scores_natural_key ON metric_values_entity_scores (
+    id_metric, COALESCE(id_region, 0), COALESCE(id_city, 0), COALESCE(id_location, 0),
+    COALESCE(type_location, ''), COALESCE(month, 0), COALESCE(year, 0)
+);
+
+-- 6. Индексы под запросы семейств
+-- Ряды турпотока и ночевок: get_tourist_count_data, get_region_metric_value, get_tur_night
+CREATE INDEX ix_metric_values_timeseries_region_period
+    ON metric_values_timeseries (id_metric, id_region, year, month) INCLUDE (value_num);
+-- Погода города по месяцам: get_city_weather
+CREATE INDEX ix_metric_values_climate_city_month
+    ON metric_values_climate (id_metric, id_city, month) INCLUDE (value_num);
+-- Оценки локаций: get_locations_from_metric_list
+CREATE INDEX ix_metric_values_location_scores_location
+    ON metric_values_location_scores (id_metric, id_location);
+-- Оценки регионов и городов: get_info_metricvalue, entity_kpi
+CREATE INDEX ix_metric_values_entity_scores_entity
+    ON metric_values_entity_scores (id_metric, id_region, id_city);
+
+ANALYZE metric_values;
+
+-- 7. Витрина KPI поверх новой таблицы: единственное определение — в 005
+\ir 005_entity_kpi.sql
+
+COMMIT;
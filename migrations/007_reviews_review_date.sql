@@ -0,0 +1,18 @@
+-- migrations/007_reviews_review_date.sql
+-- Колонка reviews.review_date (дата вместо строки data) и индекс для отбора
+-- отзывов локации по дням (ReviewRepository.get_reviews_top / get_reviews_top_batch).
+-- Новые записи заполняют review_date сами (ORM-событие и load_reviews).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/007_reviews_review_date.sql
+-- CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS review_date date;
+
+-- Заполнение из data: 'YYYY-MM-DD', 'YYYY-M-D' и ISO-время после даты
+UPDATE reviews
+SET review_date = to_date(substring(data from '^\s*(\d{4}-\d{1,2}-\d{1,2})'), 'YYYY-MM-DD')
+WHERE review_date IS NULL
+  AND data ~ '^\s*\d{4}-(0?[1-9]|1[0-2])-(0?[1-9]|[12]\d|3[01])';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reviews_location_date
+    ON reviews (id_location, review_date DESC);
@@ -0,0 +1,18 @@
+-- migrations/008_reviews_text_search.sql
+-- Полнотекстовый поиск по отзывам: генерируемая колонка reviews.text_search
+-- (to_tsvector с русской конфигурацией) и GIN-индекс по ней
+-- (ReviewRepository.find_reviews / get_keyword_stats).
+--
+-- Добавление STORED-колонки переписывает таблицу reviews под эксклюзивной
+-- блокировкой: запускать в окно обслуживания.
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/008_reviews_text_search.sql
+-- CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS text_search tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian', coalesce(text, ''))) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reviews_text_search
+    ON reviews USING gin (text_search);
+
+ANALYZE reviews;
@@ -0,0 +1,23 @@
+-- migrations/009_scoring_checkpoints.sql
+-- Контрольные точки прогона оценки (run_base_assessment.py): одна строка на
+-- этап (stage) и регион или город, оценка которого на этом этапе в прогоне
+-- run_id полностью записана, и на завершенный этап прогона уровня всей
+-- страны (entity_type = 'country', entity_id = 0, id_region пуст).
+-- Перезапуск с тем же run_id пропускает отмеченные пары этап/сущность, поэтому
+-- прогон этапа segments, а затем complex под одним run_id выполняет оба этапа
+-- (ScoringCheckpointRepository в app/data/database/models_repository.py).
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/009_scoring_checkpoints.sql
+
+CREATE TABLE IF NOT EXISTS scoring_checkpoints (
+    run_id      text        NOT NULL,
+    stage       text        NOT NULL CHECK (stage IN ('locations', 'segments', 'complex')),
+    entity_type text        NOT NULL CHECK (entity_type IN ('region', 'city', 'country')),
+    entity_id   integer     NOT NULL,
+    id_region   integer,
+    finished_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, stage, entity_type, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_scoring_checkpoints_region
+    ON scoring_checkpoints (run_id, id_region);
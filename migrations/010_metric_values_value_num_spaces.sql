@@ -0,0 +1,17 @@
+-- migrations/010_metric_values_value_num_spaces.sql
+-- Пересчет value_num по тем же правилам, что parse_metric_value в app/models.py:
+-- пробелы внутри числа ('12 345') удаляются, экспонента ('1e5') не считается числом.
+-- Прежняя версия 002 не удаляла пробелы внутри числа, а ORM принимала экспоненту,
+-- поэтому value_num строк, записанных до этой миграции, могли расходиться.
+--
+-- Запуск: psql -v ON_ERROR_STOP=1 -f migrations/010_metric_values_value_num_spaces.sql
+
+UPDATE metric_values
+SET value_num = CASE
+        WHEN regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g') ~ '^[-+]?([0-9]+([.,][0-9]*)?|[.,][0-9]+)$'
+        THEN replace(regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g'), ',', '.')::double precision
+    END
+WHERE value_num IS DISTINCT FROM CASE
+        WHEN regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g') ~ '^[-+]?([0-9]+([.,][0-9]*)?|[.,][0-9]+)$'
+        THEN replace(regexp_replace(value, '[ \t\n\r\f\v\u00a0\u2009\u202f]', '', 'g'), ',', '.')::double precision
+    END;
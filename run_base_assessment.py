@@ -1,44 +1,247 @@
-from app.data.score.base_assessment import TourismEvaluation
-from app.data.imports.import_json import import_json_file
-from app.data.database.models_repository import RegionRepository, CitiesRepository
+# run_base_assessment.py
+"""
+Прогон оценки туризма (TourismEvaluation) по регионам и городам.
+
+Этапы:
+    locations — оценка локаций и количеств локаций по типам (вся страна, в основном процессе);
+    segments  — составные части и оценки сегментов (SegmentBatchEvaluation по региону);
+    complex   — составные части комплексной оценки: удаленность и средняя оценка сегментов.
+
+Этапы segments и complex шардируются по регионам на пул процессов (--workers).
+Каждый регион или город после записи оценок этапа отмечается в таблице
+scoring_checkpoints (migrations/009_scoring_checkpoints.sql) вместе с этапом,
+поэтому прерванный прогон, запущенный повторно с тем же --run-id, продолжается
+с неоцененных пар этап/сущность; завершенный этап locations отмечается там же
+и при повторном запуске пропускается. По умолчанию --run-id — метка времени
+запуска, то есть каждый запуск — новый прогон; идентификатор пишется в лог.
+В лог пишутся скорость (оценок сущностей/с) и ETA.
+
+Запуск:
+    python run_base_assessment.py --workers 8
+    python run_base_assessment.py --regions 150 155 151 --stages segments complex
+    python run_base_assessment.py --run-id 2026-10 --restart
+"""
+
+import argparse
+import multiprocessing
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.logging_config import logger
+from app.data.database import CitiesRepository, RegionRepository, ScoringCheckpointRepository, query_scope
+from app.data.imports.import_json import import_json_file
+from app.data.score.base_assessment import TourismEvaluation
+
+STAGES = ('locations', 'segments', 'complex')
+
+Entity = Tuple[str, int]
+# сущности региона, не оцененные на каждом из этапов: {stage: [entity, ...]}
+StagePlan = Dict[str, List[Entity]]
+
+
+def plan_entities(id_regions: Optional[Iterable[int]] = None) -> Dict[int, List[Entity]]:
+    """
+    Регионы и их города: {id_region: [('region', id_region), ('city', id_city), ...]}.
+    """
+    cities = CitiesRepository().get_city_coordinates()
+    cities = cities.dropna(subset=['id_region'])
+    regions = set(RegionRepository().full_region_by_id() or []) | set(cities['id_region'].astype(int))
+    if id_regions is not None:
+        regions &= {int(i) for i in id_regions}
+    plan = {id_region: [('region', id_region)] for id_region in sorted(regions)}
+    for id_city, id_region in zip(cities['id_city'].astype(int), cities['id_region'].astype(int)):
+        if id_region in plan:
+            plan[id_region].append(('city', id_city))
+    return plan
+
+
+def plan_pending(plan: Dict[int, List[Entity]], stages: Sequence[str],
+                 done: Set[Tuple[str, str, int]]) -> Dict[int, StagePlan]:
+    """
+    Неоцененные пары этап/сущность по регионам (регионы без них не попадают).
+    """
+    pending = {}
+    for id_region, entities in plan.items():
+        stage_plan = {
+            stage: [entity for entity in entities if (stage, *entity) not in done]
+            for stage in stages
+        }
+        stage_plan = {stage: entities for stage, entities in stage_plan.items() if entities}
+        if stage_plan:
+            pending[id_region] = stage_plan
+    return pending
+
+
+def score_region(run_id: str, id_region: int, stage_plan: StagePlan) -> Tuple[int, int, List[Entity]]:
+    """
+    Оценка одного региона и его городов (выполняется в процессе пула).
+
+    Оценки сегментов региона и оценки каждой сущности вместе с отметкой
+    этапа пишутся в unit_of_work: ошибка БД внутри методов оценки (которые
+    сами её только логируют) откатывает запись и пробрасывается. Прочие
+    ошибки методы оценки возвращают статусом; отметка ставится, только
+    если оценка записана, иначе сущность будет оценена при повторном запуске.
+
+    Returns:
+        Tuple[int, int, List[Entity]]: id_region, количество оцененных пар
+        этап/сущность и сущности, оценка которых не удалась.
+    """
+    scored = 0
+    failed: List[Entity] = []
+    with query_scope(f'run_base_assessment region {id_region}'):
+        t = TourismEvaluation()
+        checkpoints = ScoringCheckpointRepository()
+        if 'segments' in stage_plan:
+            # пакетная оценка сегментов считает регион и все его города сразу
+            with checkpoints.unit_of_work():
+                if t.calculating_segments_batch(id_regions=[id_region]) is None:
+                    failed.extend(stage_plan['segments'])
+                else:
+                    scored += checkpoints.mark_done(run_id, 'segments', id_region, stage_plan['segments'])
+        for entity_type, entity_id in stage_plan.get('complex', []):
+            with checkpoints.unit_of_work():
+                if entity_type == 'region':
+                    ok = t.calculating_complex_parts(id_region=id_region)
+                else:
+                    ok = t.calculating_complex_parts(id_region=id_region, id_city=entity_id)
+                if ok:
+                    scored += checkpoints.mark_done(run_id, 'complex', id_region, [(entity_type, entity_id)])
+                else:
+                    failed.append((entity_type, entity_id))
+    return id_region, scored, failed
+
+
+class Progress:
+    """Скорость и ETA прогона по количеству оцененных пар этап/сущность."""
+
+    def __init__(self, total: int, done: int):
+        self.total = total
+        self.done = done
+        self.processed = 0
+        self.started = time.perf_counter()
+
+    def add(self, count: int) -> str:
+        self.processed += count
+        elapsed = time.perf_counter() - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done - self.processed
+        eta = remaining / rate if rate > 0 else float('inf')
+        return (f"{self.done + self.processed}/{self.total} оценок сущностей, "
+                f"{rate:.2f} оценок/с, ETA {self.format_seconds(eta)}")
+
+    @staticmethod
+    def format_seconds(seconds: float) -> str:
+        if seconds == float('inf'):
+            return '—'
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f'{hours:d}:{minutes:02d}:{seconds:02d}'
+
+
+def run_regions(run_id: str, pending: Dict[int, StagePlan], workers: int, progress: Progress) -> Set[int]:
+    """
+    Оценивает регионы из pending, крупные — первыми.
+
+    Returns:
+        Set[int]: Регионы, оценка которых завершилась ошибкой.
+    """
+    order = sorted(pending, key=lambda id_region: sum(map(len, pending[id_region].values())), reverse=True)
+    failed = set()
+    if workers <= 1:
+        for id_region in order:
+            try:
+                _, count, failed_entities = score_region(run_id, id_region, pending[id_region])
+                logger.info(f"Регион {id_region} оценен: {progress.add(count)}")
+                if failed_entities:
+                    failed.add(id_region)
+                    logger.error(f"Регион {id_region}: не оценены {failed_entities}")
+            except Exception as e:
+                failed.add(id_region)
+                logger.error(f"Ошибка при оценке региона {id_region}: {e}")
+        return failed
+
+    # spawn: дочерние процессы создают собственные пулы соединений
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(score_region, run_id, id_region, pending[id_region]): id_region
+            for id_region in order
+        }
+        for future in as_completed(futures):
+            id_region = futures[future]
+            try:
+                _, count, failed_entities = future.result()
+                logger.info(f"Регион {id_region} оценен: {progress.add(count)}")
+                if failed_entities:
+                    failed.add(id_region)
+                    logger.error(f"Регион {id_region}: не оценены {failed_entities}")
+            except Exception as e:
+                failed.add(id_region)
+                logger.error(f"Ошибка при оценке региона {id_region}: {e}")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Прогон оценки туризма по регионам и городам.')
+    parser.add_argument('--workers', type=int, default=1, help='количество процессов (регионы делятся между ними)')
+    parser.add_argument('--run-id', default=datetime.now().strftime('%Y%m%d-%H%M%S'),
+                        help='идентификатор прогона для контрольных точек (по умолчанию время запуска); '
+                             'повторный запуск с ним продолжает прогон')
+    parser.add_argument('--regions', type=int, nargs='+', help='только эти регионы (по умолчанию все)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='этапы прогона')
+    parser.add_argument('--restart', action='store_true', help='удалить контрольные точки прогона и начать заново')
+    parser.add_argument('--no-refresh-kpi', action='store_true', help='не обновлять витрину KPI в конце')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    logger.info(f"Прогон {args.run_id}: этапы {', '.join(args.stages)} "
+                f"(продолжить прерванный прогон: --run-id {args.run_id})")
+    checkpoints = ScoringCheckpointRepository()
+    if args.restart:
+        checkpoints.reset(args.run_id)
+
+    done = checkpoints.get_done(args.run_id) or set()
+    if 'locations' in args.stages and ('locations', *checkpoints.COUNTRY) in done:
+        logger.info(f"Прогон {args.run_id}: этап locations уже выполнен, пропускаем")
+    elif 'locations' in args.stages:
+        # Оценка важных и не важных локаций: перцентили по всей стране, не шардируется.
+        # Этап не оборачивается в unit_of_work (внутри запросы к внешнему API),
+        # отметка ставится, только если оценки всех сегментов записаны
+        with query_scope('run_base_assessment locations'):
+            segments = import_json_file(file_path=r'app\files\segments.json')
+            failed_segments = [
+                name_segment for name_segment in segments
+                if not TourismEvaluation().get_like_locations_full(name_segment)
+            ]
+        if failed_segments:
+            logger.error(f"Прогон {args.run_id}: этап locations не отмечен, ошибки в сегментах {failed_segments}")
+        else:
+            checkpoints.mark_done(args.run_id, 'locations', None, [checkpoints.COUNTRY])
+
+    failed: Set[int] = set()
+    region_stages = [stage for stage in args.stages if stage != 'locations']
+    if region_stages:
+        plan = plan_entities(args.regions)
+        pending = plan_pending(plan, region_stages, done)
+        total = sum(len(entities) for entities in plan.values()) * len(region_stages)
+        already = total - sum(sum(map(len, stage_plan.values())) for stage_plan in pending.values())
+        logger.info(f"Прогон {args.run_id}: {len(plan)} регионов, {total} оценок сущностей, "
+                    f"уже выполнено {already}, осталось регионов {len(pending)}, процессов {args.workers}")
+        if not pending:
+            logger.warning(f"Прогон {args.run_id}: все сущности уже оценены на этапах "
+                           f"{', '.join(region_stages)}; для новой оценки запустите без --run-id или с --restart")
+        failed = run_regions(args.run_id, pending, args.workers, Progress(total, already))
 
-# # Оценка сегмента
-# start_time = time.time()
-# t = TourismEvaluation()
-# r = RegionRepository()
-# c = CitiesRepository()
-# # regions = r.full_region_by_id()
-# regions = [150, 155, 151]
-# for id_region in regions:
-#     # Оценка составных частей сегментов
-#     t.calculation_segment_parts(id_region=id_region)
-#     # Оценка сегментов
-#     t.calculating_segments_score(id_region=id_region)
-#     # Оценка составных частей комплексной оценки
-#     t.calculating_complex_parts(id_region=id_region, id_city=7215)
-#     cities = c.get_cities_in_region(id_region=id_region)
-#     # cities = [(7216,)]
-#     for id_city in cities:
-#         # Оценка составных частей сегментов
-#         t.calculation_segment_parts(id_city=id_city[0])
-#         # Оценка сегментов
-#         t.calculating_segments_score(id_city=id_city[0])
-#         # Оценка составных частей комплексной оценки
-#         t.calculating_complex_parts(id_region=id_region, id_city=7216)
-# end_time = time.time()
-# execution_time = end_time - start_time
-# print(f"Время выполнения: {execution_time:.2f} секунд")
-
-
-# Оценка важных и не важных локаций 
-start_time = time.time()
-segments = import_json_file(file_path=r'app\files\segments.json')
-for i in segments:
-    t = TourismEvaluation()
-    t.get_like_locations_full(i)
-end_time = time.time()
-execution_time = end_time - start_time
-print(f"Время выполнения: {execution_time:.2f} секунд")
+    if not args.no_refresh_kpi:
+        # Обновление витрины KPI дашбордов по итогам прогона
+        TourismEvaluation().refresh_dashboard_kpi()
+    execution_time = time.time() - start_time
+    print(f"Время выполнения: {execution_time:.2f} секунд")
+    if failed:
+        print(f"Регионы с ошибками (будут оценены при повторном запуске): {sorted(failed)}")
 
 
+if __name__ == '__main__':
+    main()
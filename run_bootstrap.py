@@ -0,0 +1,31 @@
+# run_bootstrap.py
+"""
+Явная инициализация схемы БД: создание таблиц по моделям и применение
+SQL-миграций из каталога migrations/.
+
+Запуск:
+    python run_bootstrap.py                  # таблицы + миграции
+    python run_bootstrap.py --skip-migrations
+"""
+
+import argparse
+
+from app.logging_config import logger
+from app.models import initialize_database
+from app.data.database.migrations import apply_migrations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Создание схемы БД и применение миграций.')
+    parser.add_argument('--skip-migrations', action='store_true',
+                        help='только создать таблицы, не применяя migrations/*.sql')
+    args = parser.parse_args()
+
+    initialize_database()
+    if not args.skip_migrations:
+        applied = apply_migrations()
+        logger.info(f"Применено миграций: {len(applied)} {applied}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from app.data.processing import DataProcessor,WeatherProcessor
+from app.data.database import query_scope
 # from app.data.parsing.base_parsing import Parse
 # from app.data.database import LocationsRepository
 # from app.data.database.models_repository import LocationsRepository, MetricValueRepository
@@ -9,8 +10,10 @@ from app.data.processing import DataProcessor,WeatherProcessor
 # import pandas as pd
 
 
-dp = DataProcessor()
-dp.process_yandex_locations(specific_region=('Карачаево-Черкесская Республика',), level_loc_type = 1, restart=False)
+# Запросы прогона учитываются в одной области: итоги и подозрения на N+1 — в логе
+with query_scope('run_processing'):
+    dp = DataProcessor()
+    dp.process_yandex_locations(specific_region=('Карачаево-Черкесская Республика',), level_loc_type = 1, restart=False)
 
 # dp = Region_page_dashboard()
 # dp.get_region_mean_night(id_region=150, year=2023)